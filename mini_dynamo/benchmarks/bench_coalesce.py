@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+from dynamo.coalesce import SingleFlight
+from dynamo.quorum import QuorumClient
+
+class _Resp:
+    status_code = 200
+
+    def json(self):
+        return {"ok": True, "value": "v", "ts": 1.0, "tombstone": False}
+
+# Replicas answering every internal read after a lognormal delay.
+class SimulatedReplicas:
+    def __init__(self, base_ms: float, seed: int):
+        self.base_ms = base_ms
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.per_key = Counter()
+
+    async def get(self, url, path, params=None):
+        self.requests += 1
+        self.per_key[params["key"]] += 1
+        await asyncio.sleep(self.rng.lognormvariate(0, 0.3) * self.base_ms / 1000.0)
+        return _Resp()
+
+# Zipf-distributed key ranks: rank r is drawn with probability ~ 1 / r**s.
+def zipf_keys(n: int, keys: int, s: float, seed: int):
+    weights = [1.0 / (r ** s) for r in range(1, keys + 1)]
+    return [f"k{r}" for r in random.Random(seed).choices(range(keys), weights=weights, k=n)]
+
+async def run(args, s: float, coalesce: bool) -> dict:
+    replicas = [f"http://r{i}" for i in range(args.replicas)]
+    cluster = SimulatedReplicas(args.base_ms, args.seed)
+    qc = QuorumClient(cluster)
+    sf = SingleFlight() if coalesce else None
+    sem = asyncio.Semaphore(args.concurrency)
+    reads = zipf_keys(args.reads, args.keys, s, args.seed)
+
+    async def one(key):
+        async with sem:
+            if sf is None:
+                await qc.quorum_get(replicas, key, q=args.q)
+            else:
+                await sf.do(key, lambda: qc.quorum_get(replicas, key, q=args.q))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(k) for k in reads))
+    elapsed = time.perf_counter() - t0
+    # the 10 most read keys
+    hot = Counter(reads).most_common(10)
+    hot_rpc = sum(cluster.per_key[k] for k, _ in hot) / sum(n for _, n in hot)
+    return {"rpc_per_read": cluster.requests / args.reads, "hot_rpc_per_read": hot_rpc, "reads_s": args.reads / elapsed, "hit": sf.stats()["hit_ratio"] if sf else 0.0}
+
+def main():
+    p = argparse.ArgumentParser(description="Internal replica reads per client read with and without coalescing, under Zipf key skew")
+    p.add_argument("--reads", type=int, default=50_000)
+    p.add_argument("--keys", type=int, default=100_000)
+    p.add_argument("--skew", default="0,0.8,0.99,1.2", help="Zipf exponents to try")
+    p.add_argument("--concurrency", type=int, default=256)
+    p.add_argument("--replicas", type=int, default=3)
+    p.add_argument("--q", type=int, default=2)
+    p.add_argument("--base-ms", type=float, default=2.0)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    print(f"{args.reads:,} reads over {args.keys:,} keys, {args.concurrency} in flight, R={args.replicas}")
+    print(f"{'zipf s':>6} {'mode':<10} {'rpc/read':>9} {'hot top10':>9} {'hit ratio':>9} {'reads/s':>9}")
+    for s in (float(x) for x in args.skew.split(",")):
+        for coalesce in (False, True):
+            r = asyncio.run(run(args, s, coalesce))
+            print(f"{s:>6} {'coalesced' if coalesce else 'plain':<10} {r['rpc_per_read']:>9.3f} {r['hot_rpc_per_read']:>9.3f} {r['hit']:>9.3f} {r['reads_s']:>9,.0f}")
+
+if __name__ == "__main__":
+    main()
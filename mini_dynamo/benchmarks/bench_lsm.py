@@ -0,0 +1,56 @@
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from dynamo.lsm import LSMStore
+from dynamo.store import write_group
+
+def main():
+    p = argparse.ArgumentParser(description="Write throughput, read latency and recovery time of the lsm engine")
+    p.add_argument("--keys", type=int, default=1_000_000, help="use 10000000 for the full-size run")
+    p.add_argument("--value-size", type=int, default=64)
+    p.add_argument("--reads", type=int, default=20000)
+    p.add_argument("--sync", default="group", choices=["always", "group", "none"])
+    p.add_argument("--batch", type=int, default=1000, help="puts per write group (one durability wait each)")
+    p.add_argument("--data-dir", default=None, help="defaults to a temporary directory")
+    args = p.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="lsm-bench-")
+    value = "x" * args.value_size
+    try:
+        store = LSMStore(data_dir, sync_mode=args.sync)
+        t0 = time.perf_counter()
+        for lo in range(0, args.keys, args.batch):
+            with write_group():
+                for i in range(lo, min(lo + args.batch, args.keys)):
+                    store.put(f"key-{i:010d}", value, ts=float(i))
+        store.sync()
+        elapsed = time.perf_counter() - t0
+        print(f"write: {args.keys:,} keys in {elapsed:.2f}s = {args.keys / elapsed:,.0f} puts/s (wal sync={args.sync}, {args.batch} per group, {store.stats()['wal_group_fsyncs']} group fsyncs)")
+
+        lat = []
+        for _ in range(args.reads):
+            k = f"key-{random.randrange(args.keys):010d}"
+            t = time.perf_counter()
+            store.get(k)
+            lat.append(time.perf_counter() - t)
+        lat.sort()
+        print(f"read: p50={lat[len(lat) // 2] * 1e6:.1f}us p99={lat[int(len(lat) * 0.99)] * 1e6:.1f}us "
+              f"mean={statistics.mean(lat) * 1e6:.1f}us; {store.stats()['sstables'].__len__()} sstables")
+
+        # Recovery replays whatever has not been flushed to SSTables yet.
+        store.close()
+        t0 = time.perf_counter()
+        store = LSMStore(data_dir, sync_mode=args.sync)
+        print(f"recovery: reopened in {time.perf_counter() - t0:.2f}s "
+              f"({store.stats()['immutable_memtables']} WAL segments replayed)")
+        store.close()
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
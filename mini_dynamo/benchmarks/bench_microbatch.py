@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import time
+
+from dynamo.quorum import QuorumClient
+
+class _Resp:
+    status_code = 200
+
+    def json(self):
+        return {"ok": True}
+
+# Replicas that handle one request at a time, each costing a fixed
+# per-request overhead (parsing, routing, the response) plus a small
+# per-item cost, the shape that makes many tiny requests expensive.
+class SimulatedPeers:
+    def __init__(self, request_us: float, item_us: float, rtt_us: float):
+        self.request_s = request_us / 1e6
+        self.item_s = item_us / 1e6
+        self.rtt_s = rtt_us / 1e6
+        self.locks = {}
+        self.requests = 0
+
+    async def post(self, url, path, json=None):
+        self.requests += 1
+        n = len(json["items"]) if "items" in json else 1
+        await asyncio.sleep(self.rtt_s / 2)
+        lock = self.locks.setdefault(url, asyncio.Lock())
+        async with lock:
+            await asyncio.sleep(self.request_s + n * self.item_s)
+        await asyncio.sleep(self.rtt_s / 2)
+        return _Resp()
+
+def pct(xs, p):
+    s = sorted(xs)
+    return s[min(len(s) - 1, int(p / 100.0 * len(s)))]
+
+async def run(args, concurrency: int, batch_items: int) -> dict:
+    peers = SimulatedPeers(args.request_us, args.item_us, args.rtt_us)
+    qc = QuorumClient(peers, write_batch_items=batch_items, write_batch_delay_s=args.delay_us / 1e6)
+    replicas = ["http://a", "http://b", "http://c"]
+    lat = []
+    counter = iter(range(args.writes))
+
+    async def worker():
+        for i in counter:
+            t0 = time.perf_counter()
+            await qc.replicate_put(replicas, f"k{i}", "v" * 100, ts=float(i), w=2, local="http://a")
+            lat.append((time.perf_counter() - t0) * 1000.0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    await qc.drain()
+    return {"writes_s": args.writes / elapsed, "p50": pct(lat, 50), "p99": pct(lat, 99), "req_per_write": peers.requests / args.writes}
+
+def main():
+    p = argparse.ArgumentParser(description="Replica write requests, throughput and latency with and without per-peer micro-batching (simulated peers)")
+    p.add_argument("--writes", type=int, default=20_000)
+    p.add_argument("--concurrency", default="1,16,256")
+    p.add_argument("--batch-items", type=int, default=64)
+    p.add_argument("--delay-us", type=float, default=500.0)
+    p.add_argument("--request-us", type=float, default=150.0, help="Peer cost per request")
+    p.add_argument("--item-us", type=float, default=10.0, help="Peer cost per write in a request")
+    p.add_argument("--rtt-us", type=float, default=200.0)
+    args = p.parse_args()
+
+    print(f"{args.writes:,} writes, R=3 W=2 (coordinator is a replica), peer cost {args.request_us:.0f} us/request + {args.item_us:.0f} us/write")
+    print(f"{'in flight':>9} {'mode':<9} {'writes/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'req/write':>9}")
+    for c in (int(x) for x in args.concurrency.split(",")):
+        for items in (0, args.batch_items):
+            r = asyncio.run(run(args, c, items))
+            print(f"{c:>9} {'batched' if items else 'single':<9} {r['writes_s']:>9,.0f} {r['p50']:>7.2f} {r['p99']:>7.2f} {r['req_per_write']:>9.3f}")
+
+if __name__ == "__main__":
+    main()
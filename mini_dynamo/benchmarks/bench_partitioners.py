@@ -0,0 +1,44 @@
+import argparse
+import statistics
+import time
+from collections import Counter
+
+from dynamo.hashing import make_ring
+from dynamo.partitioner import PARTITIONER_NAMES, xxhash
+
+def main():
+    p = argparse.ArgumentParser(description="Lookup rate and load balance of each partitioner")
+    p.add_argument("--nodes", type=int, default=24)
+    p.add_argument("--vnodes", type=int, default=256)
+    p.add_argument("--replication", type=int, default=3)
+    p.add_argument("--keys", type=int, default=100000)
+    args = p.parse_args()
+
+    nodes = [f"http://10.0.0.{i}:8000" for i in range(args.nodes)]
+    keys = [f"user:{i}" for i in range(args.keys)]
+
+    print(f"{'partitioner':<12} {'lookups/s':>12} {'batch/s':>12} {'primary cv':>11} {'max/mean':>9}")
+    for name in PARTITIONER_NAMES:
+        if name == "xxhash" and xxhash is None:
+            print(f"{name:<12} skipped (xxhash not installed)")
+            continue
+        ring = make_ring(name, nodes, vnodes=args.vnodes)
+        ring.replicas("warm", args.replication)
+
+        t0 = time.perf_counter()
+        for k in keys:
+            ring.replicas(k, args.replication)
+        single = len(keys) / (time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        owners = ring.replicas_many(keys, args.replication)
+        batch = len(keys) / (time.perf_counter() - t0)
+
+        load = Counter(o[0] for o in owners)
+        counts = [load.get(n, 0) for n in nodes]
+        mean = statistics.mean(counts)
+        cv = statistics.pstdev(counts) / mean
+        print(f"{name:<12} {single:>12,.0f} {batch:>12,.0f} {cv:>11.3f} {max(counts) / mean:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from dynamo.hashing import make_ring
+from dynamo.membership import Membership
+from dynamo.rebalance import Rebalancer, moved_ranges
+from dynamo.store import InMemoryStore, Record
+
+# Streams the ranges moved by one node joining (or leaving) between
+# in-process Rebalancers; the transport merges straight into the target's
+# store, so the numbers cover scan, routing, batching and throttling.
+class LocalTransport:
+    class Resp:
+        status_code = 200
+
+    def __init__(self, stores):
+        self.stores = stores
+
+    async def post(self, url, path, json=None, **kwargs):
+        store = self.stores[url]
+        for it in json["items"]:
+            store.merge(it["key"], Record(value=it["value"], ts=it["ts"], tombstone=it["tombstone"]))
+        await asyncio.sleep(0)
+        return self.Resp()
+
+async def run(args, join: bool, rate: float) -> dict:
+    base = [f"http://n{i}" for i in range(args.nodes)]
+    extra = f"http://n{args.nodes}"
+    before, after = (base, base + [extra]) if join else (base + [extra], base)
+    old, new = make_ring(args.partitioner, before, vnodes=args.vnodes), make_ring(args.partitioner, after, vnodes=args.vnodes)
+    stores = {n: InMemoryStore() for n in base + [extra]}
+    value = "v" * args.value_size
+    keys = [f"key{i}" for i in range(args.keys)]
+    for key, owners in zip(keys, old.replicas_many(keys, args.replication)):
+        for n in owners:
+            stores[n].put(key, value, ts=1.0)
+
+    transport = LocalTransport(stores)
+    rebs = []
+    for n in before:
+        m = Membership(n, before, timeout_s=1.0, dead_after_s=60.0)
+        reb = Rebalancer(n, stores[n], transport, m, lambda nodes: make_ring(args.partitioner, nodes, vnodes=args.vnodes), args.replication, batch_size=args.batch, rate=rate)
+        reb.ring_changed(before, new)
+        rebs.append(reb)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(r._stream(r.transfer) for r in rebs))
+    balance_s = time.perf_counter() - t0
+
+    misplaced = sum(1 for key, owners in zip(keys, new.replicas_many(keys, args.replication)) for n in owners if stores[n].get(key) is None)
+    sent = sum(r.transfer.keys_sent for r in rebs)
+    ranges = len(moved_ranges(old, new, args.replication, 1 << old.partitioner.bits)) if args.partitioner != "rendezvous" else None
+    return {"ranges": ranges, "sent": sent, "balance_s": balance_s, "keys_s": sent / balance_s, "mb_s": sent * (args.value_size + 10) / balance_s / 1e6, "missing": misplaced}
+
+def main():
+    p = argparse.ArgumentParser(description="Rebalance transfer throughput and time-to-balance for one join/leave (in-process)")
+    p.add_argument("--keys", type=int, default=200_000)
+    p.add_argument("--nodes", type=int, default=4)
+    p.add_argument("--replication", type=int, default=3)
+    p.add_argument("--vnodes", type=int, default=50)
+    p.add_argument("--partitioner", default="md5")
+    p.add_argument("--batch", type=int, default=500)
+    p.add_argument("--value-size", type=int, default=100)
+    p.add_argument("--rate", type=float, default=50_000.0, help="Throttled case, keys/s per sender")
+    args = p.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{args.keys:,} keys, R={args.replication}, {args.nodes} -> {args.nodes + 1} nodes and back")
+    print(f"{'change':<8} {'throttle':>10} {'ranges':>7} {'keys sent':>10} {'balance s':>10} {'keys/s':>10} {'MB/s':>6} {'missing':>8}")
+    for join in (True, False):
+        for rate in (0.0, args.rate):
+            r = asyncio.run(run(args, join, rate))
+            print(f"{'join' if join else 'leave':<8} {rate or 'none':>10} {r['ranges'] if r['ranges'] is not None else '-':>7} {r['sent']:>10,} {r['balance_s']:>10.2f} {r['keys_s']:>10,.0f} {r['mb_s']:>6.1f} {r['missing']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import time
+
+from dynamo.hashing import ConsistentHashRing
+
+def _rate(n: int, elapsed: float) -> str:
+    return f"{n / elapsed:,.0f} ops/s ({elapsed / n * 1e6:.2f} us/op)"
+
+def main():
+    p = argparse.ArgumentParser(description="Per-request routing cost of the consistent hash ring")
+    p.add_argument("--nodes", type=int, default=24)
+    p.add_argument("--vnodes", type=int, default=256)
+    p.add_argument("--replication", type=int, default=3)
+    p.add_argument("--requests", type=int, default=20000)
+    args = p.parse_args()
+
+    nodes = [f"http://10.0.0.{i}:8000" for i in range(args.nodes)]
+    keys = [f"key-{i}" for i in range(args.requests)]
+    ring = ConsistentHashRing(nodes, vnodes=args.vnodes)
+
+    # Old request path: rebuild the whole ring before every lookup.
+    n_rebuild = max(1, args.requests // 100)
+    t0 = time.perf_counter()
+    for k in keys[:n_rebuild]:
+        ConsistentHashRing(nodes, vnodes=args.vnodes).replicas(k, args.replication)
+    print("rebuild per request:   ", _rate(n_rebuild, time.perf_counter() - t0))
+
+    # New request path: version check, then one bisect.
+    version = 1
+    ring.set_nodes(nodes, version=version)
+    t0 = time.perf_counter()
+    for k in keys:
+        if ring.version != version:
+            ring.set_nodes(nodes, version=version)
+        ring.replicas(k, args.replication)
+    print("versioned lookup:      ", _rate(len(keys), time.perf_counter() - t0))
+
+    t0 = time.perf_counter()
+    ring.replicas_many(keys, args.replication)
+    print("replicas_many:         ", _rate(len(keys), time.perf_counter() - t0))
+
+    # Membership changes: incremental join/leave vs full rebuild.
+    extra = "http://10.0.1.1:8000"
+    t0 = time.perf_counter()
+    ring.add_node(extra)
+    ring.replicas("warm", args.replication)
+    ring.remove_node(extra)
+    ring.replicas("warm", args.replication)
+    inc = time.perf_counter() - t0
+    ring.replicas("warm", args.replication)
+    t0 = time.perf_counter()
+    ConsistentHashRing(nodes + [extra], vnodes=args.vnodes).replicas("warm", args.replication)
+    ConsistentHashRing(nodes, vnodes=args.vnodes).replicas("warm", args.replication)
+    full = time.perf_counter() - t0
+    print(f"join+leave incremental: {inc * 1e3:.2f} ms, full rebuild: {full * 1e3:.2f} ms")
+    print(f"ring memory: {ring._tokens.itemsize * len(ring) + ring._owners.itemsize * len(ring):,} bytes of tokens/owners for {len(ring):,} vnodes")
+
+if __name__ == "__main__":
+    main()
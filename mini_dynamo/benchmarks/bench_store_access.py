@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import json
+import logging
+import shutil
+import tempfile
+import time
+
+from fastapi import FastAPI
+
+from dynamo.node_api import ReplicaDelReq, ReplicaPutReq, create_app
+from dynamo.store import open_store
+
+NODE = "http://127.0.0.1:9"
+
+# The replica endpoints as plain `def` handlers over the bare store, the way
+# they were before StoreAccess: Starlette runs each one on its threadpool.
+def sync_handler_app(engine: str, data_dir: str) -> FastAPI:
+    app = FastAPI()
+    store = open_store(engine, data_dir)
+
+    @app.post("/internal/replica/put")
+    def replica_put(req: ReplicaPutReq):
+        store.put(req.key, req.value, ts=req.ts)
+        return {"ok": True}
+
+    @app.post("/internal/replica/delete")
+    def replica_delete(req: ReplicaDelReq):
+        store.delete(req.key, ts=req.ts)
+        return {"ok": True}
+
+    @app.get("/internal/replica/get")
+    def replica_get(key: str):
+        rec = store.get(key)
+        if rec is None:
+            return {"ok": True, "value": None, "ts": 0.0, "tombstone": True}
+        return {"ok": True, "value": rec.value, "ts": rec.ts, "tombstone": rec.tombstone}
+
+    return app
+
+# One request straight into the ASGI app (no HTTP client in between, whose
+# cost would otherwise dominate); returns the response status.
+async def asgi_call(app, method: str, path: str, query: bytes = b"", body: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 9),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(msg):
+        nonlocal status
+        if msg["type"] == "http.response.start":
+            status = msg["status"]
+
+    await app(scope, receive, send)
+    return status
+
+# Internal replica ops/sec against one node's ASGI app in-process, with
+# `concurrency` requests in flight, so the numbers cover dispatch
+# (threadpool hop or not), validation and store work without a network.
+async def run(app, args) -> dict:
+    value = "v" * args.value_size
+    cases = {
+        "put": lambda i: asgi_call(app, "POST", "/internal/replica/put", body=json.dumps({"key": f"k{i % args.keys}", "value": value, "ts": float(i)}).encode()),
+        "get": lambda i: asgi_call(app, "GET", "/internal/replica/get", query=f"key=k{i % args.keys}".encode()),
+        "delete": lambda i: asgi_call(app, "POST", "/internal/replica/delete", body=json.dumps({"key": f"k{i % args.keys}", "ts": float(args.ops + i)}).encode()),
+    }
+    out = {}
+    for name, op in cases.items():
+        counter = iter(range(args.ops))
+
+        async def worker():
+            for i in counter:
+                assert await op(i) == 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        out[name] = args.ops / (time.perf_counter() - t0)
+    return out
+
+def main():
+    p = argparse.ArgumentParser(description="Internal replica ops/sec by store access mode under concurrency (in-process)")
+    p.add_argument("--ops", type=int, default=20_000)
+    p.add_argument("--keys", type=int, default=5000)
+    p.add_argument("--concurrency", type=int, default=256)
+    p.add_argument("--value-size", type=int, default=100)
+    p.add_argument("--engines", default="memory,lsm")
+    args = p.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{args.ops:,} ops per case, {args.concurrency} in flight")
+    print(f"{'engine':<8} {'handlers':<22} {'put/s':>9} {'get/s':>9} {'delete/s':>9}")
+    for engine in args.engines.split(","):
+        modes = [("sync def (threadpool)", None), ("async, inline", "inline"), ("async, store threads", "thread")]
+        for label, mode in modes:
+            data_dir = tempfile.mkdtemp(prefix="bench-access-") if engine == "lsm" else None
+            try:
+                if mode is None:
+                    app = sync_handler_app(engine, data_dir)
+                else:
+                    app = create_app("n1", NODE, [], replication=1, w=1, q=1, debug=False, engine=engine, data_dir=data_dir, store_access=mode)
+                r = asyncio.run(run(app, args))
+            finally:
+                if data_dir:
+                    shutil.rmtree(data_dir, ignore_errors=True)
+            print(f"{engine:<8} {label:<22} {r['put']:>9,.0f} {r['get']:>9,.0f} {r['delete']:>9,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+from dynamo.store import CompactStore, InMemoryStore
+
+# The Record layout before it was slotted, for comparison.
+@dataclass
+class DictRecord:
+    value: Optional[str]
+    ts: float
+    tombstone: bool = False
+
+class DictRecordStore(InMemoryStore):
+    def put(self, key, value, ts=None):
+        rec = DictRecord(value=value, ts=ts)
+        self._data[key] = rec
+        return rec
+
+MODES = {
+    "dataclass": DictRecordStore,
+    "slotted": InMemoryStore,
+    "compact": CompactStore,
+}
+
+def measure(factory, n: int, value_size: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    store = factory()
+    for i in range(n):
+        store.put(f"key-{i:010d}", f"{i:0{value_size}d}", ts=float(i))
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del store
+    return used / n
+
+def main():
+    p = argparse.ArgumentParser(description="Bytes per key of each in-memory store mode")
+    p.add_argument("--keys", type=int, nargs="+", default=[1_000_000], help="e.g. --keys 1000000 10000000")
+    p.add_argument("--value-size", type=int, default=16)
+    args = p.parse_args()
+
+    print(f"{'mode':<10} " + " ".join(f"{n:>14,}" for n in args.keys) + "   (bytes/key, keys + values included)")
+    for name, factory in MODES.items():
+        row = [measure(factory, n, args.value_size) for n in args.keys]
+        print(f"{name:<10} " + " ".join(f"{b:>14.1f}" for b in row))
+
+if __name__ == "__main__":
+    main()
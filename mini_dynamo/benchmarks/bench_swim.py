@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from dynamo.swim import DEAD, SUSPECT, Swim
+
+# In-memory network for SWIM nodes: every message takes a random one-way
+# latency, each direction is dropped with probability `loss`, and crashed
+# nodes never answer. All nodes share one event loop, so nothing but the
+# protocol itself is measured.
+class Network:
+    def __init__(self, loss: float, latency_ms: tuple, rng: random.Random):
+        self.nodes = {}
+        self.crashed = set()
+        self.loss = loss
+        self.latency_ms = latency_ms
+        self.rng = rng
+
+    def sender(self, src: str):
+        async def send(url, msg, timeout_s):
+            if src in self.crashed:
+                return None
+            lost = self.rng.random() < self.loss or self.rng.random() < self.loss
+            await asyncio.sleep(self.rng.uniform(*self.latency_ms) / 1000)
+            if lost or url in self.crashed:
+                await asyncio.sleep(timeout_s)
+                return None
+            reply = await self.nodes[url].handle(msg)
+            await asyncio.sleep(self.rng.uniform(*self.latency_ms) / 1000)
+            return reply
+        return send
+
+async def run(n: int, args, seed: int) -> dict:
+    rng = random.Random(seed)
+    net = Network(args.loss, (args.min_latency_ms, args.max_latency_ms), rng)
+    urls = [f"node{i}" for i in range(n)]
+    events = []
+    for url in urls:
+        net.nodes[url] = Swim(
+            url, urls, net.sender(url),
+            period_s=args.period,
+            ping_timeout_s=args.ping_timeout,
+            indirect_k=args.k,
+            rng=random.Random(rng.random()),
+            on_change=lambda m, o=url: events.append((time.monotonic(), o, m.url, m.status)),
+        )
+    tasks = [asyncio.create_task(s.run()) for s in net.nodes.values()]
+    await asyncio.sleep(args.warmup * args.period)
+
+    victim = rng.choice(urls)
+    net.crashed.add(victim)
+    tasks[urls.index(victim)].cancel()
+    crash_at = time.monotonic()
+    sent_before = {u: s.messages_sent for u, s in net.nodes.items()}
+    live = [u for u in urls if u != victim]
+    deadline = crash_at + args.max_periods * args.period
+    while time.monotonic() < deadline:
+        await asyncio.sleep(args.period)
+        if all(net.nodes[u].status(victim) == DEAD for u in live):
+            break
+    elapsed = time.monotonic() - crash_at
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    about = [e for e in events if e[2] == victim and e[0] >= crash_at]
+    first_suspect = min((e[0] for e in about if e[3] == SUSPECT), default=None)
+    first_dead = min((e[0] for e in about if e[3] == DEAD), default=None)
+    all_dead = all(net.nodes[u].status(victim) == DEAD for u in live)
+    # False positives: live members suspected or declared dead by a live
+    # node, counted once per member however far the rumour spread.
+    wrong = {(e[2], e[3]) for e in events if e[1] != victim and e[2] != victim and e[3] in (SUSPECT, DEAD)}
+    msgs = sum(net.nodes[u].messages_sent - sent_before[u] for u in live)
+    return {
+        "suspect_s": first_suspect - crash_at if first_suspect else None,
+        "dead_s": first_dead - crash_at if first_dead else None,
+        "all_s": elapsed if all_dead else None,
+        "false_suspect": sum(1 for e in wrong if e[1] == SUSPECT),
+        "false_dead": sum(1 for e in wrong if e[1] == DEAD),
+        "msgs_per_node_period": msgs / len(live) / (elapsed / args.period),
+    }
+
+def fmt(v) -> str:
+    return f"{v:.2f}" if v is not None else "-"
+
+def main():
+    p = argparse.ArgumentParser(description="SWIM failure detection at scale: detection time, false positives and message load (simulated network)")
+    p.add_argument("--sizes", default="3,10,50,100,200")
+    p.add_argument("--period", type=float, default=0.1, help="Protocol period (s)")
+    p.add_argument("--ping-timeout", type=float, default=0.03)
+    p.add_argument("--k", type=int, default=3, help="Indirect probes")
+    p.add_argument("--loss", type=float, default=0.01, help="Per-direction message loss")
+    p.add_argument("--min-latency-ms", type=float, default=0.5)
+    p.add_argument("--max-latency-ms", type=float, default=5.0)
+    p.add_argument("--warmup", type=int, default=20, help="Periods before the crash")
+    p.add_argument("--max-periods", type=int, default=100)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"period {args.period}s, loss {args.loss:.0%} per direction; times are seconds after the crash")
+    print(f"{'nodes':>5} {'1st suspect':>12} {'1st dead':>9} {'all dead':>9} {'false susp':>11} {'false dead':>11} {'msgs/node/period':>17} {'heartbeat':>10}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        r = asyncio.run(run(n, args, args.seed))
+        print(f"{n:>5} {fmt(r['suspect_s']):>12} {fmt(r['dead_s']):>9} {fmt(r['all_s']):>9} {r['false_suspect']:>11} {r['false_dead']:>11} {r['msgs_per_node_period']:>17.2f} {n - 1:>10}")
+
+if __name__ == "__main__":
+    main()
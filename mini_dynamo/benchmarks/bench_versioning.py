@@ -0,0 +1,74 @@
+import argparse
+import time
+
+from dynamo.store import BaseStore, InMemoryStore, Record
+from dynamo.versioning import CausalStore, DotClock, decode_context, encode_context, new_write, node_id_for, pack, resolve_records, unpack
+
+NODES = [f"http://127.0.0.1:81{i:02d}" for i in range(3)]
+
+def timed(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - t0) / n * 1e6
+
+def main():
+    p = argparse.ArgumentParser(description="Overhead of causal (DVV) versioning compared to LWW")
+    p.add_argument("--ops", type=int, default=200_000)
+    p.add_argument("--keys", type=int, default=10_000)
+    p.add_argument("--value-size", type=int, default=32)
+    args = p.parse_args()
+    n, value = args.ops, "v" * args.value_size
+    clocks = [DotClock(node_id_for(u)) for u in NODES]
+
+    # Per-record bytes on top of the value.
+    one = pack(new_write({}, clocks[0].node, clocks[0].next(), value))
+    state = unpack(one)
+    for c in clocks[1:]:
+        state.vv[c.node] = c.next()
+    three = pack(state)
+    print(f"stored bytes over the value: 1 writer {len(one) - len(value)}, 3 writers {len(three) - len(value)}; context string {len(encode_context(state.vv))} chars")
+
+    lww = InMemoryStore()
+    causal = CausalStore(InMemoryStore())
+    contexts = {}
+
+    def lww_put(n):
+        for i in range(n):
+            lww.put(f"k{i % args.keys}", value, ts=float(i))
+
+    # Read-modify-write with the context of the previous write, rotating the
+    # coordinator across three nodes, so vectors carry three entries.
+    def causal_put(n):
+        for i in range(n):
+            key = f"k{i % args.keys}"
+            c = clocks[i % 3]
+            delta = new_write(contexts.get(key, {}), c.node, c.next(), value)
+            contexts[key] = delta.vv
+            causal.put(key, pack(delta), ts=float(i))
+
+    a = Record(value=value, ts=1.0)
+    b = Record(value=value + "x", ts=2.0)
+    ca = Record(value=pack(new_write({}, clocks[0].node, clocks[0].next(), value)), ts=1.0)
+    cb = Record(value=pack(new_write({}, clocks[1].node, clocks[1].next(), value)), ts=2.0)
+
+    def lww_resolve(n):
+        for _ in range(n):
+            BaseStore.newer(a, b)
+
+    def causal_resolve(n):
+        for _ in range(n):
+            resolve_records(ca, cb)
+
+    ctx = encode_context(state.vv)
+
+    def context_round_trip(n):
+        for _ in range(n):
+            encode_context(decode_context(ctx))
+
+    print(f"{'operation':<28} {'LWW us':>10} {'causal us':>10}")
+    print(f"{'put (store)':<28} {timed(lww_put, n):>10.2f} {timed(causal_put, n):>10.2f}")
+    print(f"{'resolve two replicas':<28} {timed(lww_resolve, n):>10.2f} {timed(causal_resolve, n):>10.2f}")
+    print(f"{'context decode+encode':<28} {'-':>10} {timed(context_round_trip, n):>10.2f}")
+
+if __name__ == "__main__":
+    main()
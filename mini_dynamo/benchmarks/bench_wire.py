@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+
+from dynamo.node_api import create_app
+from dynamo.quorum import QuorumClient
+from dynamo.wire import BinaryClient
+
+NODE = "http://127.0.0.1:9"
+
+# PeerTransport stand-in that calls the node's ASGI app in-process, so the
+# numbers cover encoding, framework and store work on one core without any
+# network in between.
+class InProcessTransport:
+    def __init__(self, app):
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=NODE)
+
+    async def post(self, base_url, path, json=None, **kwargs):
+        return await self.client.post(path, json=json, **kwargs)
+
+    async def get(self, base_url, path, params=None, **kwargs):
+        return await self.client.get(path, params=params, **kwargs)
+
+async def run(binary: bool, args) -> dict:
+    app = create_app("n1", NODE, [], replication=1, w=1, q=1, debug=False)
+    transport = InProcessTransport(app)
+    qc = QuorumClient(transport, binary=BinaryClient(transport) if binary else None)
+    value = "v" * args.value_size
+    out = {}
+    batch = [{"key": f"b{i}", "value": value, "ts": 1.0} for i in range(args.batch)]
+    cases = {
+        "put": lambda i: qc._post(NODE, "/internal/replica/put", {"key": f"k{i % 1000}", "value": value, "ts": float(i)}),
+        "get": lambda i: qc._get(NODE, "/internal/replica/get", {"key": f"k{i % 1000}"}),
+        "delete": lambda i: qc._post(NODE, "/internal/replica/delete", {"key": f"k{i % 1000}", "ts": float(i)}),
+        f"put_batch x{args.batch}": lambda i: qc._post(NODE, "/internal/replica/put_batch", {"items": batch}),
+        f"get_batch x{args.batch}": lambda i: qc._post(NODE, "/internal/replica/get_batch", {"keys": [it["key"] for it in batch]}),
+    }
+    for name, op in cases.items():
+        n = args.ops if "batch" not in name else max(1, args.ops // 10)
+        t0, c0 = time.perf_counter(), time.process_time()
+        for i in range(n):
+            _, ok, _ = await op(i)
+            assert ok
+        wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+        out[name] = (n / wall, n / cpu)
+    await transport.client.aclose()
+    return out
+
+def main():
+    p = argparse.ArgumentParser(description="Internal replica ops/sec, JSON endpoints vs binary frames (in-process, one core)")
+    p.add_argument("--ops", type=int, default=5000)
+    p.add_argument("--batch", type=int, default=100)
+    p.add_argument("--value-size", type=int, default=32)
+    args = p.parse_args()
+    logging.disable(logging.INFO)
+
+    json_res = asyncio.run(run(False, args))
+    bin_res = asyncio.run(run(True, args))
+    print(f"{'op':<16} {'JSON ops/s':>12} {'binary ops/s':>13} {'speedup':>8}   (per CPU-second)")
+    for name in json_res:
+        j, b = json_res[name][1], bin_res[name][1]
+        print(f"{name:<16} {j:>12,.0f} {b:>13,.0f} {b / j:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One client process: `inflight` loops issuing puts and gets (half each) on
+# random keys against the node until `until`; returns its requests/sec.
+async def _client(url: str, keys: int, inflight: int, until: float, value: str) -> float:
+    done = 0
+    limits = httpx.Limits(max_connections=inflight, max_keepalive_connections=inflight)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=10.0) as c:
+        async def loop():
+            nonlocal done
+            rnd = random.Random()
+            while time.monotonic() < until:
+                key = f"k{rnd.randrange(keys)}"
+                if rnd.random() < 0.5:
+                    r = await c.post("/kv/put", json={"key": key, "value": value})
+                else:
+                    r = await c.get("/kv/get", params={"key": key})
+                if r.status_code == 200:
+                    done += 1
+
+        t0 = time.monotonic()
+        await asyncio.gather(*(loop() for _ in range(inflight)))
+        return done / (time.monotonic() - t0)
+
+def client_proc(url: str, keys: int, inflight: int, until: float, value: str, out) -> None:
+    out.put(asyncio.run(_client(url, keys, inflight, until, value)))
+
+def wait_ready(url: str, workers: int, timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    seen = set()
+    while time.monotonic() < deadline:
+        try:
+            state = httpx.get(f"{url}/debug/state", timeout=2.0).json()
+            seen.add(state["worker"]["index"] if state.get("worker") else 0)
+            # every worker answered (connections land on them at random)
+            if len(seen) == workers:
+                return
+        except (httpx.HTTPError, ValueError):
+            time.sleep(0.2)
+    raise RuntimeError(f"node at {url} not ready after {timeout_s}s (workers seen: {sorted(seen)})")
+
+def run(args, workers: int) -> dict:
+    port = args.port
+    url = f"http://127.0.0.1:{port}"
+    sock_dir = tempfile.mkdtemp(prefix="bench-workers-")
+    cmd = [sys.executable, "run_node.py", "--node-id", "b1", "--port", str(port), "--replication", "1", "--w", "1", "--q", "1", "--workers", str(workers), "--socket-dir", sock_dir]
+    node = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(url, workers)
+        ctx = multiprocessing.get_context("spawn")
+        out = ctx.Queue()
+        until = time.monotonic() + args.seconds + 2.0
+        procs = [ctx.Process(target=client_proc, args=(url, args.keys, args.inflight, until, "v" * args.value_size, out)) for _ in range(args.clients)]
+        for p in procs:
+            p.start()
+        # clients that start late measure a shorter window of their own
+        total = sum(out.get() for _ in procs)
+        for p in procs:
+            p.join()
+        return {"ops_s": total}
+    finally:
+        node.terminate()
+        node.wait(timeout=30)
+
+def main():
+    p = argparse.ArgumentParser(description="Client ops/sec of one node (R=1) by number of worker processes, driven by several client processes")
+    p.add_argument("--workers", default="1,2,4")
+    p.add_argument("--clients", type=int, default=4)
+    p.add_argument("--inflight", type=int, default=32, help="Requests in flight per client process")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--keys", type=int, default=10_000)
+    p.add_argument("--value-size", type=int, default=100)
+    p.add_argument("--port", type=int, default=8190)
+    args = p.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes x {args.inflight} in flight, {args.seconds:.0f} s, 50% put / 50% get")
+    print(f"{'workers':>7} {'ops/s':>9}")
+    for n in (int(x) for x in args.workers.split(",")):
+        r = run(args, n)
+        print(f"{n:>7} {r['ops_s']:>9,.0f}")
+
+if __name__ == "__main__":
+    main()
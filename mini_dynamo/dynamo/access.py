@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .store import BaseStore, IndexedStore, Record, StripedStore, write_group
+
+T = TypeVar("T")
+
+ACCESS_MODES = ["inline", "thread"]
+
+# How request handlers reach the store.
+#
+# "inline": operations run directly on the event loop. An in-memory
+# operation takes a few microseconds, far less than the threadpool hop
+# Starlette makes for sync handlers, and with every access on the loop
+# thread the store needs no locking at all.
+#
+# "thread": for engines that block (lsm: WAL fsync, SSTable reads),
+# operations run on a dedicated pool of `workers` threads over a
+# StripedStore, so the loop never waits on disk, writes to one key are
+# serialized and writes to different keys proceed in parallel.
+#
+# Batch methods apply the whole batch in one hop instead of one per key,
+# as one write group (one durability wait).
+# `index` (the IndexedStore inside `store`) serves key-order scans.
+class StoreAccess:
+    def __init__(self, store: BaseStore, mode: str = "inline", workers: int = 8, stripes: int = 64, index: Optional[IndexedStore] = None):
+        if mode not in ACCESS_MODES:
+            raise ValueError(f"Unknown store access mode {mode!r}, expected one of {ACCESS_MODES}")
+        self.mode = mode
+        self.index = index
+        self.store = StripedStore(store, stripes) if mode == "thread" else store
+        self._pool: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(workers, thread_name_prefix="store") if mode == "thread" else None
+        self.workers = workers if mode == "thread" else 0
+
+    async def call(self, fn: Callable[..., T], *args: Any) -> T:
+        if self._pool is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        return await self.call(self.store.put, key, value, ts)
+
+    async def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        return await self.call(self.store.delete, key, ts)
+
+    async def get(self, key: str) -> Optional[Record]:
+        return await self.call(self.store.get, key)
+
+    async def merge(self, key: str, rec: Record) -> bool:
+        return await self.call(self.store.merge, key, rec)
+
+    def _put_many(self, items: List[Tuple[str, str, float]]) -> List[Record]:
+        with write_group():
+            return [self.store.put(key, value, ts=ts) for key, value, ts in items]
+
+    def _delete_many(self, items: List[Tuple[str, float]]) -> List[Record]:
+        with write_group():
+            return [self.store.delete(key, ts=ts) for key, ts in items]
+
+    def _get_many(self, keys: List[str]) -> List[Optional[Record]]:
+        return [self.store.get(key) for key in keys]
+
+    def _merge_many(self, items: List[Tuple[str, Record]]) -> int:
+        with write_group():
+            return sum(1 for key, rec in items if self.store.merge(key, rec))
+
+    async def put_many(self, items: List[Tuple[str, str, float]]) -> List[Record]:
+        return await self.call(self._put_many, items)
+
+    async def delete_many(self, items: List[Tuple[str, float]]) -> List[Record]:
+        return await self.call(self._delete_many, items)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Record]]:
+        return await self.call(self._get_many, keys)
+
+    # Number of records applied (newer than what was stored).
+    async def merge_many(self, items: List[Tuple[str, Record]]) -> int:
+        return await self.call(self._merge_many, items)
+
+    # See IndexedStore.scan_keys.
+    async def scan_keys(self, prefix: str = "", start: Optional[str] = None, after: Optional[str] = None, limit: int = 500) -> List[Tuple[str, Record]]:
+        return await self.call(self.index.scan_keys, prefix, start, after, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "workers": self.workers}
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.store.close()
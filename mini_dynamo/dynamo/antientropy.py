@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import logging
+import random
+import struct
+import threading
+import time
+from array import array
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .access import StoreAccess
+from .membership import Membership
+from .store import BaseStore, Record
+from .transport import PeerTransport
+
+log = logging.getLogger("antientropy")
+
+_PAIR = struct.Struct("<QQ")
+
+def record_digest(key: str, rec: Record) -> int:
+    d = hashlib.blake2b(f"{key}\0{rec.ts!r}\0{int(rec.tombstone)}\0{rec.value}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(d, "little")
+
+def _node_hash(left: int, right: int) -> int:
+    return int.from_bytes(hashlib.blake2b(_PAIR.pack(left, right), digest_size=8).digest(), "little")
+
+# Incrementally maintained Merkle trees, one per peer, each covering the
+# keys this node replicates together with that peer (the ring ranges the two
+# share). Keys fall into 2**depth leaves by ring token; a leaf hash is the
+# XOR of its keys' record digests, so a write only flips one leaf per peer.
+# Internal levels are recomputed lazily when a tree is read. Updates may
+# come from store worker threads; leaf changes are made under a lock.
+#
+# On a node split across worker processes each worker indexes its own keys;
+# the leaf hashes of its siblings are XORed in through set_foreign() so the
+# trees it serves cover the whole node.
+class MerkleIndex:
+    def __init__(self, self_url: str, replicas_fn: Callable[[Sequence[str]], List[Sequence[str]]], token_fn: Callable[[str], int], token_bits: int, depth: int = 10):
+        self.self_url = self_url
+        self.replicas_fn = replicas_fn
+        self.token_fn = token_fn
+        self.token_bits = token_bits
+        self.depth = depth
+        self._shift = max(0, token_bits - depth)
+        # leaf -> {key: digest} for every key this node stores
+        self._keys: List[Dict[str, int]] = [dict() for _ in range(1 << depth)]
+        self._leaves: Dict[str, array] = {}
+        self._levels: Dict[str, List[List[int]]] = {}
+        self._foreign: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self.ring_version: Optional[int] = None
+        self.rebuild_s = 0.0
+        self.tree_s = 0.0
+        self.rebuilds = 0
+
+    def leaf_of(self, key: str) -> int:
+        return self.token_fn(key) >> self._shift
+
+    def _flip(self, key: str, leaf: int, digest: int, owners: Sequence[str]) -> None:
+        if self.self_url not in owners:
+            return
+        for peer in owners:
+            if peer == self.self_url:
+                continue
+            leaves = self._leaves.get(peer)
+            if leaves is None:
+                leaves = self._leaves[peer] = array("Q", bytes(8 << self.depth))
+            leaves[leaf] ^= digest
+            self._levels.pop(peer, None)
+
+    # Record that `key` now holds `rec` on this node.
+    def update(self, key: str, rec: Record) -> None:
+        leaf = self.leaf_of(key)
+        digest = record_digest(key, rec)
+        owners = self.replicas_fn([key])[0]
+        with self._lock:
+            old = self._keys[leaf].get(key)
+            if old == digest:
+                return
+            self._keys[leaf][key] = digest
+            self._flip(key, leaf, digest ^ (old or 0), owners)
+
+    def load(self, items: Iterator[Tuple[str, Record]]) -> None:
+        for key, rec in items:
+            self._keys[self.leaf_of(key)][key] = record_digest(key, rec)
+
+    # Recompute every peer tree for a new ring. Runs in chunks so the event
+    # loop keeps serving. Writes that land meanwhile flip (old ^ new) into the
+    # new leaves while the rebuild flips the snapshot digest, so both add up
+    # to the current digest.
+    async def rebuild(self, ring_version: Optional[int], chunk: int = 5000) -> None:
+        t0 = time.perf_counter()
+        snapshot: Dict[str, Tuple[int, int]] = {}
+        leaves: Dict[str, array] = {}
+        # Writes after the swap flip the new leaves by (new ^ old) digest,
+        # which composes with the snapshot's old digest flipped in below.
+        with self._lock:
+            for leaf, keys in enumerate(self._keys):
+                for k, d in keys.items():
+                    snapshot[k] = (leaf, d)
+            current, self._leaves = self._leaves, leaves
+        try:
+            names = list(snapshot)
+            for i in range(0, len(names), chunk):
+                part = names[i:i + chunk]
+                owners = self.replicas_fn(part)
+                with self._lock:
+                    for key, own in zip(part, owners):
+                        leaf, d = snapshot[key]
+                        self._flip(key, leaf, d, own)
+                await asyncio.sleep(0)
+        except BaseException:
+            with self._lock:
+                self._leaves = current
+            raise
+        self._levels.clear()
+        self.ring_version = ring_version
+        self.rebuild_s = time.perf_counter() - t0
+        self.rebuilds += 1
+
+    # This node's leaf hashes for `peer` in leaves [lo, hi).
+    def leaf_row(self, peer: str, lo: int = 0, hi: Optional[int] = None) -> List[int]:
+        leaves = self._leaves.get(peer)
+        hi = (1 << self.depth) if hi is None else hi
+        return list(leaves[lo:hi]) if leaves is not None else [0] * (hi - lo)
+
+    # Leaf hashes for `peer` held by other workers of this node.
+    def set_foreign(self, peer: str, row: List[int]) -> None:
+        if self._foreign.get(peer) != row:
+            self._foreign[peer] = row
+            self._levels.pop(peer, None)
+
+    def _tree(self, peer: str) -> List[List[int]]:
+        levels = self._levels.get(peer)
+        if levels is not None:
+            return levels
+        t0 = time.perf_counter()
+        level = self.leaf_row(peer)
+        foreign = self._foreign.get(peer)
+        if foreign is not None:
+            level = [a ^ b for a, b in zip(level, foreign)]
+        levels = [level]
+        while len(level) > 1:
+            level = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+            levels.append(level)
+        levels.reverse()
+        self._levels[peer] = levels
+        self.tree_s = time.perf_counter() - t0
+        return levels
+
+    def nodes(self, peer: str, level: int, indices: Sequence[int]) -> List[int]:
+        row = self._tree(peer)[level]
+        return [row[i] for i in indices]
+
+    # Keys (with digests) in the given leaves that are shared with `peer`.
+    def leaf_digests(self, peer: str, leaves: Sequence[int]) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for leaf in leaves:
+            keys = list(self._keys[leaf])
+            for key, owners in zip(keys, self.replicas_fn(keys)):
+                if peer in owners and self.self_url in owners:
+                    out[key] = self._keys[leaf][key]
+        return out
+
+# Store wrapper that feeds every applied write into a MerkleIndex.
+class TrackedStore(BaseStore):
+    def __init__(self, inner: BaseStore, index: MerkleIndex):
+        self.inner = inner
+        self.index = index
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        rec = self.inner.put(key, value, ts=ts)
+        self.index.update(key, rec)
+        return rec
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        rec = self.inner.delete(key, ts=ts)
+        self.index.update(key, rec)
+        return rec
+
+    def merge(self, key: str, rec: Record) -> bool:
+        if not self.inner.merge(key, rec):
+            return False
+        self.index.update(key, self.inner.get(key))
+        return True
+
+    def get(self, key: str) -> Optional[Record]:
+        return self.inner.get(key)
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        return self.inner.items()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def close(self) -> None:
+        self.inner.close()
+
+# Periodically picks an alive peer, compares Merkle trees top-down and
+# exchanges only the records under differing leaves: newer remote records
+# are merged locally, newer or missing local ones are pushed.
+#
+# `store` is a store or a StoreAccess. On a multi-process node `prepare`
+# (called with the peer before each sync) brings the sibling leaf hashes
+# into the index and `leaf_digests` collects digests from every worker.
+class AntiEntropy:
+    def __init__(self, index: MerkleIndex, store, transport: PeerTransport, membership: Membership, interval_s: float = 30.0, chunk: int = 500, prepare: Optional[Callable[[str], Awaitable[None]]] = None, leaf_digests: Optional[Callable[[str, List[int]], Awaitable[Dict[str, int]]]] = None):
+        self.index = index
+        self.access = store if isinstance(store, StoreAccess) else StoreAccess(store)
+        self.prepare = prepare
+        self.leaf_digests = leaf_digests
+        self.transport = transport
+        self.membership = membership
+        self.interval_s = interval_s
+        self.chunk = chunk
+        self.syncs = 0
+        self.sync_errors = 0
+        self.leaves_compared = 0
+        self.keys_compared = 0
+        self.pulled = 0
+        self.pushed = 0
+        self.last_sync_s = 0.0
+
+    async def _post(self, peer: str, path: str, payload: dict) -> dict:
+        r = await self.transport.post(peer, path, json=payload)
+        r.raise_for_status()
+        return r.json()
+
+    async def _diff_leaves(self, peer: str) -> List[int]:
+        me = self.index.self_url
+        idx = [0]
+        for level in range(self.index.depth + 1):
+            remote = (await self._post(peer, "/internal/merkle/nodes", {"peer": me, "level": level, "indices": idx}))["hashes"]
+            local = self.index.nodes(peer, level, idx)
+            diff = [i for i, a, b in zip(idx, local, remote) if a != b]
+            if not diff or level == self.index.depth:
+                return diff
+            idx = [c for i in diff for c in (2 * i, 2 * i + 1)]
+        return []
+
+    async def sync_with(self, peer: str) -> None:
+        t0 = time.perf_counter()
+        if self.prepare is not None:
+            await self.prepare(peer)
+        leaves = await self._diff_leaves(peer)
+        if leaves:
+            self.leaves_compared += len(leaves)
+            remote = (await self._post(peer, "/internal/merkle/leaves", {"peer": self.index.self_url, "leaves": leaves}))["digests"]
+            local = await self.leaf_digests(peer, leaves) if self.leaf_digests is not None else self.index.leaf_digests(peer, leaves)
+            differing = [k for k in set(local) | set(remote) if local.get(k) != remote.get(k)]
+            self.keys_compared += len(differing)
+            for i in range(0, len(differing), self.chunk):
+                await self._repair(peer, differing[i:i + self.chunk])
+        self.syncs += 1
+        self.last_sync_s = time.perf_counter() - t0
+
+    async def _repair(self, peer: str, keys: List[str]) -> None:
+        records = (await self._post(peer, "/internal/replica/get_batch", {"keys": keys}))["records"]
+        push = []
+        pull = []
+        for key, mine in zip(keys, await self.access.get_many(keys)):
+            data = records.get(key) or {}
+            theirs = Record(value=data.get("value"), ts=float(data.get("ts", 0.0)), tombstone=bool(data.get("tombstone", True)))
+            if theirs.ts > 0.0 and (mine is None or theirs.ts >= mine.ts):
+                pull.append((key, theirs))
+            # Equal timestamps with different digests (merging stores such as
+            # causal mode) go both ways.
+            if mine is not None and mine.ts >= theirs.ts:
+                push.append({"key": key, "value": mine.value, "ts": mine.ts, "tombstone": mine.tombstone})
+        if pull:
+            self.pulled += await self.access.merge_many(pull)
+        if push:
+            await self._post(peer, "/internal/replica/merge_batch", {"items": push})
+            self.pushed += len(push)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            peers = [p for p in self.membership.all_nodes() if p != self.index.self_url and self.membership.is_alive(p)]
+            if not peers:
+                continue
+            peer = random.choice(peers)
+            try:
+                await self.sync_with(peer)
+            except Exception:
+                self.sync_errors += 1
+                log.debug("Anti-entropy sync with %s failed", peer, exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "leaves_compared": self.leaves_compared,
+            "keys_compared": self.keys_compared,
+            "keys_pulled": self.pulled,
+            "keys_pushed": self.pushed,
+            "last_sync_s": self.last_sync_s,
+            "rebuild_s": self.index.rebuild_s,
+            "tree_build_s": self.index.tree_s,
+            "tree_rebuilds": self.index.rebuilds,
+            "ring_version": self.index.ring_version,
+        }
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .store import BaseStore, Record
+
+log = logging.getLogger("cache")
+
+# Per-entry bookkeeping on top of the cached value (dict and key objects).
+ENTRY_OVERHEAD = 200
+
+class _Entry:
+    __slots__ = ("value", "size", "expires")
+
+    def __init__(self, value: Any, size: int, expires: float):
+        self.value = value
+        self.size = size
+        self.expires = expires
+
+# Coordinator read cache: segmented LRU bounded in bytes, entries expiring
+# after ttl_s. New entries land in the probation segment; a second hit
+# promotes them to the protected segment (at most `protected` of the
+# bytes), whose overflow is demoted back to probation. Eviction takes the
+# least recently used probation entries first, so a scan of one-off keys
+# cannot flush the keys that are read again and again.
+#
+# A read result may only be cached if no invalidation of its key happened
+# since the read began: take a ticket() before reading and pass it to
+# put(). Invalidations are remembered for the last `remember` keys; a
+# ticket older than the oldest one forgotten is refused for every key.
+class ReadCache:
+    def __init__(self, max_bytes: int, ttl_s: float = 5.0, protected: float = 0.8, remember: int = 10_000, clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.protected_bytes = int(max_bytes * protected)
+        self.remember = remember
+        self.clock = clock
+        self._probation: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._protected: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._probation_size = 0
+        self._protected_size = 0
+        self._version = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._forgotten_before = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.refused = 0
+
+    @property
+    def size(self) -> int:
+        return self._probation_size + self._protected_size
+
+    def __len__(self) -> int:
+        return len(self._probation) + len(self._protected)
+
+    def get(self, key: str) -> Optional[Any]:
+        e = self._protected.get(key)
+        if e is not None:
+            if e.expires <= self.clock():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._protected.move_to_end(key)
+            self.hits += 1
+            return e.value
+        e = self._probation.get(key)
+        if e is None or e.expires <= self.clock():
+            if e is not None:
+                self._drop(key)
+                self.expirations += 1
+            self.misses += 1
+            return None
+        # second hit: promote
+        del self._probation[key]
+        self._probation_size -= e.size
+        self._protected[key] = e
+        self._protected_size += e.size
+        while self._protected_size > self.protected_bytes and len(self._protected) > 1:
+            k, old = self._protected.popitem(last=False)
+            self._protected_size -= old.size
+            self._probation[k] = old
+            self._probation_size += old.size
+        self.hits += 1
+        return e.value
+
+    def ticket(self) -> int:
+        return self._version
+
+    def put(self, key: str, value: Any, size: int, ticket: int) -> bool:
+        since = self._invalidated.get(key)
+        if ticket < self._forgotten_before or (since is not None and since > ticket):
+            self.refused += 1
+            return False
+        size += ENTRY_OVERHEAD + len(key)
+        if size > self.max_bytes:
+            return False
+        self._drop(key)
+        self._probation[key] = _Entry(value, size, self.clock() + self.ttl_s)
+        self._probation_size += size
+        while self.size > self.max_bytes:
+            segment = self._probation if self._probation else self._protected
+            _, old = segment.popitem(last=False)
+            if segment is self._probation:
+                self._probation_size -= old.size
+            else:
+                self._protected_size -= old.size
+            self.evictions += 1
+        return True
+
+    def _drop(self, key: str) -> bool:
+        e = self._probation.pop(key, None)
+        if e is not None:
+            self._probation_size -= e.size
+            return True
+        e = self._protected.pop(key, None)
+        if e is not None:
+            self._protected_size -= e.size
+            return True
+        return False
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._version += 1
+            self._invalidated[key] = self._version
+            self._invalidated.move_to_end(key)
+            if self._drop(key):
+                self.invalidations += 1
+        while len(self._invalidated) > self.remember:
+            _, v = self._invalidated.popitem(last=False)
+            self._forgotten_before = v
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "protected_entries": len(self._protected),
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "refused": self.refused,
+        }
+
+# Store wrapper reporting every key whose record changed: puts and deletes
+# always overwrite, merges only when applied. Called from whichever thread
+# writes.
+class ChangeNotifyingStore(BaseStore):
+    def __init__(self, inner: BaseStore, on_change: Callable[[str], None]):
+        self.inner = inner
+        self.on_change = on_change
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        rec = self.inner.put(key, value, ts=ts)
+        self.on_change(key)
+        return rec
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        rec = self.inner.delete(key, ts=ts)
+        self.on_change(key)
+        return rec
+
+    def merge(self, key: str, rec: Record) -> bool:
+        if not self.inner.merge(key, rec):
+            return False
+        self.on_change(key)
+        return True
+
+    def get(self, key: str) -> Optional[Record]:
+        return self.inner.get(key)
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        return self.inner.items()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def close(self) -> None:
+        self.inner.close()
+
+# Tells the nodes that may have cached a key that this replica applied a
+# newer record for it. Changed keys are collected and sent every
+# interval_s, one message per flush to every alive peer, so the cost grows
+# with the write rate only through the length of the key lists. `send` is
+# called with (peer, keys), `local` with the keys for this node's caches.
+class CacheInvalidator:
+    def __init__(self, peers_fn: Callable[[], List[str]], send: Callable[[str, List[str]], Awaitable[Any]], local: Callable[[List[str]], Awaitable[None]], interval_s: float = 0.05, max_keys: int = 5000):
+        self.peers_fn = peers_fn
+        self.send = send
+        self.local = local
+        self.interval_s = interval_s
+        self.max_keys = max_keys
+        self._pending: set = set()
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.keys_sent = 0
+        self.send_errors = 0
+
+    def changed(self, key: str) -> None:
+        with self._lock:
+            self._pending.add(key)
+
+    def _take(self) -> List[str]:
+        with self._lock:
+            keys, self._pending = self._pending, set()
+        return list(keys)
+
+    async def flush(self) -> None:
+        keys = self._take()
+        if not keys:
+            return
+        self.flushes += 1
+        await self.local(keys)
+        peers = self.peers_fn()
+        for i in range(0, len(keys), self.max_keys):
+            part = keys[i:i + self.max_keys]
+            results = await asyncio.gather(*(self.send(p, part) for p in peers), return_exceptions=True)
+            self.send_errors += sum(1 for r in results if isinstance(r, Exception))
+            self.keys_sent += len(part) * len(peers)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.flush()
+            except Exception:
+                log.debug("Cache invalidation flush failed", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._pending), "flushes": self.flushes, "keys_sent": self.keys_sent, "send_errors": self.send_errors}
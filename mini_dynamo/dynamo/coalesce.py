@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Per-key deduplication of concurrent work (singleflight): a caller asking
+# for a key with a call already in flight waits for that call's result
+# instead of starting its own. The call runs as its own task, so a caller
+# going away does not cancel it for the others.
+#
+# forget() detaches a key's call: callers arriving afterwards start a new
+# one. A write calls it once acknowledged, so a read that began before the
+# write is never handed to a reader that arrived after it.
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.started = 0
+        self.joined = 0
+        self.forgotten = 0
+
+    # Returns (result, shared) where shared tells whether the call was
+    # already in flight.
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        fut = self._flights.get(key)
+        shared = fut is not None
+        if shared:
+            self.joined += 1
+        else:
+            self.started += 1
+            fut = self._flights[key] = asyncio.ensure_future(fn())
+            fut.add_done_callback(lambda f, key=key: self._done(key, f))
+        return await asyncio.shield(fut), shared
+
+    def _done(self, key: str, fut: asyncio.Future) -> None:
+        if self._flights.get(key) is fut:
+            del self._flights[key]
+        if not fut.cancelled():
+            # retrieved by the callers; keeps a failure nobody awaits quiet
+            fut.exception()
+
+    def forget(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            if self._flights.pop(key, None) is not None:
+                self.forgotten += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.started + self.joined
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "joined": self.joined,
+            "forgotten": self.forgotten,
+            "hit_ratio": round(self.joined / total, 4) if total else 0.0,
+        }
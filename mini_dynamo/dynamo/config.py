@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 @dataclass
 class NodeConfig:
@@ -14,4 +14,94 @@ class NodeConfig:
     request_timeout_s: float = 1.5
     heartbeat_interval_s: float = 1.0
     peer_dead_after_s: float = 3.5
-    virtual_nodes: int = 50
\ No newline at end of file
+    # Phi-accrual suspicion over heartbeat arrivals; suspected replicas are
+    # skipped by routing (stand-ins take hinted writes) before they are dead
+    phi_threshold: float = 8.0
+    # Failure detection: "heartbeat" (all-to-all, original) or "swim"
+    # (randomized probing with indirect pings and piggybacked gossip)
+    membership_protocol: str = "heartbeat"
+    swim_period_s: float = 1.0
+    swim_ping_timeout_s: float = 0.3
+    swim_indirect_k: int = 3
+    swim_suspect_mult: float = 4.0
+    # Dead peers keep their ring position (writes are hinted) until this long
+    ring_remove_after_s: float = 30.0
+    virtual_nodes: int = 50
+    # Key placement: "md5" (original), "blake2b", "xxhash" or "rendezvous"
+    partitioner: str = "md5"
+
+    # Conflict resolution: "lww" (wall-clock last-write-wins) or "causal"
+    # (dotted version vectors with siblings)
+    versioning: str = "lww"
+    max_vv_entries: int = 16
+
+    # Storage engine: "memory", "compact" (columnar in-memory arrays) or
+    # "lsm" (WAL + SSTables under data_dir)
+    engine: str = "memory"
+    data_dir: Optional[str] = None
+    # WAL fsync policy for "lsm": "always", "group" (writes return once a
+    # shared fsync covers them) or "none" (never fsync)
+    wal_sync: str = "group"
+    # Store access from handlers: "inline" (on the event loop), "thread"
+    # (worker pool over lock stripes) or "auto" (thread for blocking engines)
+    store_access: str = "auto"
+    store_threads: int = 8
+    store_stripes: int = 64
+    # Worker processes serving this node (one store per token sub-range,
+    # reaching each other over Unix sockets in socket_dir); see run_node.py
+    workers: int = 1
+    worker_index: int = 0
+    socket_dir: Optional[str] = None
+    shard_timeout_s: float = 5.0
+
+    # Peer transport (shared connection pools)
+    max_connections_per_peer: int = 100
+    max_keepalive_per_peer: int = 20
+    keepalive_expiry_s: float = 30.0
+    http2: bool = False
+    # Replica calls as binary frames on /internal/bin (JSON for peers without it)
+    binary_internal: bool = True
+    # Single-key replica writes to one peer are sent together, up to this
+    # many per request and waiting at most the delay under load (<= 1 disables)
+    write_batch_items: int = 64
+    write_batch_delay_s: float = 0.0005
+
+    # Key- and token-ordered index over the store for /kv/scan (off: scans
+    # return 404; the index costs about as much memory as the keys again)
+    range_scans: bool = False
+
+    # Rebalancing: stream moved token ranges to new owners on ring changes
+    rebalance: bool = True
+    rebalance_batch: int = 500
+    rebalance_rate: float = 5000.0
+    rebalance_max_transition_s: float = 300.0
+
+    # Hinted handoff
+    hint_fallbacks: int = 2
+    hint_max: int = 100_000
+    hint_replay_batch: int = 200
+    hint_replay_rate: float = 2000.0
+
+    # Anti-entropy (Merkle tree sync with one random peer per interval; 0,
+    # the default, disables it). The trees keep a digest per key and are
+    # loaded from a full pass over the store at startup.
+    anti_entropy_interval_s: float = 0.0
+    merkle_depth: int = 10
+
+    # Concurrent client reads of one key share one quorum read (singleflight)
+    coalesce_reads: bool = True
+
+    # Coordinator read cache for /kv/get?consistency=cached (0 bytes disables).
+    # Replicas broadcast the keys they apply writes for every interval.
+    read_cache_bytes: int = 0
+    read_cache_ttl_s: float = 5.0
+    cache_invalidate_interval_s: float = 0.05
+
+    # Read repair (background write-back of the newest record to stale replicas)
+    read_repair: bool = True
+    read_repair_batch: int = 200
+    read_repair_rate: float = 2000.0
+
+    # Replica writes still in flight after W acks finish in the background
+    max_background_writes: int = 10_000
+    late_write_timeout_s: float = 5.0
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .membership import Membership
+from .store import BaseStore, Record
+from .transport import PeerTransport
+
+log = logging.getLogger("handoff")
+
+# Writes held for replicas that could not take them. Hints are kept per
+# target node and per key (only the newest record of a key matters), the
+# total is bounded, and, when a path is given, every hint is appended to a
+# JSON-lines log that is replayed on startup and rewritten as hints drain.
+# Log lines and rewrites are queued in memory and written by `flush` on a
+# worker thread, so the event loop never waits on the file; hints added
+# since the last flush are lost if the process dies. Delivered hints may
+# be replayed again after a crash; merges are LWW, so that is harmless.
+# `resolve` combines two hints for the same key.
+class HintQueue:
+    def __init__(self, max_hints: int = 100_000, path: Optional[str] = None, resolve: Callable[[Optional[Record], Optional[Record]], Optional[Record]] = BaseStore.newer):
+        self.max_hints = max_hints
+        self.resolve = resolve
+        self.path = path
+        self._hints: Dict[str, "OrderedDict[str, Record]"] = {}
+        self._size = 0
+        self._stale_lines = 0
+        self._lines: List[str] = []
+        self.dropped = 0
+        self._log = None
+        self._io_lock = threading.Lock()
+        if path:
+            self._load()
+            self._log = open(path, "a")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    h = json.loads(line)
+                except ValueError:
+                    continue
+                self._insert(h["target"], h["key"], Record(value=h.get("value"), ts=float(h["ts"]), tombstone=bool(h.get("tombstone"))))
+        if self._size:
+            log.info("Loaded %d hints from %s", self._size, self.path)
+        self._write_snapshot(self._snapshot())
+
+    def _insert(self, target: str, key: str, rec: Record) -> bool:
+        q = self._hints.setdefault(target, OrderedDict())
+        cur = q.get(key)
+        if cur is not None:
+            new = self.resolve(cur, rec)
+            if new == cur:
+                return False
+            q[key] = new
+            return True
+        if self._size >= self.max_hints:
+            self.dropped += 1
+            return False
+        q[key] = rec
+        self._size += 1
+        return True
+
+    def add(self, target: str, key: str, rec: Record) -> bool:
+        if not self._insert(target, key, rec):
+            return False
+        if self._log is not None:
+            self._lines.append(_line(target, key, rec))
+        return True
+
+    def targets(self) -> List[str]:
+        return [t for t, q in self._hints.items() if q]
+
+    def peek(self, target: str, n: int) -> List[Tuple[str, Record]]:
+        q = self._hints.get(target)
+        if not q:
+            return []
+        out = []
+        for key, rec in q.items():
+            out.append((key, rec))
+            if len(out) >= n:
+                break
+        return out
+
+    # Drop delivered hints, unless a newer hint for the key arrived meanwhile.
+    def ack(self, target: str, delivered: List[Tuple[str, Record]]) -> None:
+        q = self._hints.get(target)
+        if q is None:
+            return
+        for key, rec in delivered:
+            cur = q.get(key)
+            if cur is not None and (cur == rec or cur.ts < rec.ts):
+                del q[key]
+                self._size -= 1
+                self._stale_lines += 1
+        if not q:
+            del self._hints[target]
+
+    def _snapshot(self) -> List[Tuple[str, List[Tuple[str, Record]]]]:
+        return [(target, list(q.items())) for target, q in self._hints.items()]
+
+    def _write_snapshot(self, snapshot: List[Tuple[str, List[Tuple[str, Record]]]]) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for target, items in snapshot:
+                f.writelines(_line(target, key, rec) for key, rec in items)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    # What the next flush writes: new log lines, or a snapshot of every hint
+    # to rewrite the log from once it is mostly delivered hints (or, with
+    # `compact`, holds any).
+    def _take_writes(self, compact: bool = False) -> Tuple[List[str], Optional[List[Tuple[str, List[Tuple[str, Record]]]]]]:
+        snapshot = None
+        if self._stale_lines and (compact or self._size == 0 or self._stale_lines > max(1000, self._size)):
+            snapshot = self._snapshot()
+            self._stale_lines = 0
+            self._lines = []
+        lines, self._lines = self._lines, []
+        return lines, snapshot
+
+    def _write(self, lines: List[str], snapshot: Optional[List[Tuple[str, List[Tuple[str, Record]]]]]) -> None:
+        with self._io_lock:
+            if self._log is None:
+                return
+            if snapshot is not None:
+                self._log.close()
+                self._write_snapshot(snapshot)
+                self._log = open(self.path, "a")
+            if lines:
+                self._log.writelines(lines)
+                self._log.flush()
+
+    # Write queued log lines (or a rewrite) on a worker thread.
+    async def flush(self) -> None:
+        if self._log is None:
+            return
+        lines, snapshot = self._take_writes()
+        if lines or snapshot is not None:
+            await asyncio.to_thread(self._write, lines, snapshot)
+
+    def stats(self) -> Dict[str, object]:
+        return {"pending": self._size, "dropped": self.dropped, "targets": {t: len(q) for t, q in self._hints.items()}}
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._write(*self._take_writes(compact=True))
+            with self._io_lock:
+                self._log.close()
+                self._log = None
+
+def _line(target: str, key: str, rec: Record) -> str:
+    return json.dumps({"target": target, "key": key, "value": rec.value, "ts": rec.ts, "tombstone": rec.tombstone}) + "\n"
+
+# Replays hints to their intended replica once membership sees it alive
+# again, in batches of `batch_size` and at most `rate` records per second.
+class HintedHandoff:
+    def __init__(self, queue: HintQueue, transport: PeerTransport, membership: Membership, batch_size: int = 200, rate: float = 2000.0, interval_s: float = 1.0, flush_interval_s: float = 0.05):
+        self.queue = queue
+        self.transport = transport
+        self.membership = membership
+        self.batch_size = max(1, batch_size)
+        self.rate = rate
+        self.interval_s = interval_s
+        self.flush_interval_s = flush_interval_s
+        self.replayed = 0
+        self.replay_errors = 0
+
+    def hint(self, target: str, key: str, rec: Record) -> None:
+        if self.queue.add(target, key, rec):
+            log.debug("Stored hint for %s key=%s", target, key)
+
+    async def _replay_target(self, target: str) -> None:
+        while self.membership.is_alive(target):
+            batch = self.queue.peek(target, self.batch_size)
+            if not batch:
+                return
+            items = [{"key": k, "value": r.value, "ts": r.ts, "tombstone": r.tombstone} for k, r in batch]
+            try:
+                resp = await self.transport.post(target, "/internal/replica/merge_batch", json={"items": items})
+                ok = resp.status_code == 200
+            except Exception:
+                ok = False
+            if not ok:
+                self.replay_errors += 1
+                return
+            self.queue.ack(target, batch)
+            self.replayed += len(batch)
+            if self.rate > 0:
+                await asyncio.sleep(len(batch) / self.rate)
+
+    async def replay_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            for target in self.queue.targets():
+                if self.membership.is_alive(target):
+                    await self._replay_target(target)
+
+    # Persist new hints and acks every `flush_interval_s`.
+    async def flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            await self.queue.flush()
+
+    def stats(self) -> Dict[str, object]:
+        return {**self.queue.stats(), "replayed": self.replayed, "replay_errors": self.replay_errors}
@@ -1,66 +1,231 @@
-import hashlib
-from bisect import bisect_right
+from array import array
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-def _h(s: str) -> int:
-    # Return a 32-bit hash of the input string.
-    return int(hashlib.md5(s.encode("utf-8")).hexdigest()[:8], 16)
+from .partitioner import Md5Partitioner, Partitioner, get_partitioner, mix64
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 @dataclass(frozen=True)
 class RingNode:
     base_url: str
 
-# Consistent hashing ring implementation with virtual nodes
+# Consistent hashing ring implementation with virtual nodes.
+# Tokens live in a sorted array("I") (array("Q") for 64-bit partitioners)
+# with a parallel array of node slots; preference lists are precomputed per
+# ring segment, so a lookup is one bisect plus one table read.
 class ConsistentHashRing:
-    def __init__(self, nodes: List[str], vnodes: int = 50):
+    def __init__(self, nodes: List[str], vnodes: int = 50, partitioner: Optional[Partitioner] = None):
         self.vnodes = max(1, vnodes)
-        self._ring: List[Tuple[int, str]] = []
-        self._nodes = sorted(set(nodes))
-        self._build()
-
-    def _build(self):
-        ring: List[Tuple[int, str]] = []
-        for n in self._nodes:
-            for i in range(self.vnodes):
-                ring.append((_h(f"{n}#{i}"), n))
-        ring.sort(key=lambda x: x[0])
-        self._ring = ring
+        self.partitioner = partitioner or Md5Partitioner()
+        self.token = self.partitioner.token
+        self._typecode = "Q" if self.partitioner.bits > 32 else "I"
+        self._tokens = array(self._typecode)
+        self._owners = array("I")
+        self._slots: List[Optional[str]] = []
+        self._slot_of: Dict[str, int] = {}
+        self._nodes: List[str] = []
+        # r -> per-segment tuple of r distinct nodes, built lazily
+        self._pref: Dict[int, List[Tuple[str, ...]]] = {}
+        # Membership version the ring was last synced to (None = never synced).
+        self.version: Optional[int] = None
+        for n in sorted(set(nodes)):
+            self.add_node(n)
 
     @property
     def nodes(self) -> List[str]:
         return list(self._nodes)
 
-    def set_nodes(self, nodes: List[str]) -> None:
-        self._nodes = sorted(set(nodes))
-        self._build()
+    def __len__(self) -> int:
+        return len(self._tokens)
 
-    def owner(self, key: str) -> str:
-        if not self._ring:
+    def _alloc_slot(self, node: str) -> int:
+        try:
+            slot = self._slots.index(None)
+            self._slots[slot] = node
+        except ValueError:
+            slot = len(self._slots)
+            self._slots.append(node)
+        self._slot_of[node] = slot
+        return slot
+
+    def add_node(self, node: str) -> None:
+        if node in self._slot_of:
+            return
+        slot = self._alloc_slot(node)
+        self._nodes.insert(bisect_left(self._nodes, node), node)
+        tokens, owners, slots = self._tokens, self._owners, self._slots
+        for i in range(self.vnodes):
+            t = self.token(f"{node}#{i}")
+            idx = bisect_left(tokens, t)
+            # Break token collisions by node name so every node builds the same ring.
+            while idx < len(tokens) and tokens[idx] == t and slots[owners[idx]] < node:
+                idx += 1
+            tokens.insert(idx, t)
+            owners.insert(idx, slot)
+        self._pref.clear()
+
+    def remove_node(self, node: str) -> None:
+        slot = self._slot_of.pop(node, None)
+        if slot is None:
+            return
+        self._nodes.remove(node)
+        keep = [i for i, o in enumerate(self._owners) if o != slot]
+        self._tokens = array(self._typecode, (self._tokens[i] for i in keep))
+        self._owners = array("I", (self._owners[i] for i in keep))
+        self._slots[slot] = None
+        self._pref.clear()
+
+    # Apply only the difference against the current node set; vnodes of
+    # unchanged nodes are left in place.
+    def set_nodes(self, nodes: Iterable[str], version: Optional[int] = None) -> None:
+        new = set(nodes)
+        old = set(self._nodes)
+        for n in old - new:
+            self.remove_node(n)
+        for n in sorted(new - old):
+            self.add_node(n)
+        self.version = version
+
+    def _preference_table(self, r: int) -> List[Tuple[str, ...]]:
+        table = self._pref.get(r)
+        if table is not None:
+            return table
+        owners, slots = self._owners, self._slots
+        n = len(owners)
+        interned: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        table = []
+        for start in range(n):
+            out: List[str] = []
+            i = start
+            while len(out) < r:
+                node = slots[owners[i]]
+                if node not in out:
+                    out.append(node)
+                i += 1
+                if i == n:
+                    i = 0
+            t = tuple(out)
+            table.append(interned.setdefault(t, t))
+        self._pref[r] = table
+        return table
+
+    def _index(self, key: str) -> int:
+        if not self._tokens:
             raise RuntimeError("Ring has no nodes")
-        key_h = _h(key)
-        idx = bisect_right(self._ring, (key_h, chr(0x10FFFF)))
-        if idx == len(self._ring):
+        idx = bisect_right(self._tokens, self.token(key))
+        if idx == len(self._tokens):
             idx = 0
-        return self._ring[idx][1]
+        return idx
+
+    def owner(self, key: str) -> str:
+        return self._slots[self._owners[self._index(key)]]
 
     # Return up to r distinct node URLs (clockwise) starting at owner.
     def replicas(self, key: str, r: int) -> List[str]:
-        if not self._ring:
+        idx = self._index(key)
+        r = min(max(1, r), len(self._nodes))
+        return list(self._preference_table(r)[idx])
+
+    # Range boundaries: the ring segment [tokens[i-1], tokens[i]) belongs to
+    # vnode i (the first segment wraps around).
+    def boundaries(self) -> List[int]:
+        return list(self._tokens)
+
+    # Preference list for a token (rather than a key).
+    def owners_at(self, token: int, r: int) -> Tuple[str, ...]:
+        if not self._tokens:
             raise RuntimeError("Ring has no nodes")
-        r = max(1, r)
-        key_h = _h(key)
-        idx = bisect_right(self._ring, (key_h, chr(0x10FFFF)))
-        if idx == len(self._ring):
-            idx = 0
+        idx = bisect_right(self._tokens, token)
+        r = min(max(1, r), len(self._nodes))
+        return self._preference_table(r)[0 if idx == len(self._tokens) else idx]
 
-        seen = set()
+    # Bulk routing: hash and locate many keys at once.
+    def replicas_many(self, keys: Sequence[str], r: int) -> List[Tuple[str, ...]]:
+        if not self._tokens:
+            raise RuntimeError("Ring has no nodes")
+        r = min(max(1, r), len(self._nodes))
+        table = self._preference_table(r)
+        n = len(self._tokens)
+        hashes = self.partitioner.tokens(keys)
+        if np is not None:
+            dtype = np.uint64 if self._typecode == "Q" else np.uint32
+            ring = np.frombuffer(self._tokens, dtype=dtype)
+            idxs = np.searchsorted(ring, np.asarray(hashes, dtype=dtype), side="right")
+            idxs[idxs == n] = 0
+            return [table[i] for i in idxs.tolist()]
+        tokens = self._tokens
         out = []
-        i = idx
-        while len(out) < min(r, len(self._nodes)):
-            node = self._ring[i][1]
-            if node not in seen:
-                seen.add(node)
-                out.append(node)
-            i = (i + 1) % len(self._ring)
-        return out
\ No newline at end of file
+        for h in hashes:
+            idx = bisect_right(tokens, h)
+            out.append(table[0 if idx == n else idx])
+        return out
+
+# Highest-random-weight (rendezvous) placement: every node scores every key
+# and the r best scores win. No vnodes; a join or leave only moves keys
+# whose top-r set contained (or now contains) that node.
+class RendezvousRing:
+    def __init__(self, nodes: List[str], partitioner: Optional[Partitioner] = None):
+        self.partitioner = partitioner or get_partitioner("blake2b")
+        self.token = self.partitioner.token
+        self._nodes: List[str] = []
+        self._seeds: List[int] = []
+        self.version: Optional[int] = None
+        for n in sorted(set(nodes)):
+            self.add_node(n)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add_node(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        idx = bisect_left(self._nodes, node)
+        self._nodes.insert(idx, node)
+        self._seeds.insert(idx, self.token(node))
+
+    def remove_node(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        idx = self._nodes.index(node)
+        del self._nodes[idx]
+        del self._seeds[idx]
+
+    def set_nodes(self, nodes: Iterable[str], version: Optional[int] = None) -> None:
+        new = set(nodes)
+        for n in set(self._nodes) - new:
+            self.remove_node(n)
+        for n in sorted(new - set(self._nodes)):
+            self.add_node(n)
+        self.version = version
+
+    def _ranked(self, h: int, r: int) -> Tuple[str, ...]:
+        scored = sorted(zip((mix64(h ^ s) for s in self._seeds), self._nodes), reverse=True)
+        return tuple(n for _, n in scored[:r])
+
+    def owner(self, key: str) -> str:
+        return self.replicas(key, 1)[0]
+
+    def replicas(self, key: str, r: int) -> List[str]:
+        if not self._nodes:
+            raise RuntimeError("Ring has no nodes")
+        return list(self._ranked(self.token(key), max(1, r)))
+
+    def replicas_many(self, keys: Sequence[str], r: int) -> List[Tuple[str, ...]]:
+        if not self._nodes:
+            raise RuntimeError("Ring has no nodes")
+        r = max(1, r)
+        return [self._ranked(h, r) for h in self.partitioner.tokens(keys)]
+
+def make_ring(partitioner: str, nodes: List[str], vnodes: int = 50):
+    if partitioner == "rendezvous":
+        return RendezvousRing(nodes)
+    return ConsistentHashRing(nodes, vnodes=vnodes, partitioner=get_partitioner(partitioner))
@@ -0,0 +1,65 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+
+class PeerLatency:
+    __slots__ = ("ewma", "samples", "failures")
+
+    def __init__(self, window: int):
+        self.ewma: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.failures = 0
+
+# Per-peer response times: an EWMA and a sliding window of samples for
+# percentiles, reported per peer in /debug/state. Failures count as a slow
+# sample (`failure_penalty_s`) in the EWMA so a flaky peer stands out.
+class LatencyTracker:
+    def __init__(self, alpha: float = 0.2, window: int = 256, min_samples: int = 20, failure_penalty_s: float = 1.0):
+        self.alpha = alpha
+        self.window = window
+        self.min_samples = min_samples
+        self.failure_penalty_s = failure_penalty_s
+        self._peers: Dict[str, PeerLatency] = {}
+
+    def _peer(self, url: str) -> PeerLatency:
+        p = self._peers.get(url)
+        if p is None:
+            p = self._peers[url] = PeerLatency(self.window)
+        return p
+
+    def _ewma(self, p: PeerLatency, seconds: float) -> None:
+        p.ewma = seconds if p.ewma is None else p.ewma + self.alpha * (seconds - p.ewma)
+
+    def observe(self, url: str, seconds: float) -> None:
+        p = self._peer(url)
+        self._ewma(p, seconds)
+        p.samples.append(seconds)
+
+    def failure(self, url: str) -> None:
+        p = self._peer(url)
+        p.failures += 1
+        self._ewma(p, self.failure_penalty_s)
+
+    def ewma(self, url: str) -> Optional[float]:
+        p = self._peers.get(url)
+        return p.ewma if p is not None else None
+
+    def percentile(self, url: str, pct: float) -> Optional[float]:
+        p = self._peers.get(url)
+        if p is None or len(p.samples) < self.min_samples:
+            return None
+        s = sorted(p.samples)
+        return s[min(len(s) - 1, int(pct / 100.0 * len(s)))]
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        out = {}
+        for url, p in self._peers.items():
+            ms = lambda v: None if v is None else round(v * 1000.0, 3)
+            out[url] = {
+                "ewma_ms": ms(p.ewma),
+                "p50_ms": ms(self.percentile(url, 50)),
+                "p95_ms": ms(self.percentile(url, 95)),
+                "p99_ms": ms(self.percentile(url, 99)),
+                "samples": len(p.samples),
+                "failures": p.failures,
+            }
+        return out
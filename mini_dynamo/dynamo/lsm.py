@@ -0,0 +1,532 @@
+import hashlib
+import heapq
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .store import BaseStore, Record, defer_durability
+
+log = logging.getLogger("lsm")
+
+# Entry layout shared by the WAL and SSTables:
+# key length, value length, timestamp, flags, key bytes, value bytes.
+_ENTRY = struct.Struct("<HIdB")
+_FRAME = struct.Struct("<II")  # WAL frame: payload length, crc32
+_INDEX = struct.Struct("<HQ")  # sparse index: key length, data offset
+_FOOTER = struct.Struct("<QQQQIQQ")  # index off, index count, bloom off, bloom bits, k, entries, magic
+_MAGIC = 0x3154535344594D44  # "DMYDSST1"
+_TOMBSTONE = 1
+
+_Entry = Tuple[bytes, float, bool, Optional[bytes]]
+
+def _encode(key: bytes, value: Optional[bytes], ts: float, tombstone: bool) -> bytes:
+    val = value or b""
+    return _ENTRY.pack(len(key), len(val), ts, _TOMBSTONE if tombstone else 0) + key + val
+
+def _decode(buf, off: int) -> Tuple[_Entry, int]:
+    klen, vlen, ts, flags = _ENTRY.unpack_from(buf, off)
+    off += _ENTRY.size
+    key = bytes(buf[off:off + klen])
+    off += klen
+    tomb = bool(flags & _TOMBSTONE)
+    value = None if tomb else bytes(buf[off:off + vlen])
+    return (key, ts, tomb, value), off + vlen
+
+def _to_record(e: _Entry) -> Record:
+    _, ts, tomb, value = e
+    return Record(value=None if tomb else value.decode("utf-8"), ts=ts, tombstone=tomb)
+
+class BloomFilter:
+    def __init__(self, nbits: int, k: int, bits: Optional[bytearray] = None):
+        self.nbits = max(64, nbits)
+        self.k = k
+        self.bits = bits if bits is not None else bytearray((self.nbits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n: int, bits_per_key: int = 10) -> "BloomFilter":
+        return cls(n * bits_per_key, k=max(1, int(bits_per_key * 0.69)))
+
+    # The two base hashes of `key`, computed once per lookup across tables.
+    @staticmethod
+    def hash(key: bytes) -> Tuple[int, int]:
+        d = hashlib.blake2b(key, digest_size=16).digest()
+        return int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+
+    def _positions(self, h: Tuple[int, int]):
+        h1, h2 = h
+        m = self.nbits
+        for i in range(self.k):
+            yield (h1 + i * h2) % m
+
+    def add(self, key: bytes) -> None:
+        bits = self.bits
+        for p in self._positions(self.hash(key)):
+            bits[p >> 3] |= 1 << (p & 7)
+
+    def contains_hash(self, h: Tuple[int, int]) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(h))
+
+    def __contains__(self, key: bytes) -> bool:
+        return self.contains_hash(self.hash(key))
+
+# Immutable sorted table read through mmap. Only the sparse index and the
+# Bloom filter are held in memory.
+class SSTable:
+    def __init__(self, path: str, seq: int, level: int):
+        self.path = path
+        self.seq = seq
+        self.level = level
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        idx_off, idx_count, bloom_off, bloom_bits, k, self.entries, magic = _FOOTER.unpack_from(mm, len(mm) - _FOOTER.size)
+        if magic != _MAGIC:
+            raise ValueError(f"{path}: bad sstable footer")
+        self._data_end = idx_off
+        self._index_keys: List[bytes] = []
+        self._index_offs: List[int] = []
+        off = idx_off
+        for _ in range(idx_count):
+            klen, doff = _INDEX.unpack_from(mm, off)
+            off += _INDEX.size
+            self._index_keys.append(bytes(mm[off:off + klen]))
+            self._index_offs.append(doff)
+            off += klen
+        self.bloom = BloomFilter(bloom_bits, k, bytearray(mm[bloom_off:bloom_off + (bloom_bits + 7) // 8]))
+
+    @staticmethod
+    def write(path: str, entries: List[_Entry], index_every: int = 16) -> None:
+        tmp = path + ".tmp"
+        bloom = BloomFilter.for_capacity(max(1, len(entries)))
+        index = bytearray()
+        idx_count = 0
+        with open(tmp, "wb") as f:
+            off = 0
+            for i, (key, ts, tomb, value) in enumerate(entries):
+                if i % index_every == 0:
+                    index += _INDEX.pack(len(key), off) + key
+                    idx_count += 1
+                bloom.add(key)
+                buf = _encode(key, value, ts, tomb)
+                f.write(buf)
+                off += len(buf)
+            idx_off = off
+            f.write(index)
+            bloom_off = idx_off + len(index)
+            f.write(bloom.bits)
+            f.write(_FOOTER.pack(idx_off, idx_count, bloom_off, bloom.nbits, bloom.k, len(entries), _MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # `h` is BloomFilter.hash(key), when the caller already has it.
+    def get(self, key: bytes, h: Optional[Tuple[int, int]] = None) -> Optional[_Entry]:
+        if not self.bloom.contains_hash(h or BloomFilter.hash(key)):
+            return None
+        i = bisect_right(self._index_keys, key) - 1
+        if i < 0:
+            return None
+        off = self._index_offs[i]
+        end = self._index_offs[i + 1] if i + 1 < len(self._index_offs) else self._data_end
+        mm = self._mm
+        while off < end:
+            e, off = _decode(mm, off)
+            if e[0] == key:
+                return e
+            if e[0] > key:
+                return None
+        return None
+
+    def __iter__(self) -> Iterator[_Entry]:
+        off, mm, end = 0, self._mm, self._data_end
+        while off < end:
+            e, off = _decode(mm, off)
+            yield e
+
+    def close(self) -> None:
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._f.close()
+
+# Versions of a key are resolved LWW like BaseStore.merge: the highest ts
+# wins, equal ts go to the newer write (`b`, from the newer level).
+def _lww(a: Optional[_Entry], b: Optional[_Entry]) -> Optional[_Entry]:
+    if b is None:
+        return a
+    return b if a is None or b[1] >= a[1] else a
+
+# Entries of `tables` (oldest first) as (key, -ts, -rank, entry), in key
+# order and, per key, the LWW winner first.
+def _merge_tables(tables: List[SSTable]) -> Iterator[Tuple[bytes, float, int, _Entry]]:
+    def ranked(rank: int, t: SSTable) -> Iterator[Tuple[bytes, float, int, _Entry]]:
+        return ((e[0], -e[1], -rank, e) for e in t)
+    return heapq.merge(*(ranked(rank, t) for rank, t in enumerate(tables)))
+
+class WriteAheadLog:
+    def __init__(self, path: str, sync_mode: str):
+        self.path = path
+        self.sync_mode = sync_mode
+        self._f = open(path, "ab", buffering=1 << 20)
+        self.dirty = False
+
+    def append(self, payload: bytes) -> None:
+        self._f.write(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        if self.sync_mode == "always":
+            self.sync()
+        else:
+            self.dirty = True
+
+    def sync(self) -> None:
+        self._f.flush()
+        if self.sync_mode != "none":
+            os.fsync(self._f.fileno())
+        self.dirty = False
+
+    # Push buffered frames to the OS under the store lock and return the fd
+    # so the fsync itself can run without blocking writers.
+    def flush_for_sync(self) -> Optional[int]:
+        if not self.dirty:
+            return None
+        self._f.flush()
+        self.dirty = False
+        return self._f.fileno() if self.sync_mode != "none" else None
+
+    def close(self) -> None:
+        self.sync()
+        self._f.close()
+
+    # Yield entries up to the first torn or corrupt frame.
+    @staticmethod
+    def replay(path: str) -> Iterator[_Entry]:
+        with open(path, "rb") as f:
+            buf = f.read()
+        off, n = 0, len(buf)
+        while off + _FRAME.size <= n:
+            length, crc = _FRAME.unpack_from(buf, off)
+            start = off + _FRAME.size
+            if start + length > n or zlib.crc32(buf[start:start + length]) != crc:
+                log.warning("%s: truncated WAL tail at offset %d", path, off)
+                return
+            e, _ = _decode(buf, start)
+            yield e
+            off = start + length
+
+# Log-structured engine with the InMemoryStore API: writes go to the WAL
+# and a memtable, full memtables are flushed to SSTables by a background
+# thread, and tables are merged once there are `compaction_trigger` of them.
+# Versions of a key in the memtables and tables resolve LWW (see _lww), the
+# same way on reads, compaction and recovery.
+#
+# WAL sync modes: "always" fsyncs every write before it returns. "group"
+# is group commit: a write returns once an fsync covering it completed; a
+# syncer thread fsyncs as soon as writes are waiting, and writes arriving
+# during an fsync share the next one (inside store.write_group() a thread
+# waits once for all its writes). "none" never fsyncs and hands buffered
+# frames to the OS every flush_interval_s; acknowledged writes can be lost.
+class LSMStore(BaseStore):
+    def __init__(
+        self,
+        data_dir: str,
+        sync_mode: str = "group",
+        flush_interval_s: float = 0.005,
+        memtable_max_bytes: int = 32 << 20,
+        compaction_trigger: int = 4,
+        tombstone_grace_s: float = 86400.0,
+    ):
+        if sync_mode not in ("always", "group", "none"):
+            raise ValueError(f"Unknown WAL sync mode {sync_mode!r}")
+        self.data_dir = data_dir
+        self.sync_mode = sync_mode
+        self.flush_interval_s = flush_interval_s
+        self.memtable_max_bytes = memtable_max_bytes
+        self.compaction_trigger = max(2, compaction_trigger)
+        self.tombstone_grace_s = tombstone_grace_s
+        os.makedirs(data_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._work = threading.Condition(self._lock)
+        self._sync_wanted = threading.Condition(self._lock)
+        self._synced = threading.Condition(self._lock)
+        # WAL appends so far, and how many of them are known durable
+        self._appended = 0
+        self._durable = 0
+        self.fsyncs = 0
+        self._closed = False
+        self._memtable: Dict[bytes, _Entry] = {}
+        self._mem_bytes = 0
+        # Frozen memtables waiting to be flushed, newest last: (seq, memtable, wal path)
+        self._immutable: List[Tuple[int, Dict[bytes, _Entry], str]] = []
+        self._tables: List[SSTable] = []  # oldest first
+        self._seq = 0
+        self.recovery_s = self._recover()
+        self._wal = self._open_wal()
+
+        self._syncer = threading.Thread(target=self._sync_loop, name="lsm-wal-sync", daemon=True)
+        self._worker = threading.Thread(target=self._work_loop, name="lsm-compaction", daemon=True)
+        self._syncer.start()
+        self._worker.start()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.data_dir, name)
+
+    def _open_wal(self) -> WriteAheadLog:
+        self._seq += 1
+        self._wal_seq = self._seq
+        return WriteAheadLog(self._path(f"wal-{self._seq:012d}.log"), self.sync_mode)
+
+    def _recover(self) -> float:
+        t0 = time.perf_counter()
+        names = sorted(os.listdir(self.data_dir))
+        found: List[Tuple[int, int, str]] = []
+        for name in names:
+            if name.endswith(".tmp"):
+                os.remove(self._path(name))
+            elif name.startswith("sst-") and name.endswith(".sst"):
+                seq, level = (int(x) for x in name[4:-4].split("-"))
+                found.append((seq, level, name))
+        # A compaction merges every table into one at a higher level with the
+        # newest input's seq. Tables such an output covers are inputs whose
+        # removal a crash interrupted; loading them would bring back values
+        # whose tombstones the compaction dropped.
+        for seq, level, name in found:
+            if any(l2 > level and s2 >= seq for s2, l2, _ in found):
+                log.warning("%s: removing %s, already merged into a compacted table", self.data_dir, name)
+                os.remove(self._path(name))
+                continue
+            self._tables.append(SSTable(self._path(name), seq, level))
+            self._seq = max(self._seq, seq)
+        self._tables.sort(key=lambda t: (t.seq, t.level))
+        flushed = max((t.seq for t in self._tables), default=0)
+        wals = [n for n in names if n.startswith("wal-") and n.endswith(".log")]
+        for name in wals:
+            seq = int(name[4:-4])
+            self._seq = max(self._seq, seq)
+            if seq <= flushed:
+                # Already in a table; the crash hit before the WAL was removed.
+                os.remove(self._path(name))
+                continue
+            mem: Dict[bytes, _Entry] = {}
+            for e in WriteAheadLog.replay(self._path(name)):
+                mem[e[0]] = _lww(mem.get(e[0]), e)
+            if not mem:
+                os.remove(self._path(name))
+                continue
+            # Replayed segments become immutable memtables; the worker flushes
+            # them to SSTables and removes the old WAL files.
+            self._immutable.append((seq, mem, self._path(name)))
+        elapsed = time.perf_counter() - t0
+        if wals or self._tables:
+            log.info("Recovered %d tables and %d WAL segments from %s in %.3fs", len(self._tables), len(wals), self.data_dir, elapsed)
+        return elapsed
+
+    def _write(self, key: str, value: Optional[str], ts: float, tombstone: bool) -> None:
+        kb = key.encode("utf-8")
+        vb = None if tombstone else value.encode("utf-8")
+        e = (kb, ts, tombstone, vb)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Store is closed")
+            self._wal.append(_encode(kb, vb, ts, tombstone))
+            self._appended += 1
+            seq = self._appended
+            self._memtable[kb] = _lww(self._memtable.get(kb), e)
+            self._mem_bytes += len(kb) + (len(vb) if vb else 0) + 64
+            if self._mem_bytes >= self.memtable_max_bytes:
+                self._freeze()
+            if self.sync_mode == "group":
+                self._sync_wanted.notify()
+        if self.sync_mode == "group" and not defer_durability(self, lambda: self.wait_durable(seq)):
+            self.wait_durable(seq)
+
+    # Block until the first `seq` WAL appends are durable.
+    def wait_durable(self, seq: int) -> None:
+        with self._lock:
+            while self._durable < seq and not self._closed:
+                self._synced.wait()
+
+    # Called with the lock held once the WAL was synced up to `seq` appends.
+    def _mark_durable(self, seq: int) -> None:
+        if seq > self._durable:
+            self._durable = seq
+            self._synced.notify_all()
+
+    # Called with the lock held: swap in a fresh memtable and WAL segment.
+    def _freeze(self) -> None:
+        self._wal.close()
+        self._mark_durable(self._appended)
+        self._immutable.append((self._wal_seq, self._memtable, self._wal.path))
+        self._memtable = {}
+        self._mem_bytes = 0
+        self._wal = self._open_wal()
+        self._work.notify_all()
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        ts = ts if ts is not None else time.time()
+        self._write(key, value, ts, False)
+        return Record(value=value, ts=ts, tombstone=False)
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        ts = ts if ts is not None else time.time()
+        self._write(key, None, ts, True)
+        return Record(value=None, ts=ts, tombstone=True)
+
+    # Every level may hold a version of the key (a write with an older ts
+    # can land after a newer one), so all are checked; bloom filters keep
+    # the tables without the key cheap.
+    def get(self, key: str) -> Optional[Record]:
+        kb = key.encode("utf-8")
+        best: Optional[_Entry] = None
+        with self._lock:
+            for _, mem, _ in self._immutable:
+                best = _lww(best, mem.get(kb))
+            best = _lww(best, self._memtable.get(kb))
+            tables = list(self._tables)
+        h = BloomFilter.hash(kb) if tables else None
+        for t in reversed(tables):
+            e = t.get(kb, h)
+            if e is not None and (best is None or e[1] > best[1]):
+                best = e
+        return _to_record(best) if best is not None else None
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        with self._lock:
+            mem: Dict[bytes, _Entry] = {}
+            for m in [m for _, m, _ in self._immutable] + [self._memtable]:
+                for kb, e in m.items():
+                    mem[kb] = _lww(mem.get(kb), e)
+            tables = list(self._tables)
+        last = None
+        for kb, _, _, e in _merge_tables(tables):
+            if kb == last:
+                continue
+            last = kb
+            e = _lww(e, mem.pop(kb, None))
+            yield kb.decode("utf-8"), _to_record(e)
+        for kb, e in mem.items():
+            yield kb.decode("utf-8"), _to_record(e)
+
+    def sync(self) -> None:
+        with self._lock:
+            self._wal.sync()
+            self._mark_durable(self._appended)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "engine": "lsm",
+                "memtable_keys": len(self._memtable),
+                "immutable_memtables": len(self._immutable),
+                "sstables": [os.path.basename(t.path) for t in self._tables],
+                "sstable_entries": sum(t.entries for t in self._tables),
+                "recovery_s": self.recovery_s,
+                "wal_sync": self.sync_mode,
+                "wal_group_fsyncs": self.fsyncs,
+            }
+
+    def _sync_loop(self) -> None:
+        while True:
+            with self._lock:
+                if self.sync_mode == "group":
+                    while not self._closed and not self._wal.dirty:
+                        self._sync_wanted.wait()
+                else:
+                    self._sync_wanted.wait(self.flush_interval_s)
+                if self._closed:
+                    return
+                seq = self._appended
+                fd = self._wal.flush_for_sync()
+            if fd is None:
+                continue
+            try:
+                os.fsync(fd)
+            except OSError:
+                # The segment was rotated (and synced) in the meantime.
+                pass
+            with self._lock:
+                self.fsyncs += 1
+                self._mark_durable(seq)
+
+    def _work_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed and not self._immutable and len(self._tables) < self.compaction_trigger:
+                    self._work.wait()
+                if self._closed:
+                    return
+                job = self._immutable[0] if self._immutable else None
+            try:
+                if job is not None:
+                    self._flush(job)
+                else:
+                    self._compact()
+            except Exception:
+                log.exception("Background flush/compaction failed")
+                time.sleep(1.0)
+
+    def _flush(self, job: Tuple[int, Dict[bytes, _Entry], str]) -> None:
+        seq, mem, wal_path = job
+        path = self._path(f"sst-{seq:012d}-0.sst")
+        SSTable.write(path, [mem[k] for k in sorted(mem)])
+        table = SSTable(path, seq, 0)
+        with self._lock:
+            self._tables.append(table)
+            self._tables.sort(key=lambda t: (t.seq, t.level))
+            self._immutable.remove(job)
+        os.remove(wal_path)
+
+    # Merge every table into one. The LWW version of each key wins, and
+    # since the output is the oldest data on disk, tombstones past the grace
+    # period can be dropped without resurrecting older values.
+    def _compact(self) -> None:
+        with self._lock:
+            inputs = list(self._tables)
+        if len(inputs) < 2:
+            return
+        t0 = time.perf_counter()
+        cutoff = time.time() - self.tombstone_grace_s
+        # Sort on (key, newest ts, newest table) and keep the first entry per key.
+        merged: List[_Entry] = []
+        last = None
+        for key, _, _, e in _merge_tables(inputs):
+            if key == last:
+                continue
+            last = key
+            if e[2] and e[1] < cutoff:
+                continue
+            merged.append(e)
+        seq = max(t.seq for t in inputs)
+        level = max(t.level for t in inputs) + 1
+        path = self._path(f"sst-{seq:012d}-{level}.sst")
+        SSTable.write(path, merged)
+        table = SSTable(path, seq, level)
+        with self._lock:
+            self._tables = [t for t in self._tables if t not in inputs] + [table]
+            self._tables.sort(key=lambda t: (t.seq, t.level))
+        # Readers may still hold the old tables; their mmaps are released
+        # once the last reference goes away.
+        for t in inputs:
+            os.remove(t.path)
+        log.info("Compacted %d tables into %s (%d entries) in %.3fs", len(inputs), os.path.basename(path), len(merged), time.perf_counter() - t0)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._work.notify_all()
+            self._sync_wanted.notify_all()
+            self._wal.close()
+            self._mark_durable(self._appended)
+        self._worker.join()
+        self._syncer.join()
+        for t in self._tables:
+            t.close()
@@ -2,9 +2,11 @@ import asyncio
 import logging
 import time
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-import httpx
+from .phi import PhiAccrual
+from .swim import DEAD, SUSPECT, Swim
+from .transport import PeerTransport
 
 log = logging.getLogger("membership")
 
@@ -13,24 +15,59 @@ class PeerState:
     base_url: str
     last_seen: float
     alive: bool = True
+    in_ring: bool = True
+    # Set from SWIM's suspect state (heartbeat mode uses phi instead)
+    suspect: bool = False
 
 class Membership:
-    def __init__(self, self_url: str, peers: List[str], timeout_s: float, dead_after_s: float):
+    # A peer is marked dead after dead_after_s without contact, but it keeps
+    # its ring position (writes for it are hinted to fallbacks) until
+    # remove_after_s; only then does ownership move. remove_after_s defaults
+    # to dead_after_s, i.e. dead peers leave the ring immediately.
+    #
+    # Before that, a phi-accrual detector over heartbeat arrivals flags peers
+    # as suspected as soon as their silence is unusual for them (phi above
+    # phi_threshold); routing skips suspected replicas without touching the
+    # ring.
+    def __init__(self, self_url: str, peers: List[str], timeout_s: float, dead_after_s: float, transport: Optional[PeerTransport] = None, remove_after_s: Optional[float] = None, phi_threshold: float = 8.0, heartbeat_interval_s: float = 1.0):
         self.self_url = self_url
+        self.transport = transport or PeerTransport(timeout_s=timeout_s)
         self.timeout_s = timeout_s
         self.dead_after_s = dead_after_s
+        self.remove_after_s = dead_after_s if remove_after_s is None else max(dead_after_s, remove_after_s)
+        self.detector = PhiAccrual(threshold=phi_threshold, first_interval_s=heartbeat_interval_s)
         now = time.time()
         self._peers: Dict[str, PeerState] = {p: PeerState(p, last_seen=now, alive=True) for p in set(peers) if p != self_url}
+        # Bumped whenever the ring node set changes, so the ring can skip rebuilds.
+        self.version = 0
 
-    # include self + alive peers
+    # include self + peers that hold a ring position
     def all_nodes(self) -> List[str]:
-        alive_peers = [p.base_url for p in self._peers.values() if p.alive]
-        return sorted(set([self.self_url] + alive_peers))
+        ring_peers = [p.base_url for p in self._peers.values() if p.in_ring]
+        return sorted(set([self.self_url] + ring_peers))
+
+    def is_alive(self, url: str) -> bool:
+        if url == self.self_url:
+            return True
+        st = self._peers.get(url)
+        return st is not None and st.alive
+
+    def is_suspected(self, url: str) -> bool:
+        st = self._peers.get(url)
+        if st is None:
+            return False
+        return st.suspect or self.detector.suspected(url, time.time())
+
+    # Alive and not suspected: where requests should go.
+    def is_available(self, url: str) -> bool:
+        return self.is_alive(url) and not self.is_suspected(url)
 
     def peer_snapshot(self) -> Dict[str, dict]:
         out = {}
+        now = time.time()
         for url, st in self._peers.items():
-            out[url] = {"alive": st.alive, "last_seen": st.last_seen}
+            phi = self.detector.phi(url, now)
+            out[url] = {"alive": st.alive, "in_ring": st.in_ring, "last_seen": st.last_seen, "phi": round(phi, 2), "suspected": st.suspect or phi >= self.detector.threshold}
         return out
 
     def mark_seen(self, peer_url: str) -> None:
@@ -38,27 +75,67 @@ class Membership:
             return
         st = self._peers.get(peer_url)
         if st is None:
-            st = PeerState(peer_url, last_seen=time.time(), alive=True)
+            st = PeerState(peer_url, last_seen=time.time(), alive=False, in_ring=False)
             self._peers[peer_url] = st
         st.last_seen = time.time()
+        self.detector.heartbeat(peer_url, st.last_seen)
         st.alive = True
+        if not st.in_ring:
+            st.in_ring = True
+            self.version += 1
+
+    def mark_dead(self, peer_url: str) -> None:
+        st = self._peers.get(peer_url)
+        if st is not None:
+            st.alive = False
 
     def tick_dead(self) -> None:
         now = time.time()
         for st in self._peers.values():
-            if (now - st.last_seen) > self.dead_after_s:
+            silent = now - st.last_seen
+            if st.alive and silent > self.dead_after_s:
                 st.alive = False
+            if st.in_ring and silent > self.remove_after_s:
+                st.in_ring = False
+                self.version += 1
 
     async def heartbeat_loop(self, interval_s: float, self_id: str):
-        async with httpx.AsyncClient(timeout=self.timeout_s) as client:
+        while True:
+            await asyncio.sleep(interval_s)
+            # send heartbeat to all known peers, concurrently so a hung peer
+            # does not delay (and falsely raise phi for) the others
+            await asyncio.gather(*(self._heartbeat(p, self_id) for p in list(self._peers.keys())))
+            self.tick_dead()
+
+    async def _heartbeat(self, peer_url: str, self_id: str) -> None:
+        try:
+            r = await self.transport.post(peer_url, "/internal/heartbeat", json={"from": self.self_url, "node_id": self_id})
+            if r.status_code == 200:
+                self.mark_seen(peer_url)
+        except Exception:
+            pass
+
+    # SWIM mode: liveness comes from the detector instead of heartbeats. Each
+    # period members SWIM still considers up (alive or suspect) are refreshed
+    # and confirmed-dead ones are marked down, so they leave the ring after
+    # remove_after_s as with heartbeats. SWIM suspects are flagged for routing
+    # in place of phi. Members learned through gossip join.
+    def sync_swim(self, swim: Swim) -> None:
+        for m in swim.members.values():
+            if m.status == DEAD:
+                self.mark_dead(m.url)
+            else:
+                self.mark_seen(m.url)
+            st = self._peers.get(m.url)
+            if st is not None:
+                st.suspect = m.status == SUSPECT
+        self.tick_dead()
+
+    async def swim_loop(self, swim: Swim):
+        detector = asyncio.create_task(swim.run())
+        try:
             while True:
-                await asyncio.sleep(interval_s)
-                # send heartbeat to all known peers
-                for peer_url in list(self._peers.keys()):
-                    try:
-                        r = await client.post(f"{peer_url}/internal/heartbeat", json={"from": self.self_url, "node_id": self_id})
-                        if r.status_code == 200:
-                            self.mark_seen(peer_url)
-                    except Exception:
-                        pass
-                self.tick_dead()
+                await asyncio.sleep(swim.period_s)
+                self.sync_swim(swim)
+        finally:
+            detector.cancel()
@@ -0,0 +1,310 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .store import BaseStore, Record
+
+# Log-linear buckets in the style of HdrHistogram: values are recorded in
+# microseconds, exactly below 2 * SUB and with SUB sub-buckets per power of
+# two above (relative error <= 1 / SUB), up to 2**MAX_BITS us (~19 h).
+SUB_BITS = 5
+SUB = 1 << SUB_BITS
+MAX_BITS = 36
+N_BUCKETS = (MAX_BITS - SUB_BITS + 1) * SUB
+
+def bucket_of(us: int) -> int:
+    if us < 2 * SUB:
+        return us if us > 0 else 0
+    shift = us.bit_length() - SUB_BITS - 1
+    return min(N_BUCKETS - 1, shift * SUB + (us >> shift))
+
+# Exclusive upper bound of bucket i, in microseconds.
+def bucket_upper(i: int) -> int:
+    if i < 2 * SUB:
+        return i + 1
+    shift = i // SUB - 1
+    return (i - shift * SUB + 1) << shift
+
+# Coarse `le` bounds (seconds) the fine buckets are folded into for scrapes;
+# a fine bucket straddling a bound counts towards the next one.
+DEFAULT_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Shard:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.sum = 0.0
+
+# Recording is lock-free: every thread (the event loop, the threadpool that
+# runs sync endpoints) writes to its own shard, and readers add the shards
+# up. A scrape racing a write may miss that one sample, never corrupt one.
+class Histogram:
+    def __init__(self):
+        self._tls = threading.local()
+        self._shards: List[_Shard] = []
+
+    def _new_shard(self) -> _Shard:
+        s = self._tls.shard = _Shard()
+        self._shards.append(s)
+        return s
+
+    def observe(self, seconds: float) -> None:
+        try:
+            s = self._tls.shard
+        except AttributeError:
+            s = self._new_shard()
+        s.counts[bucket_of(int(seconds * 1e6))] += 1
+        s.sum += seconds
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        counts = [0] * N_BUCKETS
+        total = 0.0
+        for s in list(self._shards):
+            for i, c in enumerate(s.counts):
+                if c:
+                    counts[i] += c
+            total += s.sum
+        return counts, total
+
+    # Upper bound of the bucket holding the pct-th percentile, in seconds.
+    def percentile(self, pct: float, counts: Optional[List[int]] = None) -> Optional[float]:
+        counts = counts if counts is not None else self.snapshot()[0]
+        n = sum(counts)
+        if n == 0:
+            return None
+        rank = max(1, int(pct / 100.0 * n + 0.5))
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return bucket_upper(i) / 1e6
+        return bucket_upper(N_BUCKETS - 1) / 1e6
+
+class Counter:
+    def __init__(self):
+        self._tls = threading.local()
+        self._cells: List[List[float]] = []
+
+    def inc(self, n: float = 1) -> None:
+        try:
+            cell = self._tls.cell
+        except AttributeError:
+            cell = self._tls.cell = [0]
+            self._cells.append(cell)
+        cell[0] += n
+
+    def value(self) -> float:
+        return sum(c[0] for c in list(self._cells))
+
+# A metric name with its label names; one child per label-value tuple.
+class Family:
+    def __init__(self, kind: str, name: str, help: str, labelnames: Sequence[str], factory: Callable[[], Any]):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, self.factory())
+        return child
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "", const: Sequence[Tuple[str, str]] = ()) -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in (*const, *zip(names, values))]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+# Metrics of one node, rendered in the Prometheus text format. Gauges (and
+# counters kept elsewhere) are callbacks evaluated at scrape time and return
+# a number or a mapping of label-value tuples to numbers. `const_labels` are added to every sample
+# (the worker of a multi-process node).
+class Registry:
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BOUNDS, const_labels: Optional[Dict[str, str]] = None):
+        self._const = tuple((const_labels or {}).items())
+        self._families: List[Family] = []
+        self._gauges: List[Tuple[str, str, str, Tuple[str, ...], Callable[[], Any]]] = []
+        self.bounds = tuple(bounds)
+        # number of fine buckets lying entirely at or below each bound
+        self._cuts = [sum(1 for i in range(N_BUCKETS) if bucket_upper(i) <= round(b * 1e6)) for b in self.bounds]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Family:
+        f = Family("histogram", name, help, labelnames, Histogram)
+        self._families.append(f)
+        return f
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Family:
+        f = Family("counter", name, help, labelnames, Counter)
+        self._families.append(f)
+        return f
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Any], labelnames: Sequence[str] = ()) -> None:
+        self._gauges.append(("gauge", name, help, tuple(labelnames), fn))
+
+    def counter_fn(self, name: str, help: str, fn: Callable[[], Any], labelnames: Sequence[str] = ()) -> None:
+        self._gauges.append(("counter", name, help, tuple(labelnames), fn))
+
+    def _histogram_lines(self, f: Family, values: Tuple[str, ...], h: Histogram) -> Iterator[str]:
+        counts, total = h.snapshot()
+        seen, j = 0, 0
+        for bound, cut in zip(self.bounds, self._cuts):
+            while j < cut:
+                seen += counts[j]
+                j += 1
+            le = 'le="%s"' % bound
+            yield f"{f.name}_bucket{_labels(f.labelnames, values, le, self._const)} {seen}"
+        n = sum(counts)
+        le = 'le="+Inf"'
+        yield f"{f.name}_bucket{_labels(f.labelnames, values, le, self._const)} {n}"
+        yield f"{f.name}_sum{_labels(f.labelnames, values, const=self._const)} {total!r}"
+        yield f"{f.name}_count{_labels(f.labelnames, values, const=self._const)} {n}"
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for f in self._families:
+            lines.append(f"# HELP {f.name} {f.help}")
+            lines.append(f"# TYPE {f.name} {f.kind}")
+            for values, child in sorted(f.children.items()):
+                if f.kind == "histogram":
+                    lines.extend(self._histogram_lines(f, values, child))
+                else:
+                    lines.append(f"{f.name}{_labels(f.labelnames, values, const=self._const)} {_num(child.value())}")
+        for kind, name, help, labelnames, fn in self._gauges:
+            v = fn()
+            if v is None:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for values, x in sorted(v.items()) if isinstance(v, dict) else [((), v)]:
+                lines.append(f"{name}{_labels(labelnames, values, const=self._const)} {_num(x)}")
+        return "\n".join(lines) + "\n"
+
+# Combine the expositions of several registries (the workers of one node)
+# into one, with each family's samples from all of them under one header.
+def merge_expositions(texts: Sequence[str]) -> str:
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for text in texts:
+        name = ""
+        for line in text.splitlines():
+            if line.startswith("# "):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    name = parts[2]
+                    h = headers.setdefault(name, [])
+                    if len(h) < 2:
+                        h.append(line)
+                    samples.setdefault(name, [])
+            elif line:
+                samples.setdefault(name, []).append(line)
+    lines: List[str] = []
+    for name, rows in samples.items():
+        lines.extend(headers.get(name, []))
+        lines.extend(rows)
+    return "\n".join(lines) + "\n"
+
+# The request-path metrics of a node: where the time of a client request
+# goes (ring lookup, local store op, each replica RPC, the quorum wait) and
+# how replica calls end.
+class NodeMetrics:
+    def __init__(self, registry: Optional[Registry] = None):
+        r = self.registry = registry or Registry()
+        self.ring_lookup = r.histogram("dynamo_ring_lookup_seconds", "Replica placement (ring lookup, sloppy placement, rebalance overlap) per client request", ["op"])
+        self.store_op = r.histogram("dynamo_store_op_seconds", "Local storage engine operations", ["op"])
+        self.replica_rpc = r.histogram("dynamo_replica_rpc_seconds", "Internal replica calls from this coordinator, per peer and endpoint", ["peer", "path"])
+        self.quorum_wait = r.histogram("dynamo_quorum_wait_seconds", "Time a client request waits for its W or Q replica answers", ["op"])
+        self.acks = r.counter("dynamo_replica_acks_total", "Replica acks counted towards write quorums (local write included)", ["op"])
+        self.quorum_failures = r.counter("dynamo_quorum_failures_total", "Client requests or batch keys that missed their W or Q", ["op"])
+        self.timeouts = r.counter("dynamo_replica_timeouts_total", "Internal replica calls that timed out", ["peer"])
+        self.peer_errors = r.counter("dynamo_peer_errors_total", "Internal replica calls that failed (timeouts, connection errors, non-200)", ["peer"])
+        self.coalesced = r.counter("dynamo_coalesced_reads_total", "Client reads that started a quorum read or joined one already in flight", ["result"])
+
+    # One finished internal call; `error` is the exception it raised, if any.
+    def replica_call(self, url: str, path: str, seconds: float, ok: bool, error: Optional[BaseException] = None) -> None:
+        self.replica_rpc.labels(url, path).observe(seconds)
+        if not ok:
+            self.peer_errors.labels(url).inc()
+            if error is not None and ("Timeout" in type(error).__name__ or isinstance(error, TimeoutError)):
+                self.timeouts.labels(url).inc()
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    # Count and p50/p99 of every histogram, for /debug/state.
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        out: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for f in (self.ring_lookup, self.store_op, self.replica_rpc, self.quorum_wait):
+            rows = out[f.name] = {}
+            for values, h in sorted(f.children.items()):
+                counts, _ = h.snapshot()
+                ms = lambda v: None if v is None else round(v * 1000.0, 3)
+                rows[",".join(values)] = {"count": sum(counts), "p50_ms": ms(h.percentile(50, counts)), "p99_ms": ms(h.percentile(99, counts))}
+        return out
+
+# Resident set size of this process, in bytes.
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak, not current, where /proc is missing; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+# Times every operation on the wrapped store into dynamo_store_op_seconds.
+class MeteredStore(BaseStore):
+    def __init__(self, inner: BaseStore, metrics: NodeMetrics):
+        self.inner = inner
+        self._put = metrics.store_op.labels("put")
+        self._delete = metrics.store_op.labels("delete")
+        self._get = metrics.store_op.labels("get")
+        self._merge = metrics.store_op.labels("merge")
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        t0 = time.perf_counter()
+        rec = self.inner.put(key, value, ts=ts)
+        self._put.observe(time.perf_counter() - t0)
+        return rec
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        t0 = time.perf_counter()
+        rec = self.inner.delete(key, ts=ts)
+        self._delete.observe(time.perf_counter() - t0)
+        return rec
+
+    def get(self, key: str) -> Optional[Record]:
+        t0 = time.perf_counter()
+        rec = self.inner.get(key)
+        self._get.observe(time.perf_counter() - t0)
+        return rec
+
+    def merge(self, key: str, rec: Record) -> bool:
+        t0 = time.perf_counter()
+        applied = self.inner.merge(key, rec)
+        self._merge.observe(time.perf_counter() - t0)
+        return applied
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        return self.inner.items()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def close(self) -> None:
+        self.inner.close()
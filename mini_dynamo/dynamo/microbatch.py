@@ -0,0 +1,113 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Single-key replica write endpoints and the batch endpoint each folds into.
+BATCH_PATHS = {
+    "/internal/replica/put": "/internal/replica/put_batch",
+    "/internal/replica/delete": "/internal/replica/delete_batch",
+}
+
+Result = Tuple[str, bool, Optional[dict]]
+
+class _Queue:
+    __slots__ = ("items", "futures", "handle", "last_arrival", "gap")
+
+    def __init__(self):
+        self.items: List[dict] = []
+        self.futures: List[asyncio.Future] = []
+        self.handle: Optional[asyncio.Handle] = None
+        self.last_arrival = 0.0
+        # EWMA of the time between writes, seconds
+        self.gap = 1.0
+
+# Group commit over the network: replica writes bound for the same peer
+# and endpoint are queued and sent as one batch request, whose answer is
+# the ack (or failure) of every write in it.
+#
+# The window adapts to each peer's write rate. Writes issued in the same
+# event loop iteration always share a request. Beyond that, a queue only
+# waits (at most max_delay_s) when the recent rate says more writes will
+# arrive within the window, so light traffic is sent at once and heavy
+# traffic fills batches of up to max_items.
+class WriteBatcher:
+    def __init__(self, send: Callable[[str, str, Any], Awaitable[Result]], max_items: int = 64, max_delay_s: float = 0.0005, clock: Callable[[], float] = time.perf_counter):
+        self.send = send
+        self.max_items = max_items
+        self.max_delay_s = max_delay_s
+        self.clock = clock
+        self._queues: Dict[Tuple[str, str], _Queue] = {}
+        self.writes = 0
+        self.requests = 0
+        self.batched_requests = 0
+        self.delayed_flushes = 0
+
+    @staticmethod
+    def batches(path: str) -> bool:
+        return path in BATCH_PATHS
+
+    def _window(self, q: _Queue) -> float:
+        if q.gap * 2 > self.max_delay_s:
+            return 0.0
+        return min(self.max_delay_s, q.gap * (self.max_items - len(q.items)))
+
+    async def submit(self, url: str, path: str, item: dict) -> Result:
+        key = (url, path)
+        q = self._queues.get(key)
+        if q is None:
+            q = self._queues[key] = _Queue()
+        now = self.clock()
+        if q.last_arrival:
+            q.gap += 0.2 * (min(now - q.last_arrival, 1.0) - q.gap)
+        q.last_arrival = now
+        fut = asyncio.get_running_loop().create_future()
+        q.items.append(item)
+        q.futures.append(fut)
+        self.writes += 1
+        if len(q.items) >= self.max_items:
+            self._flush(key)
+        elif q.handle is None:
+            window = self._window(q)
+            loop = asyncio.get_running_loop()
+            if window > 0:
+                self.delayed_flushes += 1
+                q.handle = loop.call_later(window, self._flush, key)
+            else:
+                q.handle = loop.call_soon(self._flush, key)
+        return await asyncio.shield(fut)
+
+    def _flush(self, key: Tuple[str, str]) -> None:
+        q = self._queues[key]
+        if q.handle is not None:
+            q.handle.cancel()
+            q.handle = None
+        if not q.items:
+            return
+        items, futures = q.items, q.futures
+        q.items, q.futures = [], []
+        self.requests += 1
+        url, path = key
+        if len(items) == 1:
+            call = self.send(url, path, items[0])
+        else:
+            self.batched_requests += 1
+            call = self.send(url, BATCH_PATHS[path], {"items": items})
+        asyncio.ensure_future(call).add_done_callback(lambda t: self._answer(t, url, futures))
+
+    # Every write of a request gets the request's outcome.
+    @staticmethod
+    def _answer(task: asyncio.Future, url: str, futures: List[asyncio.Future]) -> None:
+        failed = task.cancelled() or task.exception() is not None
+        res: Result = (url, False, None) if failed else task.result()
+        for f in futures:
+            if not f.done():
+                f.set_result(res)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "writes": self.writes,
+            "requests": self.requests,
+            "batched_requests": self.batched_requests,
+            "delayed_flushes": self.delayed_flushes,
+            "writes_per_request": round(self.writes / self.requests, 2) if self.requests else 0.0,
+        }
@@ -1,25 +1,48 @@
 import asyncio
+import json
 import logging
+import os
+import struct
+import threading
 import time
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from typing import Any, Dict, List, Optional, Tuple
 
+from .access import ACCESS_MODES, StoreAccess
+from .antientropy import AntiEntropy, MerkleIndex, TrackedStore
+from .cache import CacheInvalidator, ChangeNotifyingStore, ReadCache
+from .coalesce import SingleFlight
 from .config import NodeConfig
+from .handoff import HintedHandoff, HintQueue
+from .latency import LatencyTracker
 from .logging_setup import setup_logging
-from .hashing import ConsistentHashRing
+from .hashing import make_ring
 from .membership import Membership
-from .store import InMemoryStore
+from .metrics import MeteredStore, NodeMetrics, Registry, merge_expositions, rss_bytes
+from .swim import Swim
+from .rebalance import Rebalancer
+from .store import BLOCKING_ENGINES, BaseStore, IndexedStore, Record, open_store
 from .quorum import QuorumClient
+from .repair import ReadRepair
+from .shards import SHARD_CALL_PATH, ShardedAccess, shard_leaves
+from .transport import PeerTransport
+from . import wire
+from .versioning import CausalState, CausalStore, DotClock, decode_context, encode_context, new_write, node_id_for, pack, resolve_records, unpack
 
 log = logging.getLogger("node")
 
+# `context` is the causal context returned by a read (causal versioning only).
 class PutReq(BaseModel):
     key: str
     value: str
+    context: Optional[str] = None
 
 class DelReq(BaseModel):
     key: str
+    context: Optional[str] = None
 
 class HeartbeatReq(BaseModel):
     from_: str | None = None
@@ -31,12 +54,52 @@ class ReplicaPutReq(BaseModel):
     key: str
     value: str
     ts: float
+    hint_for: Optional[str] = None
 
 class ReplicaDelReq(BaseModel):
     key: str
     ts: float
+    hint_for: Optional[str] = None
 
-def create_app(node_id: str, base_url: str, peers: List[str], replication: int, w: int, q: int, debug: bool) -> FastAPI:
+class ReplicaRecord(BaseModel):
+    key: str
+    value: Optional[str] = None
+    ts: float
+    tombstone: bool = False
+
+class ReplicaMergeBatchReq(BaseModel):
+    items: List[ReplicaRecord]
+
+class PutBatchReq(BaseModel):
+    items: List[PutReq]
+
+class KeysReq(BaseModel):
+    keys: List[str]
+    contexts: Optional[Dict[str, str]] = None
+
+class ReplicaPutBatchReq(BaseModel):
+    items: List[ReplicaPutReq]
+
+class ReplicaDelBatchReq(BaseModel):
+    items: List[ReplicaDelReq]
+
+class MerkleNodesReq(BaseModel):
+    peer: str
+    level: int
+    indices: List[int]
+
+class MerkleLeavesReq(BaseModel):
+    peer: str
+    leaves: List[int]
+
+class InvalidateReq(BaseModel):
+    keys: List[str]
+
+class ShardCallReq(BaseModel):
+    method: str
+    args: List[Any] = []
+
+def create_app(node_id: str, base_url: str, peers: List[str], replication: int, w: int, q: int, debug: bool, partitioner: str = "md5", engine: str = "memory", data_dir: Optional[str] = None, versioning: str = "lww", membership_protocol: str = "heartbeat", store_access: str = "auto", workers: int = 1, worker: int = 0, socket_dir: Optional[str] = None, read_cache_bytes: int = 0, range_scans: bool = False, anti_entropy_interval_s: float = 0.0) -> FastAPI:
     cfg = NodeConfig(
         node_id=node_id,
         base_url=base_url,
@@ -45,108 +108,916 @@ def create_app(node_id: str, base_url: str, peers: List[str], replication: int,
         w=w,
         q=q,
         debug=debug,
+        partitioner=partitioner,
+        engine=engine,
+        data_dir=data_dir,
+        versioning=versioning,
+        membership_protocol=membership_protocol,
+        store_access=store_access,
+        workers=workers,
+        worker_index=worker,
+        socket_dir=socket_dir,
+        read_cache_bytes=read_cache_bytes,
+        range_scans=range_scans,
+        anti_entropy_interval_s=anti_entropy_interval_s,
     )
+    if cfg.membership_protocol not in ("heartbeat", "swim"):
+        raise ValueError(f"Unknown membership protocol {cfg.membership_protocol!r}, expected 'heartbeat' or 'swim'")
+    if cfg.store_access not in ("auto", *ACCESS_MODES):
+        raise ValueError(f"Unknown store access {cfg.store_access!r}, expected 'auto' or one of {ACCESS_MODES}")
+    if cfg.versioning not in ("lww", "causal"):
+        raise ValueError(f"Unknown versioning {cfg.versioning!r}, expected 'lww' or 'causal'")
+    sharded = cfg.workers > 1
+    if sharded:
+        if not 0 <= cfg.worker_index < cfg.workers or not cfg.socket_dir:
+            raise ValueError("A multi-worker node needs a worker index below workers and a socket_dir")
+        # SWIM probes and gossip state would be split across the workers
+        if cfg.membership_protocol == "swim":
+            raise ValueError("SWIM membership runs with a single worker only")
     setup_logging(cfg.debug)
     app = FastAPI(title=f"Mini-Dynamo Node {cfg.node_id}")
 
-    store = InMemoryStore()
-    membership = Membership(cfg.base_url, cfg.peers, timeout_s=cfg.request_timeout_s, dead_after_s=cfg.peer_dead_after_s)
-    ring = ConsistentHashRing(membership.all_nodes(), vnodes=cfg.virtual_nodes)
-    qc = QuorumClient(timeout_s=cfg.request_timeout_s)
+    metrics = NodeMetrics(Registry(const_labels={"worker": str(cfg.worker_index)}) if sharded else None)
+    store_opts = {"sync_mode": cfg.wal_sync} if cfg.engine == "lsm" else {}
+    store = open_store(cfg.engine, cfg.data_dir, **store_opts)
+    causal = cfg.versioning == "causal"
+    resolve = resolve_records if causal else BaseStore.newer
+    clock = DotClock(node_id_for(cfg.base_url, cfg.worker_index))
+    if causal:
+        store = CausalStore(store, max_vv_entries=cfg.max_vv_entries)
+    transport = PeerTransport(
+        timeout_s=cfg.request_timeout_s,
+        max_connections=cfg.max_connections_per_peer,
+        max_keepalive_connections=cfg.max_keepalive_per_peer,
+        keepalive_expiry_s=cfg.keepalive_expiry_s,
+        http2=cfg.http2,
+    )
+    membership = Membership(
+        cfg.base_url,
+        cfg.peers,
+        timeout_s=cfg.request_timeout_s,
+        dead_after_s=cfg.peer_dead_after_s,
+        transport=transport,
+        remove_after_s=cfg.ring_remove_after_s,
+        phi_threshold=cfg.phi_threshold,
+        heartbeat_interval_s=cfg.swim_period_s if cfg.membership_protocol == "swim" else cfg.heartbeat_interval_s,
+    )
+
+    async def swim_send(url: str, msg: Dict[str, Any], timeout_s: float) -> Optional[Dict[str, Any]]:
+        r = await transport.post(url, "/internal/swim", json=msg, timeout=timeout_s)
+        return r.json() if r.status_code == 200 else None
+
+    swim: Optional[Swim] = None
+    if cfg.membership_protocol == "swim":
+        swim = Swim(
+            cfg.base_url,
+            cfg.peers,
+            swim_send,
+            period_s=cfg.swim_period_s,
+            ping_timeout_s=cfg.swim_ping_timeout_s,
+            indirect_k=cfg.swim_indirect_k,
+            suspect_mult=cfg.swim_suspect_mult,
+        )
+    ring = make_ring(cfg.partitioner, membership.all_nodes(), vnodes=cfg.virtual_nodes)
+    ring.version = membership.version
+    hint_path = os.path.join(cfg.data_dir, "hints.jsonl") if cfg.data_dir else None
+    if hint_path:
+        os.makedirs(cfg.data_dir, exist_ok=True)
+    handoff = HintedHandoff(
+        HintQueue(max_hints=cfg.hint_max, path=hint_path, resolve=resolve),
+        transport,
+        membership,
+        batch_size=cfg.hint_replay_batch,
+        rate=cfg.hint_replay_rate,
+    )
+    repair = None
+    if cfg.read_repair:
+        repair = ReadRepair(
+            transport,
+            self_url=cfg.base_url,
+            # other workers' keys are repaired through the node's own port
+            apply_local=None if sharded else lambda items: access.merge_many(items),
+            batch_size=cfg.read_repair_batch,
+            rate=cfg.read_repair_rate,
+            resolve=resolve,
+        )
+    qc = QuorumClient(
+        transport,
+        handoff=handoff,
+        repair=repair,
+        latency=LatencyTracker(),
+        max_background=cfg.max_background_writes,
+        late_timeout_s=cfg.late_write_timeout_s,
+        resolve=resolve,
+        binary=wire.BinaryClient(transport) if cfg.binary_internal else None,
+        metrics=metrics,
+        write_batch_items=cfg.write_batch_items,
+        write_batch_delay_s=cfg.write_batch_delay_s,
+    )
+    background: List[asyncio.Task] = []
+
+    # Resync the ring only when the membership version moved.
+    # The ring is changed in place on the event loop; ring_lock only guards
+    # it against readers on store worker threads (Merkle updates).
+    ring_lock = threading.Lock()
+
+    def sync_ring() -> None:
+        if ring.version != membership.version:
+            old = ring.nodes
+            with ring_lock:
+                ring.set_nodes(membership.all_nodes(), version=membership.version)
+            if rebalancer is not None and ring.nodes != old:
+                rebalancer.ring_changed(old, ring)
+
+    # Does not resync the ring (callers may be worker threads); the Merkle
+    # trees are rebuilt whenever the ring version moves.
+    def owners_many(keys) -> List[Tuple[str, ...]]:
+        with ring_lock:
+            return ring.replicas_many(keys, cfg.replication)
+
+    # Ordered key and token indexes over the store, kept only when range
+    # scans are enabled: key order serves /kv/scan, token order lets
+    # rebalancing walk moved ranges without its own pass over the store.
+    index: Optional[IndexedStore] = None
+    if cfg.range_scans:
+        index = store = IndexedStore(store, ring.token, ring.partitioner.bits)
+    rebalancer: Optional[Rebalancer] = None
+    if cfg.rebalance:
+        rebalancer = Rebalancer(
+            cfg.base_url,
+            store,
+            transport,
+            membership,
+            lambda nodes: make_ring(cfg.partitioner, nodes, vnodes=cfg.virtual_nodes),
+            cfg.replication,
+            batch_size=cfg.rebalance_batch,
+            rate=cfg.rebalance_rate,
+            state_path=os.path.join(cfg.data_dir, "rebalance.json") if cfg.data_dir else None,
+            binary=qc.binary,
+            max_transition_s=cfg.rebalance_max_transition_s,
+            # `access` is set up below, before the rebalancer first runs
+            run=lambda fn, *args: access.call(fn, *args),
+        )
+
+    # Anti-entropy: every applied write updates per-peer Merkle trees.
+    merkle: Optional[MerkleIndex] = None
+    if cfg.anti_entropy_interval_s > 0:
+        merkle = MerkleIndex(cfg.base_url, owners_many, ring.token, ring.partitioner.bits, depth=cfg.merkle_depth)
+        merkle.load(store.items())
+        store = TrackedStore(store, merkle)
+    store = MeteredStore(store, metrics)
+
+    # Read cache for /kv/get?consistency=cached. Every key whose record
+    # changes here (client, replica, repair or rebalance writes) is
+    # broadcast so other coordinators drop their cached copy.
+    cache: Optional[ReadCache] = None
+    invalidator: Optional[CacheInvalidator] = None
+    if cfg.read_cache_bytes > 0:
+        cache = ReadCache(cfg.read_cache_bytes, ttl_s=cfg.read_cache_ttl_s)
+
+        async def send_invalidation(peer: str, keys: List[str]):
+            r = await transport.post(peer, "/internal/cache/invalidate", json={"keys": keys})
+            r.raise_for_status()
+
+        async def invalidate_here(keys: List[str]) -> None:
+            if sharded:
+                await to_owners("invalidate_cache", keys)
+            else:
+                cache.invalidate(keys)
+
+        invalidator = CacheInvalidator(
+            lambda: [n for n in membership.all_nodes() if n != cfg.base_url and membership.is_alive(n)],
+            send_invalidation,
+            invalidate_here,
+            interval_s=cfg.cache_invalidate_interval_s,
+        )
+        store = ChangeNotifyingStore(store, invalidator.changed)
+
+    # Handlers reach the store through `access`: inline on the event loop
+    # for in-memory engines, on worker threads over lock stripes for
+    # blocking ones. Background paths use the (then thread-safe) store.
+    # On a multi-worker node `access` also routes keys to the worker owning
+    # them, while background paths (rebalancing, hints) stay per worker.
+    access_mode = cfg.store_access if cfg.store_access != "auto" else ("thread" if cfg.engine in BLOCKING_ENGINES else "inline")
+    access: StoreAccess
+    if sharded:
+        access = ShardedAccess(
+            store, access_mode, cfg.worker_index, cfg.workers, cfg.socket_dir, ring.token, ring.partitioner.bits,
+            depth=cfg.merkle_depth, timeout_s=cfg.shard_timeout_s, workers=cfg.store_threads, stripes=cfg.store_stripes, index=index,
+        )
+    else:
+        access = StoreAccess(store, access_mode, workers=cfg.store_threads, stripes=cfg.store_stripes, index=index)
+    store = access.store
+
+    # Multi-worker anti-entropy: trees for a peer cover the leaf hashes of
+    # every worker, digests are collected from all of them.
+    async def merkle_prepare(peer: str) -> None:
+        rows = await access.each("merkle_row", peer)
+        foreign = [0] * (1 << merkle.depth)
+        for shard, (lo, row) in enumerate(rows):
+            if shard != cfg.worker_index:
+                foreign[lo:lo + len(row)] = row
+        merkle.set_foreign(peer, foreign)
+
+    async def merkle_leaf_digests(peer: str, leaves: List[int]) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for part in await access.each("merkle_leaves", peer, leaves):
+            out.update(part)
+        return out
+
+    anti_entropy: Optional[AntiEntropy] = None
+    if merkle is not None:
+        anti_entropy = AntiEntropy(
+            merkle, access, transport, membership, interval_s=cfg.anti_entropy_interval_s,
+            prepare=merkle_prepare if sharded else None, leaf_digests=merkle_leaf_digests if sharded else None,
+        )
+
+    # Concurrent client reads of one key share a single quorum read.
+    reads: Optional[SingleFlight] = SingleFlight() if cfg.coalesce_reads else None
+    if cache is not None:
+        metrics.registry.counter_fn("dynamo_read_cache_requests_total", "Cached-consistency reads by whether the coordinator cache answered", lambda: {("hit",): cache.hits, ("miss",): cache.misses}, ["result"])
+        metrics.registry.counter_fn("dynamo_read_cache_evictions_total", "Read cache entries evicted for space", lambda: cache.evictions)
+        metrics.registry.counter_fn("dynamo_read_cache_invalidations_total", "Read cache entries dropped by writes", lambda: cache.invalidations)
+        metrics.registry.gauge("dynamo_read_cache_bytes", "Estimated size of the read cache", lambda: cache.size)
+    if index is not None or "keys" in store.stats():
+        metrics.registry.gauge("dynamo_keys", "Keys held by this node, tombstones included", lambda: len(index) if index is not None else store.stats()["keys"])
+    metrics.registry.gauge("dynamo_resident_memory_bytes", "Resident set size of the node process", rss_bytes)
+    metrics.registry.gauge("dynamo_hints_pending", "Hinted writes waiting for their target", lambda: handoff.queue.stats()["pending"])
+    metrics.registry.gauge("dynamo_background_writes", "Replica writes still in flight after their quorum was met", lambda: qc.stats()["background_writes"])
+    metrics.registry.gauge("dynamo_peer_up", "1 when the peer is alive and not suspected, 0.5 when suspected, 0 when dead", lambda: {(u,): (0.0 if not p["alive"] else 0.5 if p["suspected"] else 1.0) for u, p in membership.peer_snapshot().items()}, ["peer"])
+
+    # Sloppy placement of a preference list (R primaries followed by spare
+    # candidates): dead or suspected primaries are replaced by the next
+    # available spare, which receives the write with a hint. A suspected
+    # primary with no spare left is still used; a dead one is not. Returns
+    # (replicas, hints, spare, unplaced) where hints maps stand-in -> skipped
+    # primary and unplaced lists dead primaries that found no stand-in.
+    def place(prefs: List[str]) -> Tuple[List[str], Dict[str, str], List[str], List[str]]:
+        primary = prefs[:cfg.replication]
+        spare = [n for n in prefs[cfg.replication:] if membership.is_available(n)]
+        replicas: List[str] = []
+        hints: Dict[str, str] = {}
+        unplaced: List[str] = []
+        for n in primary:
+            if membership.is_available(n):
+                replicas.append(n)
+            elif spare:
+                stand_in = spare.pop(0)
+                replicas.append(stand_in)
+                hints[stand_in] = n
+            elif membership.is_alive(n):
+                replicas.append(n)
+            else:
+                unplaced.append(n)
+        return replicas, hints, spare, unplaced
+
+    def route_sloppy(key: str) -> Tuple[List[str], Dict[str, str], List[str], List[str]]:
+        sync_ring()
+        return place(ring.replicas(key, cfg.replication + cfg.hint_fallbacks))
+
+    def route(key: str) -> List[str]:
+        return route_sloppy(key)[0]
+
+    # While a key's range is being rebalanced it is written to and read from
+    # its old and new owners together, with W and Q raised by the size of
+    # the difference so any W (Q) answers include W (Q) from each side.
+    # Returns (replicas, w, q).
+    def joint(key: str, replicas: List[str]) -> Tuple[List[str], int, int]:
+        moving = rebalancer.moving(key) if rebalancer is not None else None
+        if moving is None:
+            return replicas, cfg.w, cfg.q
+        old = [n for n in moving[0] if membership.is_alive(n)]
+        union = replicas + [n for n in old if n not in replicas]
+        grow = max(len(union) - len(replicas), sum(1 for n in union if n not in old))
+        return union, min(len(union), cfg.w + grow), min(len(union), cfg.q + grow)
+
+    # joint() for a planned batch: adds old owners to the plan and returns
+    # the per-key (w, q) for keys that are moving.
+    def joint_batch(key_replicas: Dict[str, List[str]], by_node: Dict[str, List[str]]) -> Dict[str, Tuple[int, int]]:
+        needed: Dict[str, Tuple[int, int]] = {}
+        if rebalancer is None or rebalancer.previous is None:
+            return needed
+        for key, replicas in key_replicas.items():
+            union, w, q = joint(key, replicas)
+            if len(union) == len(replicas) and w == cfg.w:
+                continue
+            for n in union[len(replicas):]:
+                by_node.setdefault(n, []).append(key)
+            key_replicas[key] = union
+            needed[key] = (w, q)
+        return needed
+
+    # Route a batch of keys in one call and group them by destination node.
+    # hinted maps (node, key) -> dead primary for stand-in placements;
+    # unplaced maps key -> dead primaries without a stand-in.
+    def plan_batch(keys: List[str]) -> Tuple[Dict[str, List[str]], Dict[str, List[str]], Dict[Tuple[str, str], str], Dict[str, List[str]]]:
+        sync_ring()
+        key_replicas: Dict[str, List[str]] = {}
+        by_node: Dict[str, List[str]] = {}
+        hinted: Dict[Tuple[str, str], str] = {}
+        unplaced: Dict[str, List[str]] = {}
+        for key, prefs in zip(keys, ring.replicas_many(keys, cfg.replication + cfg.hint_fallbacks)):
+            replicas, hints, _, missing = place(list(prefs))
+            key_replicas[key] = replicas
+            for n in replicas:
+                by_node.setdefault(n, []).append(key)
+            for stand_in, dead in hints.items():
+                hinted[(stand_in, key)] = dead
+            if missing:
+                unplaced[key] = missing
+        return key_replicas, by_node, hinted, unplaced
+
+    # Keep hints on this node for a write it holds as a stand-in, and for
+    # dead primaries that found no stand-in at all.
+    def hint_here(key: str, rec: Record, stand_in_for: Optional[str], unplaced: List[str]) -> None:
+        if stand_in_for:
+            handoff.hint(stand_in_for, key, rec)
+        for dead in unplaced:
+            handoff.hint(dead, key, rec)
+
+    # Causal mode: the packed single-sibling state a write replicates. A
+    # delete is a sibling without a value.
+    def causal_write(value: Optional[str], context: Optional[str]) -> str:
+        try:
+            ctx = decode_context(context)
+        except (ValueError, IndexError):
+            raise HTTPException(status_code=400, detail={"error": "bad_context"})
+        return pack(new_write(ctx, clock.node, clock.next(), value))
+
+    # Causal mode: turn a quorum read result holding a packed state into
+    # sibling values plus the context to write back with.
+    def causal_view(res: Dict[str, Any]) -> Dict[str, Any]:
+        if not causal or not res.get("ok"):
+            return res
+        rec = res["record"]
+        state = unpack(rec["value"]) if rec["value"] else CausalState(vv={}, siblings=[])
+        values = state.values()
+        return {
+            **res,
+            "found": bool(values),
+            "record": {"value": values[0] if len(values) == 1 else None, "ts": rec["ts"], "tombstone": not values},
+            "values": values,
+            "siblings": len(state.siblings),
+            "context": encode_context(state.vv),
+        }
+
+    def replica_view(rec: Optional[Record]) -> Dict[str, Any]:
+        if rec is None:
+            # Return a "not found" record response, but still OK.
+            return {"ok": True, "value": None, "ts": 0.0, "tombstone": True}
+        return {"ok": True, "value": rec.value, "ts": rec.ts, "tombstone": rec.tombstone}
+
+    async def replica_views(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {k: replica_view(rec) for k, rec in zip(keys, await access.get_many(keys))}
 
     async def refresh_ring_periodically():
         while True:
             await asyncio.sleep(0.5)
-            ring.set_nodes(membership.all_nodes())
+            sync_ring()
+            if anti_entropy is not None and anti_entropy.index.ring_version != ring.version:
+                await anti_entropy.index.rebuild(ring.version)
 
     @app.on_event("startup")
     async def _startup():
         log.info("Starting node %s at %s, peers=%s", cfg.node_id, cfg.base_url, cfg.peers)
-        asyncio.create_task(membership.heartbeat_loop(cfg.heartbeat_interval_s, self_id=cfg.node_id))
-        asyncio.create_task(refresh_ring_periodically())
+        if swim is not None:
+            background.append(asyncio.create_task(membership.swim_loop(swim)))
+        else:
+            background.append(asyncio.create_task(membership.heartbeat_loop(cfg.heartbeat_interval_s, self_id=cfg.node_id)))
+        background.append(asyncio.create_task(refresh_ring_periodically()))
+        background.append(asyncio.create_task(handoff.replay_loop()))
+        if hint_path:
+            background.append(asyncio.create_task(handoff.flush_loop()))
+        if repair is not None:
+            background.append(asyncio.create_task(repair.run()))
+        if invalidator is not None:
+            background.append(asyncio.create_task(invalidator.run()))
+        if anti_entropy is not None:
+            await anti_entropy.index.rebuild(ring.version)
+            # one sync loop per node, run by its first worker
+            if cfg.worker_index == 0:
+                background.append(asyncio.create_task(anti_entropy.run()))
+        if rebalancer is not None:
+            sync_ring()
+            rebalancer.resume(ring)
+            background.append(asyncio.create_task(rebalancer.run()))
+
+    @app.on_event("shutdown")
+    async def _shutdown():
+        for t in background:
+            t.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        background.clear()
+        await qc.drain(cfg.late_write_timeout_s)
+        if repair is not None:
+            await repair.aclose()
+        await transport.aclose()
+        handoff.queue.close()
+        if sharded:
+            await access.aclose()
+        access.close()
 
     @app.get("/health")
-    def health():
+    async def health():
         return {"ok": True, "node_id": cfg.node_id, "base_url": cfg.base_url}
 
     @app.get("/debug/state")
-    def debug_state():
+    async def debug_state():
         return {
             "node_id": cfg.node_id,
             "base_url": cfg.base_url,
             "ring_nodes": ring.nodes,
+            "ring_version": ring.version,
+            "partitioner": cfg.partitioner,
+            "versioning": cfg.versioning,
             "peers": membership.peer_snapshot(),
+            "membership_protocol": cfg.membership_protocol,
+            "swim": swim.stats() if swim is not None else None,
             "replication": cfg.replication,
             "w": cfg.w,
             "q": cfg.q,
+            "transport": transport.stats(),
+            "store": store.stats(),
+            "store_access": access.stats(),
+            "worker": {"index": cfg.worker_index, "count": cfg.workers} if sharded else None,
+            "hinted_handoff": handoff.stats(),
+            "quorum": qc.stats(),
+            "read_coalescing": reads.stats() if reads is not None else None,
+            "read_cache": {**cache.stats(), "invalidation": invalidator.stats()} if cache is not None else None,
+            "read_repair": repair.stats() if repair is not None else None,
+            "anti_entropy": anti_entropy.stats() if anti_entropy is not None else None,
+            "rebalance": rebalancer.stats() if rebalancer is not None else None,
+            "latency": metrics.summary(),
         }
 
+    def written(keys: List[str]) -> None:
+        if reads is not None:
+            reads.forget(keys)
+        if cache is not None:
+            cache.invalidate(keys)
+
+    # Run an exposed method on the workers owning `keys`, each with its own
+    # keys (in-process for this worker's).
+    async def to_owners(method: str, keys: List[str]) -> None:
+        by_shard: Dict[int, List[str]] = {}
+        for key in keys:
+            by_shard.setdefault(access.shard_of(key), []).append(key)
+        await asyncio.gather(*(access.remote(shard, method, part) for shard, part in by_shard.items()), return_exceptions=True)
+
+    # A write's quorum finished: `infos` maps each key to its quorum result.
+    # Reads of those keys in flight from before the write are not shared
+    # with later readers. On a multi-worker node only the workers owning
+    # the keys hold their reads (see read_key), so a single-key write tells
+    # at most one sibling.
+    async def write_done(op: str, t0: float, infos: Dict[str, Dict[str, Any]]) -> None:
+        metrics.quorum_wait.labels(op).observe(time.perf_counter() - t0)
+        if reads is not None or cache is not None:
+            if sharded:
+                await to_owners("written", list(infos))
+            else:
+                written(list(infos))
+        acks = failed = 0
+        for info in infos.values():
+            acks += info["acks"]
+            failed += info["acks"] < info["needed"]
+        metrics.acks.labels(op).inc(acks)
+        if failed:
+            metrics.quorum_failures.labels(op).inc(failed)
+
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        text = merge_expositions(await access.each("metrics")) if sharded else metrics.render()
+        return Response(content=text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    # Every successful quorum read refills the cache, unless the key was
+    # invalidated while it ran.
+    async def quorum_read(key: str, replicas: List[str], q: int) -> Dict[str, Any]:
+        ticket = cache.ticket() if cache is not None else 0
+        local = (cfg.base_url, replica_view(await access.get(key))) if cfg.base_url in replicas else None
+        t0 = time.perf_counter()
+        res = await qc.quorum_get(replicas, key, q=q, local=local)
+        metrics.quorum_wait.labels("get").observe(time.perf_counter() - t0)
+        if cache is not None and res["ok"]:
+            entry = {k: v for k, v in res.items() if k != "responses"}
+            cache.put(key, entry, len(res["record"]["value"] or ""), ticket)
+        return res
+
+    # A client read: from the cache when allowed and present, else a quorum
+    # read shared with concurrent readers of the key. On a multi-worker
+    # node it runs on the worker owning the key, so its in-flight reads and
+    # cached entry live in one place; that costs no extra hop when this
+    # node is a replica, whose local read goes to that worker anyway.
+    async def read_key(key: str, cached: bool) -> Dict[str, Any]:
+        if cached and cache is not None:
+            hit = cache.get(key)
+            if hit is not None:
+                return {**hit, "cached": True}
+        t0 = time.perf_counter()
+        replicas, _, q = joint(key, route(key))
+        metrics.ring_lookup.labels("get").observe(time.perf_counter() - t0)
+        if reads is None:
+            res = await quorum_read(key, replicas, q)
+        else:
+            res, shared = await reads.do(key, lambda: quorum_read(key, replicas, q))
+            metrics.coalesced.labels("joined" if shared else "started").inc()
+        return {**res, "replicas": replicas}
+
     # Public client endpoints
     @app.post("/kv/put")
     async def kv_put(req: PutReq):
-        ring.set_nodes(membership.all_nodes())
-        replicas = ring.replicas(req.key, cfg.replication)
+        t0 = time.perf_counter()
+        replicas, hints, spare, unplaced = route_sloppy(req.key)
+        replicas, w, _ = joint(req.key, replicas)
+        metrics.ring_lookup.labels("put").observe(time.perf_counter() - t0)
         ts = time.time()
+        value = causal_write(req.value, req.context) if causal else req.value
+        rec = Record(value=value, ts=ts)
 
-        # Write to local store if this node is a replica
+        # Write to local store if this node is a replica; it counts as one ack
+        local = None
         if cfg.base_url in replicas:
-            store.put(req.key, req.value, ts=ts)
+            await access.put(req.key, value, ts=ts)
+            local = cfg.base_url
+        hint_here(req.key, rec, hints.get(cfg.base_url), unplaced)
 
-        info = await qc.replicate_put(replicas, req.key, req.value, ts=ts, w=cfg.w)
+        t0 = time.perf_counter()
+        info = await qc.replicate_put(replicas, req.key, value, ts=ts, w=w, local=local, hints=hints, spare=spare)
+        await write_done("put", t0, {req.key: info})
         if info["acks"] < info["needed"]:
             raise HTTPException(status_code=503, detail={"error": "write_quorum_not_met", **info, "replicas": replicas})
 
-        return {"ok": True, "key": req.key, "ts": ts, "replicas": replicas, "quorum": info}
+        out = {"ok": True, "key": req.key, "ts": ts, "replicas": replicas, "quorum": info}
+        if causal:
+            out["context"] = encode_context(unpack(value).vv)
+        return out
 
+    # consistency=cached may answer from this coordinator's cache: a value
+    # at most read_cache_ttl_s old that can miss writes coordinated
+    # elsewhere for about one invalidation interval.
     @app.get("/kv/get")
-    async def kv_get(key: str):
-        ring.set_nodes(membership.all_nodes())
-        replicas = ring.replicas(key, cfg.replication)
-        res = await qc.quorum_get(replicas, key, q=cfg.q)
+    async def kv_get(key: str, consistency: str = "quorum"):
+        if consistency not in ("quorum", "cached"):
+            raise HTTPException(status_code=400, detail={"error": "bad_consistency", "expected": ["quorum", "cached"]})
+        cached = consistency == "cached"
+        if sharded and (reads is not None or cache is not None):
+            res = await access.remote(access.shard_of(key), "read_key", key, cached)
+        else:
+            res = await read_key(key, cached)
+        if res.get("cached"):
+            return {"ok": True, "key": key, **causal_view(res)}
+        replicas = res.pop("replicas")
         if not res["ok"]:
+            metrics.quorum_failures.labels("get").inc()
             raise HTTPException(status_code=503, detail={"error": "read_quorum_not_met", "replicas": replicas, **res})
-        return {"ok": True, "key": key, "replicas": replicas, **res}
+        return {"ok": True, "key": key, "replicas": replicas, **causal_view(res)}
+
+    # Range/prefix scan in key order, streamed as NDJSON: one line per live
+    # key (same fields as /kv/get, or ok=false for a key short of read
+    # quorum), then {"next": key} to pass as `start` for the next page (null
+    # at the end). Nodes are paged in parallel and merged, so memory stays
+    # bounded by the page size whatever the range.
+    @app.get("/kv/scan")
+    async def kv_scan(prefix: str = "", start: Optional[str] = None, limit: int = 100):
+        if not cfg.range_scans:
+            raise HTTPException(status_code=404, detail={"error": "range_scans_disabled"})
+        if limit < 1 or limit > 10_000:
+            raise HTTPException(status_code=400, detail={"error": "bad_limit"})
+        sync_ring()
+        nodes = [n for n in ring.nodes if n == cfg.base_url or membership.is_alive(n)]
+        if rebalancer is not None and rebalancer.previous is not None:
+            nodes += [n for n in rebalancer.previous.nodes if n not in nodes and membership.is_alive(n)]
+
+        def owners(key: str) -> Tuple[List[str], int]:
+            replicas, _, q = joint(key, route(key))
+            return replicas, q
+
+        async def lines():
+            sent, next_key = 0, None
+            rows = qc.quorum_scan(nodes, owners, prefix=prefix, start=start, page=min(limit + 1, 512), local=(cfg.base_url, local_scan_page))
+            try:
+                async for key, rec in rows:
+                    if sent >= limit:
+                        next_key = key
+                        break
+                    if rec is None:
+                        line = {"key": key, "ok": False, "error": "read_quorum_not_met"}
+                    else:
+                        line = {"key": key, **causal_view({"ok": True, "found": not rec.tombstone, "record": {"value": rec.value, "ts": rec.ts, "tombstone": rec.tombstone}})}
+                        if not line["found"]:
+                            continue
+                    sent += 1
+                    yield json.dumps(line) + "\n"
+            finally:
+                await rows.aclose()
+            yield json.dumps({"next": next_key}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
     @app.post("/kv/delete")
     async def kv_delete(req: DelReq):
-        ring.set_nodes(membership.all_nodes())
-        replicas = ring.replicas(req.key, cfg.replication)
+        t0 = time.perf_counter()
+        replicas, hints, spare, unplaced = route_sloppy(req.key)
+        replicas, w, _ = joint(req.key, replicas)
+        metrics.ring_lookup.labels("delete").observe(time.perf_counter() - t0)
         ts = time.time()
+        if causal:
+            value = causal_write(None, req.context)
+            rec = Record(value=value, ts=ts)
+        else:
+            rec = Record(value=None, ts=ts, tombstone=True)
 
+        local = None
         if cfg.base_url in replicas:
-            store.delete(req.key, ts=ts)
+            if causal:
+                await access.put(req.key, value, ts=ts)
+            else:
+                await access.delete(req.key, ts=ts)
+            local = cfg.base_url
+        hint_here(req.key, rec, hints.get(cfg.base_url), unplaced)
 
-        info = await qc.replicate_delete(replicas, req.key, ts=ts, w=cfg.w)
+        t0 = time.perf_counter()
+        if causal:
+            info = await qc.replicate_put(replicas, req.key, value, ts=ts, w=w, local=local, hints=hints, spare=spare)
+        else:
+            info = await qc.replicate_delete(replicas, req.key, ts=ts, w=w, local=local, hints=hints, spare=spare)
+        await write_done("delete", t0, {req.key: info})
         if info["acks"] < info["needed"]:
             raise HTTPException(status_code=503, detail={"error": "delete_quorum_not_met", **info, "replicas": replicas})
 
         return {"ok": True, "key": req.key, "ts": ts, "replicas": replicas, "quorum": info}
 
+    # Batch endpoints: keys are grouped per replica so each node gets one
+    # internal request; W/Q are enforced per key.
+    @app.post("/kv/put_batch")
+    async def kv_put_batch(req: PutBatchReq):
+        if causal:
+            values = {it.key: causal_write(it.value, it.context) for it in req.items}
+        else:
+            values = {it.key: it.value for it in req.items}
+        t0 = time.perf_counter()
+        key_replicas, by_node, hinted, unplaced = plan_batch(list(values))
+        needed = joint_batch(key_replicas, by_node)
+        metrics.ring_lookup.labels("put_batch").observe(time.perf_counter() - t0)
+        ts = time.time()
+
+        local = None
+        if cfg.base_url in by_node:
+            await access.put_many([(key, values[key], ts) for key in by_node[cfg.base_url]])
+            local = cfg.base_url
+        for key in values:
+            hint_here(key, Record(value=values[key], ts=ts), hinted.get((cfg.base_url, key)), unplaced.get(key, []))
+
+        plan = {url: [{"key": k, "value": values[k], "ts": ts, "hint_for": hinted.get((url, k))} for k in keys] for url, keys in by_node.items()}
+        t0 = time.perf_counter()
+        infos = await qc.replicate_batch("/internal/replica/put_batch", plan, w=cfg.w, local=local, needed={k: n[0] for k, n in needed.items()})
+        await write_done("put_batch", t0, infos)
+        results = {k: {"ok": info["acks"] >= info["needed"], "replicas": key_replicas[k], "quorum": info} for k, info in infos.items()}
+        failed = sum(1 for r in results.values() if not r["ok"])
+        return {"ok": failed == 0, "ts": ts, "failed": failed, "results": results}
+
+    @app.post("/kv/get_batch")
+    async def kv_get_batch(req: KeysReq):
+        keys = list(dict.fromkeys(req.keys))
+        t0 = time.perf_counter()
+        key_replicas, by_node, _, _ = plan_batch(keys)
+        needed = joint_batch(key_replicas, by_node)
+        metrics.ring_lookup.labels("get_batch").observe(time.perf_counter() - t0)
+        local = None
+        if cfg.base_url in by_node:
+            local = (cfg.base_url, await replica_views(by_node[cfg.base_url]))
+        t0 = time.perf_counter()
+        res = await qc.quorum_get_batch(by_node, q=cfg.q, local=local, needed={k: n[1] for k, n in needed.items()})
+        metrics.quorum_wait.labels("get_batch").observe(time.perf_counter() - t0)
+        results = {k: {**causal_view(r), "replicas": key_replicas[k]} for k, r in res.items()}
+        failed = sum(1 for r in results.values() if not r["ok"])
+        if failed:
+            metrics.quorum_failures.labels("get_batch").inc(failed)
+        return {"ok": failed == 0, "failed": failed, "results": results}
+
+    @app.post("/kv/delete_batch")
+    async def kv_delete_batch(req: KeysReq):
+        keys = list(dict.fromkeys(req.keys))
+        t0 = time.perf_counter()
+        key_replicas, by_node, hinted, unplaced = plan_batch(keys)
+        needed = joint_batch(key_replicas, by_node)
+        metrics.ring_lookup.labels("delete_batch").observe(time.perf_counter() - t0)
+        ts = time.time()
+        if causal:
+            contexts = req.contexts or {}
+            values = {k: causal_write(None, contexts.get(k)) for k in keys}
+
+        local = None
+        if cfg.base_url in by_node:
+            if causal:
+                await access.put_many([(key, values[key], ts) for key in by_node[cfg.base_url]])
+            else:
+                await access.delete_many([(key, ts) for key in by_node[cfg.base_url]])
+            local = cfg.base_url
+        for key in keys:
+            rec = Record(value=values[key], ts=ts) if causal else Record(value=None, ts=ts, tombstone=True)
+            hint_here(key, rec, hinted.get((cfg.base_url, key)), unplaced.get(key, []))
+
+        if causal:
+            plan = {url: [{"key": k, "value": values[k], "ts": ts, "hint_for": hinted.get((url, k))} for k in keys] for url, keys in by_node.items()}
+            t0 = time.perf_counter()
+            infos = await qc.replicate_batch("/internal/replica/put_batch", plan, w=cfg.w, local=local, needed={k: n[0] for k, n in needed.items()})
+        else:
+            plan = {url: [{"key": k, "ts": ts, "hint_for": hinted.get((url, k))} for k in keys] for url, keys in by_node.items()}
+            t0 = time.perf_counter()
+            infos = await qc.replicate_batch("/internal/replica/delete_batch", plan, w=cfg.w, local=local, needed={k: n[0] for k, n in needed.items()})
+        await write_done("delete_batch", t0, infos)
+        results = {k: {"ok": info["acks"] >= info["needed"], "replicas": key_replicas[k], "quorum": info} for k, info in infos.items()}
+        failed = sum(1 for r in results.values() if not r["ok"])
+        return {"ok": failed == 0, "ts": ts, "failed": failed, "results": results}
+
     # Internal replica endpoints
     @app.post("/internal/replica/put")
-    def replica_put(req: ReplicaPutReq):
-        store.put(req.key, req.value, ts=req.ts)
+    async def replica_put(req: ReplicaPutReq):
+        rec = await access.put(req.key, req.value, ts=req.ts)
+        if req.hint_for:
+            handoff.hint(req.hint_for, req.key, rec)
         return {"ok": True}
 
     @app.post("/internal/replica/delete")
-    def replica_delete(req: ReplicaDelReq):
-        store.delete(req.key, ts=req.ts)
+    async def replica_delete(req: ReplicaDelReq):
+        rec = await access.delete(req.key, ts=req.ts)
+        if req.hint_for:
+            handoff.hint(req.hint_for, req.key, rec)
         return {"ok": True}
 
     @app.get("/internal/replica/get")
-    def replica_get(key: str):
-        rec = store.get(key)
-        if rec is None:
-            # Return a "not found" record response, but still OK.
-            return {"ok": True, "value": None, "ts": 0.0, "tombstone": True}
-        return {"ok": True, "value": rec.value, "ts": rec.ts, "tombstone": rec.tombstone}
+    async def replica_get(key: str):
+        return replica_view(await access.get(key))
+
+    # One page of this node's keys in key order, tombstones included.
+    async def local_scan_page(prefix: str = "", start: Optional[str] = None, after: Optional[str] = None, limit: int = 256) -> Tuple[list, bool]:
+        rows = await access.scan_keys(prefix, start, after, limit + 1)
+        return [[k, r.value, r.ts, r.tombstone] for k, r in rows[:limit]], len(rows) > limit
+
+    @app.get("/internal/replica/scan")
+    async def replica_scan(prefix: str = "", start: Optional[str] = None, after: Optional[str] = None, limit: int = 256):
+        if not cfg.range_scans:
+            raise HTTPException(status_code=404, detail={"error": "range_scans_disabled"})
+        items, more = await local_scan_page(prefix, start, after, max(1, min(limit, 10_000)))
+        return {"ok": True, "items": items, "more": more}
+
+    @app.post("/internal/replica/put_batch")
+    async def replica_put_batch(req: ReplicaPutBatchReq):
+        recs = await access.put_many([(it.key, it.value, it.ts) for it in req.items])
+        for it, rec in zip(req.items, recs):
+            if it.hint_for:
+                handoff.hint(it.hint_for, it.key, rec)
+        return {"ok": True, "count": len(req.items)}
+
+    @app.post("/internal/replica/delete_batch")
+    async def replica_delete_batch(req: ReplicaDelBatchReq):
+        recs = await access.delete_many([(it.key, it.ts) for it in req.items])
+        for it, rec in zip(req.items, recs):
+            if it.hint_for:
+                handoff.hint(it.hint_for, it.key, rec)
+        return {"ok": True, "count": len(req.items)}
+
+    # LWW apply of records delivered out of band (hint replay, repair).
+    @app.post("/internal/replica/merge_batch")
+    async def replica_merge_batch(req: ReplicaMergeBatchReq):
+        applied = await access.merge_many([(it.key, Record(value=it.value, ts=it.ts, tombstone=it.tombstone)) for it in req.items])
+        return {"ok": True, "count": len(req.items), "applied": applied}
+
+    @app.post("/internal/replica/get_batch")
+    async def replica_get_batch(req: KeysReq):
+        return {"ok": True, "records": await replica_views(req.keys)}
+
+    # Binary frame endpoint carrying the same replica operations as the JSON
+    # routes above, without pydantic validation or JSON (see wire.py).
+    async def replica_binary(request: Request) -> Response:
+        try:
+            op, items = wire.decode_request(await request.body())
+        except (struct.error, UnicodeDecodeError, ValueError):
+            return Response(wire.encode_response(status=wire.STATUS_ERROR), status_code=400, media_type=wire.CONTENT_TYPE)
+        if op in (wire.OP_PUT, wire.OP_PUT_BATCH):
+            recs = await access.put_many([(key, value, ts) for key, value, ts, _, _ in items])
+            for (key, _, _, _, hint_for), rec in zip(items, recs):
+                if hint_for:
+                    handoff.hint(hint_for, key, rec)
+            body = wire.encode_response(applied=len(items))
+        elif op in (wire.OP_DELETE, wire.OP_DELETE_BATCH):
+            recs = await access.delete_many([(key, ts) for key, _, ts, _, _ in items])
+            for (key, _, _, _, hint_for), rec in zip(items, recs):
+                if hint_for:
+                    handoff.hint(hint_for, key, rec)
+            body = wire.encode_response(applied=len(items))
+        elif op in wire.READ_OPS:
+            keys = [it[0] for it in items]
+            body = wire.encode_response(list(zip(keys, await access.get_many(keys))))
+        elif op == wire.OP_MERGE_BATCH:
+            applied = await access.merge_many([(key, Record(value=value, ts=ts, tombstone=tomb)) for key, value, ts, tomb, _ in items])
+            body = wire.encode_response(applied=applied)
+        else:
+            return Response(wire.encode_response(status=wire.STATUS_ERROR), status_code=400, media_type=wire.CONTENT_TYPE)
+        return Response(body, media_type=wire.CONTENT_TYPE)
+
+    app.router.add_route(wire.BINARY_PATH, replica_binary, methods=["POST"])
+
+    # Merkle tree exchange for anti-entropy; `peer` is the caller, whose
+    # shared ranges select the tree.
+    @app.post("/internal/merkle/nodes")
+    async def merkle_nodes(req: MerkleNodesReq):
+        if anti_entropy is None:
+            raise HTTPException(status_code=404, detail="anti-entropy disabled")
+        if not 0 <= req.level <= anti_entropy.index.depth:
+            raise HTTPException(status_code=400, detail="bad level")
+        if sharded:
+            await merkle_prepare(req.peer)
+        return {"ok": True, "hashes": anti_entropy.index.nodes(req.peer, req.level, req.indices)}
+
+    @app.post("/internal/merkle/leaves")
+    async def merkle_leaves(req: MerkleLeavesReq):
+        if anti_entropy is None:
+            raise HTTPException(status_code=404, detail="anti-entropy disabled")
+        if sharded:
+            return {"ok": True, "digests": await merkle_leaf_digests(req.peer, req.leaves)}
+        return {"ok": True, "digests": anti_entropy.index.leaf_digests(req.peer, req.leaves)}
+
+    # Keys another replica applied writes for; dropped from this node's caches.
+    @app.post("/internal/cache/invalidate")
+    async def cache_invalidate(req: InvalidateReq):
+        if cache is not None:
+            await invalidate_here(req.keys)
+        return {"ok": True}
+
+    # A multi-worker node is done once every worker is.
+    @app.get("/internal/rebalance/status")
+    async def rebalance_status():
+        if rebalancer is None:
+            raise HTTPException(status_code=404, detail="rebalancing disabled")
+        if not sharded:
+            return rebalancer.status()
+        states = await access.each("rebalance_status")
+        nodes = states[cfg.worker_index]["nodes"]
+        return {"ok": True, "nodes": nodes, "done": all(st["done"] and st["nodes"] == nodes for st in states)}
+
+    # Calls between the workers of this node (ShardedAccess.remote).
+    @app.post(SHARD_CALL_PATH)
+    async def shard_call(req: ShardCallReq):
+        if not sharded:
+            raise HTTPException(status_code=404, detail="single worker")
+        try:
+            return {"ok": True, "result": await access.serve(req.method, req.args)}
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"unknown method {req.method!r}")
+
+    if sharded:
+        async def merkle_row(peer: str) -> list:
+            lo, hi = shard_leaves(cfg.worker_index, cfg.workers, merkle.depth)
+            return [lo, merkle.leaf_row(peer, lo, hi)]
+
+        async def merkle_own_digests(peer: str, leaves: List[int]) -> Dict[str, int]:
+            return merkle.leaf_digests(peer, leaves)
+
+        async def own_rebalance_status() -> Dict[str, Any]:
+            return rebalancer.status()
+
+        async def mark_seen(url: str) -> None:
+            membership.mark_seen(url)
+
+        async def render_metrics() -> str:
+            return metrics.render()
+
+        if merkle is not None:
+            access.expose("merkle_row", merkle_row)
+            access.expose("merkle_leaves", merkle_own_digests)
+        if rebalancer is not None:
+            access.expose("rebalance_status", own_rebalance_status)
+
+        async def written_here(keys: List[str]) -> None:
+            written(keys)
+
+        async def invalidate_cache(keys: List[str]) -> None:
+            if cache is not None:
+                cache.invalidate(keys)
+
+        access.expose("mark_seen", mark_seen)
+        access.expose("written", written_here)
+        access.expose("read_key", read_key)
+        access.expose("invalidate_cache", invalidate_cache)
+        access.expose("metrics", render_metrics)
 
     # Internal membership endpoints
     @app.post("/internal/heartbeat")
-    def heartbeat(payload: Dict[str, Any]):
+    async def heartbeat(payload: Dict[str, Any]):
         from_url = payload.get("from") or payload.get("from_url") or payload.get("from_url_alt")
         if isinstance(from_url, str) and from_url:
+            # Known peers are heartbeated by every worker; a joining one is
+            # announced to all of them so their rings agree.
+            if sharded and from_url not in membership.peer_snapshot():
+                await asyncio.gather(*(access.remote(i, "mark_seen", from_url) for i in range(cfg.workers) if i != cfg.worker_index), return_exceptions=True)
             membership.mark_seen(from_url)
         return {"ok": True}
 
+    @app.post("/internal/swim")
+    async def swim_message(payload: Dict[str, Any]):
+        if swim is None:
+            raise HTTPException(status_code=404, detail="swim disabled")
+        return await swim.handle(payload)
+
     return app
@@ -0,0 +1,73 @@
+import hashlib
+from typing import Dict, List, Sequence
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+_MASK64 = (1 << 64) - 1
+
+# A partitioner maps a key (or vnode label) to an integer token.
+class Partitioner:
+    name = "base"
+    bits = 32
+
+    def token(self, key: str) -> int:
+        raise NotImplementedError
+
+    def tokens(self, keys: Sequence[str]) -> List[int]:
+        tok = self.token
+        return [tok(k) for k in keys]
+
+# Original MD5 scheme (first 32 bits of the digest), kept for compatibility
+# with existing clusters. Reads the digest bytes directly instead of going
+# through hexdigest and int(..., 16).
+class Md5Partitioner(Partitioner):
+    name = "md5"
+    bits = 32
+
+    def token(self, key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:4], "big")
+
+class Blake2bPartitioner(Partitioner):
+    name = "blake2b"
+    bits = 64
+
+    def token(self, key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+class XxHashPartitioner(Partitioner):
+    name = "xxhash"
+    bits = 64
+
+    def __init__(self):
+        if xxhash is None:
+            raise RuntimeError("partitioner 'xxhash' requires the xxhash package")
+        self._fn = xxhash.xxh3_64_intdigest
+
+    def token(self, key: str) -> int:
+        return self._fn(key.encode("utf-8"))
+
+# Finalizer from SplitMix64; spreads a 64-bit value over all bits.
+def mix64(x: int) -> int:
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+_PARTITIONERS: Dict[str, type] = {
+    "md5": Md5Partitioner,
+    "blake2b": Blake2bPartitioner,
+    "xxhash": XxHashPartitioner,
+}
+
+# Names accepted by NodeConfig.partitioner; "rendezvous" selects
+# highest-random-weight placement on top of the blake2b hash.
+PARTITIONER_NAMES = ["md5", "blake2b", "xxhash", "rendezvous"]
+
+def get_partitioner(name: str) -> Partitioner:
+    cls = _PARTITIONERS.get(name)
+    if cls is None:
+        raise ValueError(f"Unknown partitioner {name!r}, expected one of {sorted(_PARTITIONERS)}")
+    return cls()
@@ -0,0 +1,67 @@
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Phi-accrual failure detector (Hayashibara et al.). Per peer it keeps a
+# window of heartbeat inter-arrival times and reports
+#   phi = -log10(P(next heartbeat arrives later than now))
+# under a normal fit of that window, so suspicion rises smoothly with
+# silence and adapts to each peer's observed jitter. phi 1 means a 10%
+# chance the peer is still fine, phi 8 one in 10^8.
+class ArrivalWindow:
+    def __init__(self, size: int, first_interval_s: float):
+        self.intervals: Deque[float] = deque(maxlen=size)
+        self.total = 0.0
+        self.squares = 0.0
+        self.last: Optional[float] = None
+        # Until real intervals arrive, assume the configured heartbeat period.
+        self._add(first_interval_s)
+
+    def _add(self, dt: float) -> None:
+        if len(self.intervals) == self.intervals.maxlen:
+            old = self.intervals[0]
+            self.total -= old
+            self.squares -= old * old
+        self.intervals.append(dt)
+        self.total += dt
+        self.squares += dt * dt
+
+    def arrived(self, now: float) -> None:
+        if self.last is not None and now > self.last:
+            self._add(now - self.last)
+        self.last = now
+
+    def phi(self, now: float, min_std_s: float) -> float:
+        if self.last is None:
+            return 0.0
+        n = len(self.intervals)
+        mean = self.total / n
+        std = max(min_std_s, math.sqrt(max(0.0, self.squares / n - mean * mean)))
+        # Clamped: beyond 10 standard deviations phi is ~38 either way.
+        y = min(10.0, max(-10.0, (now - self.last - mean) / std))
+        # Logistic approximation of the normal CDF tail (as used by Akka/Cassandra).
+        e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+        if y > 0:
+            return -math.log10(e / (1.0 + e))
+        return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+class PhiAccrual:
+    def __init__(self, threshold: float = 8.0, window: int = 100, min_std_s: float = 0.25, first_interval_s: float = 1.0):
+        self.threshold = threshold
+        self.window = window
+        self.min_std_s = min_std_s
+        self.first_interval_s = first_interval_s
+        self._peers: Dict[str, ArrivalWindow] = {}
+
+    def heartbeat(self, peer: str, now: float) -> None:
+        w = self._peers.get(peer)
+        if w is None:
+            w = self._peers[peer] = ArrivalWindow(self.window, self.first_interval_s)
+        w.arrived(now)
+
+    def phi(self, peer: str, now: float) -> float:
+        w = self._peers.get(peer)
+        return w.phi(now, self.min_std_s) if w is not None else 0.0
+
+    def suspected(self, peer: str, now: float) -> bool:
+        return self.phi(peer, now) >= self.threshold
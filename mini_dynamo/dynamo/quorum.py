@@ -1,99 +1,427 @@
 import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Tuple
-
-import httpx
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
 
+from .handoff import HintedHandoff
+from .latency import LatencyTracker
+from .metrics import NodeMetrics
+from .microbatch import WriteBatcher
+from .repair import ReadRepair
 from .store import Record, InMemoryStore
+from .transport import PeerTransport
+from .wire import BinaryClient
 
 log = logging.getLogger("quorum")
 
 class QuorumClient:
-    def __init__(self, timeout_s: float):
-        self.timeout_s = timeout_s
+    # `resolve` picks (or builds) the winning record of two replica answers;
+    # LWW by default.
+    #
+    # `binary` sends replica calls as binary frames (see wire.py); `metrics`
+    # times every replica call and counts failures per peer.
+    #
+    # `latency` records per-peer response times (EWMA and percentiles).
+    #
+    # Replica writes still in flight when a write reaches W acks are finished
+    # by tracked background tasks: at most `max_background` of them at once
+    # (beyond that the caller waits for its own stragglers), each bounded by
+    # `late_timeout_s`, and failures or timeouts are turned into hints.
+    #
+    # With write_batch_items > 1, single-key replica writes to one peer are
+    # micro-batched into its batch endpoints (see WriteBatcher).
+    def __init__(self, transport: PeerTransport, handoff: Optional[HintedHandoff] = None, repair: Optional[ReadRepair] = None, latency: Optional[LatencyTracker] = None, max_background: int = 10_000, late_timeout_s: float = 5.0, resolve: Callable[[Optional[Record], Optional[Record]], Optional[Record]] = InMemoryStore.newer, binary: Optional[BinaryClient] = None, metrics: Optional[NodeMetrics] = None, write_batch_items: int = 0, write_batch_delay_s: float = 0.0005):
+        self.transport = transport
+        self.batcher = WriteBatcher(self._post, max_items=write_batch_items, max_delay_s=write_batch_delay_s) if write_batch_items > 1 else None
+        self.metrics = metrics
+        self.binary = binary
+        self.resolve = resolve
+        self.handoff = handoff
+        self.repair = repair
+        self.latency = latency
+        self.max_background = max_background
+        self.late_timeout_s = late_timeout_s
+        self._background: Set[asyncio.Task] = set()
+        self._late_inflight = 0
+        self.late_acks = 0
+        self.late_failures = 0
+        self.late_timeouts = 0
+        self.backpressure_waits = 0
 
-    async def _post(self, client: httpx.AsyncClient, url: str, path: str, payload: dict) -> Tuple[str, bool, Optional[dict]]:
-        try:
-            r = await client.post(f"{url}{path}", json=payload)
-            if r.status_code == 200:
-                return (url, True, r.json())
-            return (url, False, None)
-        except Exception:
-            return (url, False, None)
+    def _observe(self, url: str, path: str, t0: float, ok: bool, error: Optional[Exception] = None) -> None:
+        if self.metrics is not None:
+            self.metrics.replica_call(url, path, time.perf_counter() - t0, ok, error)
+        if self.latency is None:
+            return
+        if ok:
+            self.latency.observe(url, time.perf_counter() - t0)
+        else:
+            self.latency.failure(url)
 
-    async def _get(self, client: httpx.AsyncClient, url: str, path: str, params: dict) -> Tuple[str, bool, Optional[dict]]:
+    # One internal call; binary frames when enabled and the peer has them,
+    # JSON otherwise.
+    async def _call(self, method: str, url: str, path: str, payload: dict) -> Tuple[str, bool, Optional[dict]]:
+        t0 = time.perf_counter()
+        error: Optional[Exception] = None
         try:
-            r = await client.get(f"{url}{path}", params=params)
+            if self.binary is not None and self.binary.supports(url, path):
+                handled, ok, data = await self.binary.call(url, path, payload)
+                if handled:
+                    self._observe(url, path, t0, ok)
+                    return (url, ok, data)
+            if method == "GET":
+                r = await self.transport.get(url, path, params=payload)
+            else:
+                r = await self.transport.post(url, path, json=payload)
             if r.status_code == 200:
+                self._observe(url, path, t0, True)
                 return (url, True, r.json())
-            return (url, False, None)
-        except Exception:
-            return (url, False, None)
+        except Exception as e:
+            error = e
+        self._observe(url, path, t0, False, error)
+        return (url, False, None)
+
+    async def _post(self, url: str, path: str, payload: dict) -> Tuple[str, bool, Optional[dict]]:
+        return await self._call("POST", url, path, payload)
+
+    async def _get(self, url: str, path: str, params: dict) -> Tuple[str, bool, Optional[dict]]:
+        return await self._call("GET", url, path, params)
 
-    async def replicate_put(self, replicas: List[str], key: str, value: str, ts: float, w: int) -> Dict[str, Any]:
+    # Send a write to every remote replica and wait for w acks. `local` is the
+    # coordinator's own URL when it already applied the write in-process; it
+    # counts as an immediate ack and is not contacted over the network.
+    #
+    # Sloppy quorum: `hints` maps a stand-in replica to the dead node it
+    # replaces, and the write carries hint_for so the stand-in keeps a hint.
+    # When a replica fails, the write moves to the next `spare` node with a
+    # hint; with no spare left (or for failures after quorum) the hint is
+    # kept by this node's handoff queue.
+    async def _replicate(self, replicas: List[str], path: str, payload: dict, w: int, local: Optional[str], hints: Optional[Dict[str, str]] = None, spare: Optional[List[str]] = None) -> Dict[str, Any]:
         w = max(1, w)
-        async with httpx.AsyncClient(timeout=self.timeout_s) as client:
-            tasks = [
-                self._post(client, url, "/internal/replica/put", {"key": key, "value": value, "ts": ts})
-                for url in replicas
-            ]
-            acks = 0
-            results = {}
-            for coro in asyncio.as_completed(tasks):
-                url, ok, data = await coro
+        acks = 0
+        results = {}
+        hints = hints or {}
+        spare = list(spare or [])
+        intended: Dict[asyncio.Future, str] = {}
+
+        def send(url: str, hint_for: Optional[str]) -> asyncio.Future:
+            body = payload if hint_for is None else {**payload, "hint_for": hint_for}
+            if self.batcher is not None and self.batcher.batches(path):
+                t = asyncio.ensure_future(self.batcher.submit(url, path, body))
+            else:
+                t = asyncio.ensure_future(self._post(url, path, body))
+            intended[t] = hint_for or url
+            return t
+
+        if local is not None and local in replicas:
+            results[local] = True
+            acks += 1
+        pending = {send(url, hints.get(url)) for url in replicas if url != local}
+        while pending and acks < w:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                url, ok, data = t.result()
                 results[url] = ok
                 if ok:
                     acks += 1
-                if acks >= w:
-                    break
-            return {"acks": acks, "results": results, "needed": w}
+                elif spare:
+                    pending.add(send(spare.pop(0), intended[t]))
+                else:
+                    self._hint_locally(intended[t], path, payload)
+
+        await self._finish_later(pending, lambda t: self._hint_locally(intended[t], path, payload))
+        return {"acks": acks, "results": results, "needed": w}
+
+    # Hand replica writes still in flight at quorum to a background task.
+    # `on_failure(task)` runs for each write that fails or times out.
+    async def _finish_later(self, pending: Set[asyncio.Future], on_failure: Callable[[asyncio.Future], None]) -> None:
+        if not pending:
+            return
+        if self._late_inflight + len(pending) > self.max_background:
+            self.backpressure_waits += 1
+            self._late_inflight += len(pending)
+            await self._complete(pending, on_failure)
+            return
+        self._late_inflight += len(pending)
+        t = asyncio.ensure_future(self._complete(pending, on_failure))
+        self._background.add(t)
+        t.add_done_callback(self._background.discard)
+
+    async def _complete(self, pending: Set[asyncio.Future], on_failure: Callable[[asyncio.Future], None]) -> None:
+        try:
+            await asyncio.wait(pending, timeout=self.late_timeout_s)
+        finally:
+            self._late_inflight -= len(pending)
+            for t in pending:
+                if not t.done() or t.cancelled():
+                    t.cancel()
+                    self.late_timeouts += 1
+                    on_failure(t)
+                elif t.result()[1]:
+                    self.late_acks += 1
+                else:
+                    self.late_failures += 1
+                    on_failure(t)
 
-    async def replicate_delete(self, replicas: List[str], key: str, ts: float, w: int) -> Dict[str, Any]:
+    # Wait up to `timeout_s` for background writes, then cancel the rest
+    # (they are hinted).
+    async def drain(self, timeout_s: float = 5.0) -> None:
+        if not self._background:
+            return
+        _, late = await asyncio.wait(set(self._background), timeout=timeout_s)
+        for t in late:
+            t.cancel()
+        await asyncio.gather(*late, return_exceptions=True)
+
+    def _hint_locally(self, target: str, path: str, payload: dict) -> None:
+        if self.handoff is None:
+            return
+        # single-key and batch delete endpoints both carry tombstones
+        tombstone = "delete" in path.rsplit("/", 1)[-1]
+        rec = Record(value=None if tombstone else payload.get("value"), ts=float(payload["ts"]), tombstone=tombstone)
+        self.handoff.hint(target, payload["key"], rec)
+
+    async def replicate_put(self, replicas: List[str], key: str, value: str, ts: float, w: int, local: Optional[str] = None, hints: Optional[Dict[str, str]] = None, spare: Optional[List[str]] = None) -> Dict[str, Any]:
+        return await self._replicate(replicas, "/internal/replica/put", {"key": key, "value": value, "ts": ts}, w, local, hints, spare)
+
+    async def replicate_delete(self, replicas: List[str], key: str, ts: float, w: int, local: Optional[str] = None, hints: Optional[Dict[str, str]] = None, spare: Optional[List[str]] = None) -> Dict[str, Any]:
+        return await self._replicate(replicas, "/internal/replica/delete", {"key": key, "ts": ts}, w, local, hints, spare)
+
+    @staticmethod
+    def _record(data: dict) -> Record:
+        return Record(
+            value=data.get("value"),
+            ts=float(data.get("ts")),
+            tombstone=bool(data.get("tombstone")),
+        )
+
+    # `local` is (url, response) for a replica the coordinator read in-process.
+    # Every replica is asked; with read repair enabled the responses still
+    # outstanding at quorum are collected in the background and stale
+    # replicas are repaired.
+    async def quorum_get(self, replicas: List[str], key: str, q: int, local: Optional[Tuple[str, dict]] = None) -> Dict[str, Any]:
+        q = max(1, q)
+        best: Optional[Record] = None
+        responses = {}
+        views: Dict[str, Record] = {}
+
+        def take(url: str, data: dict) -> None:
+            nonlocal best
+            rec = self._record(data)
+            views[url] = rec
+            best = self.resolve(best, rec)
+
+        local_url = None
+        if local is not None and local[0] in replicas:
+            local_url, data = local
+            responses[local_url] = data
+            take(local_url, data)
+
+        pending = {
+            asyncio.ensure_future(self._get(url, "/internal/replica/get", {"key": key}))
+            for url in replicas
+            if url != local_url
+        }
+        while pending and len(views) < q:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                url, ok, data = t.result()
+                responses[url] = data if ok else None
+                if ok and data is not None:
+                    take(url, data)
+
+        if self.repair is not None:
+            self.repair.track(self._repair_after_read(pending, lambda data: {key: data}, {key: dict(views)}))
+        return {**self._read_result(best if len(views) >= q else None), "responses": responses}
+
+    # Wait (bounded) for the responses a quorum read did not need, then hand
+    # every key's replica views to read repair. `extract` turns a response
+    # body into {key: record dict}.
+    async def _repair_after_read(self, pending, extract, views: Dict[str, Dict[str, Record]]) -> None:
+        if pending:
+            done, late = await asyncio.wait(pending, timeout=self.repair.collect_timeout_s)
+            for t in late:
+                t.cancel()
+            for t in done:
+                url, ok, data = t.result()
+                if not ok or data is None:
+                    continue
+                for key, rec in extract(data).items():
+                    if key in views:
+                        views[key][url] = self._record(rec)
+        for key, v in views.items():
+            self.repair.reconcile(key, v)
+
+    # Quorum key-order scan. Every node in `nodes` is paged through
+    # /internal/replica/scan (`local` is (url, async page_fn) for this node) and the
+    # pages are merged k-way. A key is resolved once every node's cursor is
+    # past it, so each owner that answered either returned the key or does
+    # not hold it. `owners_fn(key)` gives (owners, q); yields (key, record)
+    # with record None when fewer than q owners answered. Only `page` keys
+    # per node are buffered at a time.
+    async def quorum_scan(self, nodes: List[str], owners_fn: Callable[[str], Tuple[List[str], int]], prefix: str = "", start: Optional[str] = None, page: int = 256, local: Optional[Tuple[str, Callable[..., Awaitable[Tuple[list, bool]]]]] = None) -> AsyncIterator[Tuple[str, Optional[Record]]]:
+        bufs: Dict[str, Deque[Tuple[str, Record]]] = {n: deque() for n in nodes}
+        last: Dict[str, Optional[str]] = {n: None for n in nodes}
+        more = set(nodes)
+        failed: Set[str] = set()
+
+        async def fill(n: str) -> None:
+            params: Dict[str, Any] = {"prefix": prefix, "limit": page}
+            if last[n] is not None:
+                params["after"] = last[n]
+            elif start:
+                params["start"] = start
+            if local is not None and n == local[0]:
+                items, has_more = await local[1](**params)
+            else:
+                _, ok, data = await self._get(n, "/internal/replica/scan", params)
+                if not ok or data is None:
+                    failed.add(n)
+                    more.discard(n)
+                    return
+                items, has_more = data["items"], data["more"]
+            for key, value, ts, tombstone in items:
+                bufs[n].append((key, Record(value=value, ts=ts, tombstone=tombstone)))
+            if items:
+                last[n] = items[-1][0]
+            if not has_more:
+                more.discard(n)
+
+        while True:
+            await asyncio.gather(*(fill(n) for n in nodes if n in more and not bufs[n]))
+            heads = [b[0][0] for b in bufs.values() if b]
+            if not heads:
+                return
+            key = min(heads)
+            best: Optional[Record] = None
+            views: Dict[str, Record] = {}
+            for n, b in bufs.items():
+                if b and b[0][0] == key:
+                    rec = b.popleft()[1]
+                    views[n] = rec
+                    best = self.resolve(best, rec)
+            owners, q = owners_fn(key)
+            answered = {o: views.get(o, Record(value=None, ts=0.0, tombstone=True)) for o in owners if o in bufs and o not in failed}
+            if len(answered) < q:
+                yield key, None
+                continue
+            if self.repair is not None:
+                self.repair.reconcile(key, answered)
+            yield key, best
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "background_writes": self._late_inflight,
+            "late_acks": self.late_acks,
+            "late_failures": self.late_failures,
+            "late_timeouts": self.late_timeouts,
+            "backpressure_waits": self.backpressure_waits,
+            "binary": self.binary.stats() if self.binary is not None else None,
+            "write_batching": self.batcher.stats() if self.batcher is not None else None,
+            "peers": self.latency.stats() if self.latency is not None else {},
+        }
+
+    @staticmethod
+    def _read_result(best: Optional[Record]) -> Dict[str, Any]:
+        if best is None:
+            return {"ok": False, "reason": "no_quorum"}
+
+        if best.tombstone:
+            return {"ok": True, "found": False, "record": {"value": None, "ts": best.ts, "tombstone": True}}
+
+        return {"ok": True, "found": True, "record": {"value": best.value, "ts": best.ts, "tombstone": False}}
+
+    # Batched writes. `plan` maps each replica URL to the items it owns (every
+    # item has a "key"); one request goes to each remote replica. Returns
+    # per-key ack counts once every key reached w acks (or its entry in
+    # `needed`) or all replicas answered.
+    async def replicate_batch(self, path: str, plan: Dict[str, List[dict]], w: int, local: Optional[str] = None, needed: Optional[Dict[str, int]] = None) -> Dict[str, Dict[str, Any]]:
         w = max(1, w)
-        async with httpx.AsyncClient(timeout=self.timeout_s) as client:
-            tasks = [
-                self._post(client, url, "/internal/replica/delete", {"key": key, "ts": ts})
-                for url in replicas
-            ]
-            acks = 0
-            results = {}
-            for coro in asyncio.as_completed(tasks):
-                url, ok, data = await coro
-                results[url] = ok
+        needed = needed or {}
+        out: Dict[str, Dict[str, Any]] = {}
+        for url, items in plan.items():
+            for it in items:
+                if it["key"] not in out:
+                    out[it["key"]] = {"acks": 0, "results": {}, "needed": needed.get(it["key"], w)}
+        pending = len(out)
+
+        def record(url: str, ok: bool) -> None:
+            nonlocal pending
+            for it in plan[url]:
+                info = out[it["key"]]
+                info["results"][url] = ok
                 if ok:
-                    acks += 1
-                if acks >= w:
-                    break
-            return {"acks": acks, "results": results, "needed": w}
+                    info["acks"] += 1
+                    if info["acks"] == info["needed"]:
+                        pending -= 1
+
+        if local is not None and local in plan:
+            record(local, True)
+        remote = [url for url in plan if url != local]
+        task_url = {asyncio.ensure_future(self._post(url, path, {"items": plan[url]})): url for url in remote}
+        tasks = list(task_url)
+
+        def failed(url: str) -> None:
+            for it in plan[url]:
+                self._hint_locally(it.get("hint_for") or url, path, it)
+
+        waiting = set(tasks)
+        while waiting and pending > 0:
+            done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                url, ok, data = t.result()
+                record(url, ok)
+                if not ok:
+                    failed(url)
+        await self._finish_later(waiting, lambda t: failed(task_url[t]))
+        return out
 
-    async def quorum_get(self, replicas: List[str], key: str, q: int) -> Dict[str, Any]:
+    # Batched reads. `plan` maps each replica URL to the keys it owns; `local`
+    # is (url, {key: response}) for keys read in-process; `needed` overrides
+    # q per key.
+    async def quorum_get_batch(self, plan: Dict[str, List[str]], q: int, local: Optional[Tuple[str, Dict[str, dict]]] = None, needed: Optional[Dict[str, int]] = None) -> Dict[str, Dict[str, Any]]:
         q = max(1, q)
-        async with httpx.AsyncClient(timeout=self.timeout_s) as client:
-            tasks = [
-                self._get(client, url, "/internal/replica/get", {"key": key})
-                for url in replicas
-            ]
-            oks = 0
-            best: Optional[Record] = None
-            responses = {}
-            for coro in asyncio.as_completed(tasks):
-                url, ok, data = await coro
-                responses[url] = data if ok else None
+        need = {k: needed.get(k, q) for keys in plan.values() for k in keys} if needed else None
+        best: Dict[str, Optional[Record]] = {}
+        views: Dict[str, Dict[str, Record]] = {}
+        for keys in plan.values():
+            for k in keys:
+                best[k] = None
+                views[k] = {}
+        pending_keys = len(best)
+
+        def take(url: str, records: Dict[str, dict]) -> None:
+            nonlocal pending_keys
+            for k, data in records.items():
+                if k not in views:
+                    continue
+                rec = self._record(data)
+                best[k] = self.resolve(best[k], rec)
+                views[k][url] = rec
+                if len(views[k]) == (need[k] if need else q):
+                    pending_keys -= 1
+
+        local_url = None
+        if local is not None and local[0] in plan:
+            local_url = local[0]
+            take(local_url, local[1])
+        pending = {
+            asyncio.ensure_future(self._post(url, "/internal/replica/get_batch", {"keys": keys}))
+            for url, keys in plan.items()
+            if url != local_url
+        }
+        while pending and pending_keys > 0:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                url, ok, data = t.result()
                 if ok and data is not None:
-                    oks += 1
-                    rec = Record(
-                        value=data.get("value"),
-                        ts=float(data.get("ts")),
-                        tombstone=bool(data.get("tombstone")),
-                    )
-                    best = InMemoryStore.newer(best, rec)
-                if oks >= q:
-                    break
-
-            if best is None:
-                return {"ok": False, "reason": "no_quorum", "responses": responses}
-
-            if best.tombstone:
-                return {"ok": True, "found": False, "record": {"value": None, "ts": best.ts, "tombstone": True}, "responses": responses}
-
-            return {"ok": True, "found": True, "record": {"value": best.value, "ts": best.ts, "tombstone": False}, "responses": responses}
+                    take(url, data.get("records") or {})
+
+        out = {}
+        for k in views:
+            kq = need[k] if need else q
+            out[k] = {**self._read_result(best[k] if len(views[k]) >= kq else None), "oks": len(views[k]), "needed": kq}
+        if self.repair is not None:
+            self.repair.track(self._repair_after_read(pending, lambda data: data.get("records") or {}, {k: dict(v) for k, v in views.items()}))
+        return out
@@ -0,0 +1,347 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .membership import Membership
+from .store import BaseStore, IndexedStore, Record
+from .transport import PeerTransport
+from .wire import BinaryClient
+
+log = logging.getLogger("rebalance")
+
+MERGE_PATH = "/internal/replica/merge_batch"
+STATUS_PATH = "/internal/rebalance/status"
+
+# Token ranges whose replica set differs between two rings, as
+# (lo, hi, old_owners, new_owners) with adjacent ranges merged. Rings
+# without token ranges (rendezvous) yield the whole space, checked per key.
+def moved_ranges(old, new, r: int, space: int) -> List[Tuple[int, int, Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]]:
+    if not hasattr(old, "boundaries") or not hasattr(new, "boundaries"):
+        return [(0, space, None, None)]
+    points = sorted(set(old.boundaries()) | set(new.boundaries()) | {0})
+    out: List[Tuple[int, int, Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]] = []
+    for i, lo in enumerate(points):
+        hi = points[i + 1] if i + 1 < len(points) else space
+        a, b = old.owners_at(lo, r), new.owners_at(lo, r)
+        if set(a) == set(b):
+            continue
+        if out and out[-1][1] == lo and out[-1][2] == a and out[-1][3] == b:
+            out[-1] = (out[-1][0], hi, a, b)
+        else:
+            out.append((lo, hi, a, b))
+    return out
+
+async def _inline(fn: Callable[..., Any], *args: Any) -> Any:
+    return fn(*args)
+
+@dataclass
+class Transfer:
+    old_nodes: List[str]
+    new_nodes: List[str]
+    ranges: List[Tuple[int, int]]
+    # (range index, token, key) of the last record streamed
+    cursor: Optional[Tuple[int, int, str]] = None
+    ranges_gained: int = 0
+    ranges_lost: int = 0
+    changed_at: float = field(default_factory=time.time)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    keys_scanned: int = 0
+    keys_sent: int = 0
+    bytes_sent: int = 0
+    retries: int = 0
+    failed_targets: Set[str] = field(default_factory=set)
+    done: bool = False
+
+# Moves data when the ring changes. For every key whose replica set changed,
+# the first still-alive old owner streams the record to the new owners in
+# batches of `batch_size`, at most `rate` keys per second, walking the moved
+# token ranges in (token, key) order. An IndexedStore is scanned directly;
+# any other store is read once when the stream starts into a sorted list
+# of the (token, key) pairs inside the moved ranges, dropped when it ends
+# (keys written later already go to old and new owners, see `moving`). The
+# cursor is saved after every batch (to `state_path` when set), so a failed
+# batch is retried from there and a restarted node resumes where it stopped.
+# Store reads go through `run` (StoreAccess.call: inline for in-memory
+# engines, on the store threads for blocking ones); token hashing and state
+# file writes run on a worker thread, so neither holds up the event loop.
+#
+# Until every ring node reports its streams done (or max_transition_s
+# passes) the previous ring is kept: `moving(key)` then tells coordinators
+# to read from and write to old and new owners together.
+class Rebalancer:
+    def __init__(
+        self,
+        self_url: str,
+        store: BaseStore,
+        transport: PeerTransport,
+        membership: Membership,
+        make_ring: Callable[[List[str]], Any],
+        replication: int,
+        batch_size: int = 500,
+        rate: float = 5000.0,
+        state_path: Optional[str] = None,
+        binary: Optional[BinaryClient] = None,
+        max_retries: int = 5,
+        settle_poll_s: float = 1.0,
+        max_transition_s: float = 300.0,
+        run: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        self.self_url = self_url
+        self.store = store
+        self.index = store if isinstance(store, IndexedStore) else None
+        self.transport = transport
+        self.membership = membership
+        self.make_ring = make_ring
+        self.replication = replication
+        self.batch_size = max(1, batch_size)
+        self.rate = rate
+        self.state_path = state_path
+        self.binary = binary
+        self.max_retries = max_retries
+        self.settle_poll_s = settle_poll_s
+        self.max_transition_s = max_transition_s
+        self.run_store = run or _inline
+        self.previous = None
+        self.ring = None
+        self.transfer: Optional[Transfer] = None
+        self._moved: Optional[List[Tuple[int, str]]] = None
+        self.last: Optional[Dict[str, Any]] = None
+        self.rebalances = 0
+        self._wake = asyncio.Event()
+
+    # The ring just moved from `old_nodes` to `ring`. Transfers are planned
+    # from the last balanced ring, so overlapping changes restart the stream
+    # from the beginning of the combined difference.
+    def ring_changed(self, old_nodes: List[str], ring) -> None:
+        if self.previous is None:
+            self.previous = self.make_ring(old_nodes)
+        self.ring = ring
+        self._plan()
+
+    def _plan(self, cursor: Optional[Tuple[int, int, str]] = None) -> None:
+        moved = moved_ranges(self.previous, self.ring, self.replication, 1 << self.ring.partitioner.bits)
+        t = Transfer(old_nodes=self.previous.nodes, new_nodes=self.ring.nodes, ranges=[(lo, hi) for lo, hi, _, _ in moved], cursor=cursor)
+        for _, _, a, b in moved:
+            if a is not None and self.self_url in b and self.self_url not in a:
+                t.ranges_gained += 1
+            if a is not None and self.self_url in a and self.self_url not in b:
+                t.ranges_lost += 1
+        self.transfer = t
+        log.info("Ring changed %s -> %s: %d ranges moved, %d gained, %d lost here", t.old_nodes, t.new_nodes, len(t.ranges), t.ranges_gained, t.ranges_lost)
+        self._wake.set()
+
+    # Startup: pick up a transfer saved by a previous run of this node.
+    def resume(self, ring) -> None:
+        self.ring = ring
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                st = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.previous = self.make_ring(st["old_nodes"])
+        same = st["new_nodes"] == ring.nodes
+        self._plan(tuple(st["cursor"]) if same and st.get("cursor") else None)
+        log.info("Resuming rebalance from %s", "the saved cursor" if same else "the start (ring differs)")
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        t = self.transfer
+        if t is None or t.done:
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            return
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"old_nodes": t.old_nodes, "new_nodes": t.new_nodes, "cursor": list(t.cursor) if t.cursor else None}, f)
+        os.replace(tmp, self.state_path)
+
+    # (old owners, new owners) while `key` is between replica sets, else None.
+    def moving(self, key: str) -> Optional[Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+        if self.previous is None:
+            return None
+        old = tuple(self.previous.replicas(key, self.replication))
+        new = tuple(self.ring.replicas(key, self.replication))
+        if set(old) == set(new):
+            return None
+        return old, new
+
+    async def _send(self, t: Transfer, url: str, items: List[dict]) -> bool:
+        payload = {"items": items}
+        for attempt in range(self.max_retries):
+            try:
+                if self.binary is not None and self.binary.supports(url, MERGE_PATH):
+                    handled, ok, _ = await self.binary.call(url, MERGE_PATH, payload)
+                    if handled:
+                        if ok:
+                            return True
+                        raise RuntimeError("merge_batch failed")
+                r = await self.transport.post(url, MERGE_PATH, json=payload)
+                if r.status_code == 200:
+                    return True
+            except Exception:
+                pass
+            t.retries += 1
+            await asyncio.sleep(min(5.0, 0.2 * 2 ** attempt))
+        return False
+
+    # Sorted (token, key) of `keys` inside the transfer's ranges.
+    def _in_ranges(self, t: Transfer, keys: List[str]) -> List[Tuple[int, str]]:
+        ranges = sorted(t.ranges)
+        starts = [lo for lo, _ in ranges]
+        out = []
+        for tok, key in zip(self.ring.partitioner.tokens(keys), keys):
+            i = bisect_right(starts, tok) - 1
+            if i >= 0 and tok < ranges[i][1]:
+                out.append((tok, key))
+        out.sort()
+        return out
+
+    # Like IndexedStore.scan, over the snapshot.
+    def _scan(self, lo: int, hi: int, after: Optional[Tuple[int, str]], limit: int) -> List[Tuple[int, str, Record]]:
+        if self.index is not None:
+            return self.index.scan(lo, hi, after=after, limit=limit)
+        moved = self._moved
+        i = bisect_right(moved, after) if after is not None and after >= (lo, "") else bisect_left(moved, (lo, ""))
+        out: List[Tuple[int, str, Record]] = []
+        for t, k in moved[i:]:
+            if t >= hi or len(out) >= limit:
+                break
+            rec = self.store.get(k)
+            if rec is not None:
+                out.append((t, k, rec))
+        return out
+
+    # Stream one batch starting after the cursor; False once all ranges are done.
+    async def _step(self, t: Transfer) -> bool:
+        i, after = (t.cursor[0], (t.cursor[1], t.cursor[2])) if t.cursor else (0, None)
+        while i < len(t.ranges):
+            lo, hi = t.ranges[i]
+            chunk = await self.run_store(self._scan, lo, hi, after, self.batch_size)
+            if chunk:
+                break
+            i, after = i + 1, None
+        else:
+            return False
+        keys = [k for _, k, _ in chunk]
+        olds = self.previous.replicas_many(keys, self.replication)
+        news = self.ring.replicas_many(keys, self.replication)
+        batches: Dict[str, List[dict]] = {}
+        for (_, key, rec), old, new in zip(chunk, olds, news):
+            sender = next((n for n in old if self.membership.is_alive(n)), None)
+            if sender != self.self_url:
+                continue
+            for target in new:
+                if target not in old and target not in t.failed_targets:
+                    batches.setdefault(target, []).append({"key": key, "value": rec.value, "ts": rec.ts, "tombstone": rec.tombstone})
+        urls = list(batches)
+        results = await asyncio.gather(*(self._send(t, u, batches[u]) for u in urls))
+        for url, ok in zip(urls, results):
+            items = batches[url]
+            if ok:
+                t.keys_sent += len(items)
+                t.bytes_sent += sum(len(it["key"]) + len(it["value"] or "") for it in items)
+            else:
+                # Left to hinted handoff / anti-entropy; keep the rest moving.
+                t.failed_targets.add(url)
+                log.warning("Rebalance stream to %s failed, skipping it for this transfer", url)
+        t.keys_scanned += len(chunk)
+        last = chunk[-1]
+        t.cursor = (i, last[0], last[1])
+        await asyncio.to_thread(self._save)
+        sent = sum(len(b) for b in batches.values())
+        if self.rate > 0 and sent:
+            await asyncio.sleep(sent / self.rate)
+        return True
+
+    async def _stream(self, t: Transfer) -> None:
+        t.started_at = time.time()
+        await asyncio.to_thread(self._save)
+        if self.index is None:
+            keys = await self.run_store(lambda: [k for k, _ in self.store.items()])
+            self._moved = await asyncio.to_thread(self._in_ranges, t, keys)
+        try:
+            while self.transfer is t and await self._step(t):
+                pass
+        finally:
+            self._moved = None
+        if self.transfer is t:
+            t.done = True
+            t.finished_at = time.time()
+            await asyncio.to_thread(self._save)
+            log.info("Rebalance stream done: %d keys to %d ranges in %.2fs", t.keys_sent, len(t.ranges), t.finished_at - t.started_at)
+
+    async def _peer_done(self, url: str, nodes: List[str]) -> bool:
+        try:
+            r = await self.transport.get(url, STATUS_PATH)
+            st = r.json()
+        except Exception:
+            return False
+        return st.get("done") and st.get("nodes") == nodes
+
+    # Wait until every live ring node streamed its part for this ring.
+    async def _settle(self, t: Transfer) -> None:
+        while self.transfer is t and time.time() - t.changed_at < self.max_transition_s:
+            peers = [n for n in t.new_nodes if n != self.self_url and self.membership.is_alive(n)]
+            done = await asyncio.gather(*(self._peer_done(p, t.new_nodes) for p in peers))
+            if all(done):
+                break
+            await asyncio.sleep(self.settle_poll_s)
+        if self.transfer is t:
+            self.previous = None
+            self.rebalances += 1
+            self.last = self._summary(t, balanced_s=time.time() - t.changed_at)
+            self.transfer = None
+            log.info("Rebalanced in %.2fs", self.last["time_to_balance_s"])
+
+    async def run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            t = self.transfer
+            if t is None:
+                continue
+            if not t.done:
+                await self._stream(t)
+            if self.transfer is t:
+                await self._settle(t)
+            else:
+                self._wake.set()
+
+    def status(self) -> Dict[str, Any]:
+        t = self.transfer
+        return {"ok": True, "nodes": t.new_nodes if t is not None else (self.ring.nodes if self.ring is not None else None), "done": t is None or t.done}
+
+    @staticmethod
+    def _summary(t: Transfer, balanced_s: Optional[float] = None) -> Dict[str, Any]:
+        stream_s = (t.finished_at or time.time()) - t.started_at if t.started_at else 0.0
+        return {
+            "moved_ranges": len(t.ranges),
+            "ranges_gained": t.ranges_gained,
+            "ranges_lost": t.ranges_lost,
+            "keys_scanned": t.keys_scanned,
+            "keys_sent": t.keys_sent,
+            "bytes_sent": t.bytes_sent,
+            "retries": t.retries,
+            "failed_targets": sorted(t.failed_targets),
+            "stream_s": round(stream_s, 3),
+            "keys_per_s": round(t.keys_sent / stream_s, 1) if stream_s > 0 else 0.0,
+            "done": t.done,
+            "time_to_balance_s": round(balanced_s, 3) if balanced_s is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_transition": self.previous is not None,
+            "rebalances": self.rebalances,
+            "current": self._summary(self.transfer) if self.transfer is not None else None,
+            "last": self.last,
+        }
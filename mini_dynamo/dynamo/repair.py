@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .store import BaseStore, Record
+from .transport import PeerTransport
+
+log = logging.getLogger("repair")
+
+# Read repair. After a quorum read has answered the client, the coordinator
+# keeps collecting the remaining replica responses in the background and
+# queues the newest record for every replica that returned an older one (or
+# nothing). Queued repairs are pushed per replica through merge_batch in
+# batches, at most `rate` records per second; the newest record per key wins
+# and the queue is bounded. `resolve` combines two answers (LWW by default).
+# Repairs of `self_url` go to `apply_local`, awaited with a batch of
+# (key, record) pairs.
+class ReadRepair:
+    def __init__(self, transport: PeerTransport, self_url: Optional[str] = None, apply_local: Optional[Callable[[List[Tuple[str, Record]]], Awaitable[Any]]] = None, batch_size: int = 200, rate: float = 2000.0, max_pending: int = 50_000, collect_timeout_s: float = 2.0, interval_s: float = 0.05, resolve: Callable[[Optional[Record], Optional[Record]], Optional[Record]] = BaseStore.newer):
+        self.transport = transport
+        self.resolve = resolve
+        self.self_url = self_url
+        self.apply_local = apply_local
+        self.batch_size = max(1, batch_size)
+        self.rate = rate
+        self.max_pending = max_pending
+        self.collect_timeout_s = collect_timeout_s
+        self.interval_s = interval_s
+        self._queues: Dict[str, "OrderedDict[str, Record]"] = {}
+        self._size = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self.reads_checked = 0
+        self.stale_replicas = 0
+        self.repaired = 0
+        self.repair_errors = 0
+        self.dropped = 0
+
+    # Run a collection coroutine in the background without holding up the read.
+    def track(self, coro: Awaitable[None]) -> None:
+        t = asyncio.ensure_future(coro)
+        self._tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+
+    # `views` maps each replica that answered to the record it returned
+    # (ts 0.0 for "not found").
+    def reconcile(self, key: str, views: Dict[str, Record]) -> None:
+        self.reads_checked += 1
+        winner: Optional[Record] = None
+        for rec in views.values():
+            winner = self.resolve(winner, rec)
+        if winner is None or winner.ts <= 0.0:
+            return
+        for url, rec in views.items():
+            if rec.ts < winner.ts or rec.value != winner.value:
+                self.stale_replicas += 1
+                self._enqueue(url, key, winner)
+
+    def _enqueue(self, url: str, key: str, rec: Record) -> None:
+        q = self._queues.setdefault(url, OrderedDict())
+        cur = q.get(key)
+        if cur is not None:
+            q[key] = self.resolve(cur, rec)
+            return
+        if self._size >= self.max_pending:
+            self.dropped += 1
+            return
+        q[key] = rec
+        self._size += 1
+
+    def _take(self, url: str) -> Dict[str, Record]:
+        q = self._queues.get(url)
+        batch: Dict[str, Record] = {}
+        while q and len(batch) < self.batch_size:
+            key, rec = q.popitem(last=False)
+            batch[key] = rec
+        if not q:
+            self._queues.pop(url, None)
+        self._size -= len(batch)
+        return batch
+
+    async def _push(self, url: str, batch: Dict[str, Record]) -> None:
+        if url == self.self_url and self.apply_local is not None:
+            await self.apply_local(list(batch.items()))
+            self.repaired += len(batch)
+            return
+        items = [{"key": k, "value": r.value, "ts": r.ts, "tombstone": r.tombstone} for k, r in batch.items()]
+        try:
+            resp = await self.transport.post(url, "/internal/replica/merge_batch", json={"items": items})
+            ok = resp.status_code == 200
+        except Exception:
+            ok = False
+        if ok:
+            self.repaired += len(batch)
+        else:
+            # Best effort: the next read or anti-entropy round catches it.
+            self.repair_errors += 1
+            log.debug("Read repair of %d keys on %s failed", len(batch), url)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            for url in list(self._queues):
+                batch = self._take(url)
+                if not batch:
+                    continue
+                await self._push(url, batch)
+                if self.rate > 0:
+                    await asyncio.sleep(len(batch) / self.rate)
+
+    async def aclose(self) -> None:
+        for t in list(self._tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "reads_checked": self.reads_checked,
+            "stale_replicas": self.stale_replicas,
+            "repaired": self.repaired,
+            "repair_errors": self.repair_errors,
+            "pending": self._size,
+            "dropped": self.dropped,
+            "collecting": len(self._tasks),
+        }
@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from .access import StoreAccess
+from .store import BaseStore, IndexedStore, Record
+
+log = logging.getLogger("shards")
+
+SHARD_CALL_PATH = "/internal/shard/call"
+
+# Which worker of a node owns a ring token. The token space is cut into
+# `count` contiguous ranges on boundaries of the 2**depth Merkle leaves, so
+# every leaf, and with it every per-peer leaf hash, lives in one worker.
+def shard_of(token: int, token_bits: int, count: int, depth: int) -> int:
+    leaf = token >> max(0, token_bits - depth)
+    return (leaf * count) >> depth
+
+# The leaves [lo, hi) owned by worker `shard`.
+def shard_leaves(shard: int, count: int, depth: int) -> Tuple[int, int]:
+    return ((shard << depth) + count - 1) // count, (((shard + 1) << depth) + count - 1) // count
+
+def socket_path(socket_dir: str, shard: int) -> str:
+    return os.path.join(socket_dir, f"shard-{shard}.sock")
+
+def _enc(rec: Optional[Record]) -> Optional[list]:
+    return None if rec is None else [rec.value, rec.ts, rec.tombstone]
+
+def _dec(row: Optional[list]) -> Optional[Record]:
+    return None if row is None else Record(value=row[0], ts=float(row[1]), tombstone=bool(row[2]))
+
+# StoreAccess for one worker of a multi-process node. Every worker holds the
+# keys of its token range in its own store; operations on other keys are
+# forwarded to the owning worker over its Unix socket, batches split by
+# owner with the parts applied concurrently. Calls a sibling does not
+# answer yet (still starting) are retried until `timeout_s`.
+#
+# Any worker method can be exposed to siblings with expose(); exposed
+# methods take and return JSON values.
+class ShardedAccess(StoreAccess):
+    def __init__(self, store: BaseStore, mode: str, shard: int, count: int, socket_dir: str, token_fn: Callable[[str], int], token_bits: int, depth: int = 10, timeout_s: float = 5.0, workers: int = 8, stripes: int = 64, index: Optional[IndexedStore] = None):
+        super().__init__(store, mode, workers=workers, stripes=stripes, index=index)
+        self.shard = shard
+        self.count = count
+        self.socket_dir = socket_dir
+        self.token_fn = token_fn
+        self.token_bits = token_bits
+        self.depth = depth
+        self.timeout_s = timeout_s
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+        self._methods: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self.forwarded = 0
+        self.served = 0
+        self.retries = 0
+        base = StoreAccess
+        self.expose("put_many", lambda items: self._local(base.put_many, [tuple(it) for it in items], True))
+        self.expose("delete_many", lambda items: self._local(base.delete_many, [tuple(it) for it in items], True))
+        self.expose("get_many", lambda keys: self._local(base.get_many, keys, True))
+        self.expose("merge_many", lambda items: self._local(base.merge_many, [(k, _dec(r)) for k, r in items], False))
+        self.expose("scan_keys", self._serve_scan)
+
+    async def _local(self, method, arg, encode: bool) -> Any:
+        out = await method(self, arg)
+        return [_enc(r) for r in out] if encode else out
+
+    async def _serve_scan(self, prefix: str, start: Optional[str], after: Optional[str], limit: int) -> list:
+        return [[k, _enc(r)] for k, r in await StoreAccess.scan_keys(self, prefix, start, after, limit)]
+
+    def shard_of(self, key: str) -> int:
+        return shard_of(self.token_fn(key), self.token_bits, self.count, self.depth)
+
+    def expose(self, name: str, fn: Callable[..., Awaitable[Any]]) -> None:
+        self._methods[name] = fn
+
+    # Entry point of SHARD_CALL_PATH on the receiving worker.
+    async def serve(self, method: str, args: Sequence[Any]) -> Any:
+        fn = self._methods.get(method)
+        if fn is None:
+            raise KeyError(method)
+        self.served += 1
+        return await fn(*args)
+
+    def _client(self, shard: int) -> httpx.AsyncClient:
+        c = self._clients.get(shard)
+        if c is None:
+            transport = httpx.AsyncHTTPTransport(uds=socket_path(self.socket_dir, shard))
+            c = self._clients[shard] = httpx.AsyncClient(transport=transport, base_url=f"http://shard-{shard}", timeout=self.timeout_s)
+        return c
+
+    # Run an exposed method on worker `shard` (this one included).
+    async def remote(self, shard: int, method: str, *args: Any) -> Any:
+        if shard == self.shard:
+            return await self.serve(method, args)
+        self.forwarded += 1
+        deadline = time.monotonic() + self.timeout_s
+        delay = 0.05
+        while True:
+            try:
+                r = await self._client(shard).post(SHARD_CALL_PATH, json={"method": method, "args": list(args)})
+                r.raise_for_status()
+                return r.json()["result"]
+            except httpx.TransportError:
+                if time.monotonic() + delay > deadline:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+    # `method` on every worker, results in worker order.
+    async def each(self, method: str, *args: Any) -> List[Any]:
+        return list(await asyncio.gather(*(self.remote(i, method, *args) for i in range(self.count))))
+
+    # Apply `method` to `items` on their owners; results come back in input
+    # order (None for methods returning a count, which is summed instead).
+    async def _split(self, method: str, items: list, key_of: Callable[[Any], str], wire: Callable[[Any], Any], local: Callable[[list], Awaitable[Any]]) -> Any:
+        parts: Dict[int, List[int]] = {}
+        for pos, it in enumerate(items):
+            parts.setdefault(self.shard_of(key_of(it)), []).append(pos)
+
+        async def run(shard: int, positions: List[int]) -> Any:
+            part = [items[p] for p in positions]
+            if shard == self.shard:
+                return await local(part)
+            return await self.remote(shard, method, [wire(it) for it in part])
+
+        results = await asyncio.gather(*(run(s, ps) for s, ps in parts.items()))
+        if method == "merge_many":
+            return sum(results)
+        out: List[Any] = [None] * len(items)
+        for (shard, positions), res in zip(parts.items(), results):
+            for p, r in zip(positions, res):
+                out[p] = r if shard == self.shard else _dec(r)
+        return out
+
+    async def put_many(self, items: List[Tuple[str, str, float]]) -> List[Record]:
+        return await self._split("put_many", items, lambda it: it[0], list, super().put_many)
+
+    async def delete_many(self, items: List[Tuple[str, float]]) -> List[Record]:
+        return await self._split("delete_many", items, lambda it: it[0], list, super().delete_many)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Record]]:
+        return await self._split("get_many", keys, lambda k: k, lambda k: k, super().get_many)
+
+    async def merge_many(self, items: List[Tuple[str, Record]]) -> int:
+        return await self._split("merge_many", items, lambda it: it[0], lambda it: [it[0], _enc(it[1])], super().merge_many)
+
+    async def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        if self.shard_of(key) == self.shard:
+            return await super().put(key, value, ts)
+        return (await self.put_many([(key, value, ts)]))[0]
+
+    async def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        if self.shard_of(key) == self.shard:
+            return await super().delete(key, ts)
+        return (await self.delete_many([(key, ts)]))[0]
+
+    async def get(self, key: str) -> Optional[Record]:
+        if self.shard_of(key) == self.shard:
+            return await super().get(key)
+        return (await self.get_many([key]))[0]
+
+    async def merge(self, key: str, rec: Record) -> bool:
+        if self.shard_of(key) == self.shard:
+            return await super().merge(key, rec)
+        return await self.merge_many([(key, rec)]) > 0
+
+    # Workers hold disjoint keys: the first `limit` of the merged pages.
+    async def scan_keys(self, prefix: str = "", start: Optional[str] = None, after: Optional[str] = None, limit: int = 500) -> List[Tuple[str, Record]]:
+        pages = await self.each("scan_keys", prefix, start, after, limit)
+        rows = heapq.merge(*([(k, _dec(r)) for k, r in page] for page in pages), key=lambda row: row[0])
+        return [row for _, row in zip(range(limit), rows)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "shard": self.shard, "shards": self.count, "forwarded": self.forwarded, "served": self.served, "retries": self.retries}
+
+    async def aclose(self) -> None:
+        for c in self._clients.values():
+            await c.aclose()
+        self._clients.clear()
@@ -1,14 +1,67 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import threading
 import time
 
-@dataclass
+# slots=True drops the per-instance __dict__, which dominated per-key memory.
+@dataclass(slots=True)
 class Record:
     value: Optional[str]
     ts: float
     tombstone: bool = False
 
-class InMemoryStore:
+# Shared behaviour of the storage engines; subclasses provide put/delete/get.
+class BaseStore:
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        raise NotImplementedError
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[Record]:
+        raise NotImplementedError
+
+    # Iterate over (key, record) pairs, tombstones included, in no particular order.
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        raise NotImplementedError
+
+    # Apply a replicated record only if it is newer than the local one (LWW).
+    # Used by repair paths that may deliver records out of order.
+    def merge(self, key: str, rec: Record) -> bool:
+        cur = self.get(key)
+        if cur is not None and BaseStore.lww_key(cur) >= BaseStore.lww_key(rec):
+            return False
+        if rec.tombstone:
+            self.delete(key, ts=rec.ts)
+        else:
+            self.put(key, rec.value, ts=rec.ts)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+    # LWW order: the later ts wins. Equal ts are broken by the record itself
+    # (a tombstone over a value, then the greater value) so that replicas
+    # holding different writes with the same ts all settle on the same one.
+    @staticmethod
+    def lww_key(rec: Record) -> Tuple[float, bool, str]:
+        return rec.ts, rec.tombstone, rec.value or ""
+
+    @staticmethod
+    def newer(a: Optional[Record], b: Optional[Record]) -> Optional[Record]:
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return a if BaseStore.lww_key(a) >= BaseStore.lww_key(b) else b
+
+class InMemoryStore(BaseStore):
     def __init__(self):
         self._data: Dict[str, Record] = {}
 
@@ -27,10 +80,320 @@ class InMemoryStore:
     def get(self, key: str) -> Optional[Record]:
         return self._data.get(key)
 
-    @staticmethod
-    def newer(a: Optional[Record], b: Optional[Record]) -> Optional[Record]:
-        if a is None:
-            return b
-        if b is None:
-            return a
-        return a if a.ts >= b.ts else b
\ No newline at end of file
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        return iter(list(self._data.items()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"engine": "memory", "keys": len(self._data)}
+
+# Columnar in-memory store for very large key counts. Instead of one
+# Record object per key it keeps a key -> slot dict plus parallel arrays:
+# timestamps in array('d'), value offsets/lengths into a shared bytearray
+# arena, and a tombstone flag byte. get() builds a Record view on demand.
+class CompactStore(BaseStore):
+    def __init__(self, compact_ratio: float = 0.5, min_compact_bytes: int = 1 << 20):
+        self._slot: Dict[str, int] = {}
+        self._ts = array("d")
+        self._off = array("Q")
+        self._len = array("I")
+        self._tomb = bytearray()
+        self._arena = bytearray()
+        self._garbage = 0
+        self.compact_ratio = compact_ratio
+        self.min_compact_bytes = min_compact_bytes
+
+    def _set(self, key: str, value: Optional[bytes], ts: float) -> None:
+        slot = self._slot.get(key)
+        if slot is None:
+            slot = len(self._ts)
+            self._slot[key] = slot
+            self._ts.append(ts)
+            self._off.append(0)
+            self._len.append(0)
+            self._tomb.append(0)
+        old_len = self._len[slot]
+        n = len(value) if value is not None else 0
+        if n <= old_len:
+            # Reuse the old value's bytes in place.
+            off = self._off[slot]
+            self._arena[off:off + n] = value or b""
+            self._garbage += old_len - n
+        else:
+            self._garbage += old_len
+            self._off[slot] = len(self._arena)
+            self._arena += value
+        self._len[slot] = n
+        self._ts[slot] = ts
+        self._tomb[slot] = value is None
+        if self._garbage > self.min_compact_bytes and self._garbage > len(self._arena) * self.compact_ratio:
+            self._compact_arena()
+
+    def _compact_arena(self) -> None:
+        arena = bytearray()
+        mv = memoryview(self._arena)
+        for slot in range(len(self._off)):
+            off, n = self._off[slot], self._len[slot]
+            self._off[slot] = len(arena)
+            arena += mv[off:off + n]
+        mv.release()
+        self._arena = arena
+        self._garbage = 0
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        ts = ts if ts is not None else time.time()
+        self._set(key, value.encode("utf-8"), ts)
+        return Record(value=value, ts=ts, tombstone=False)
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        ts = ts if ts is not None else time.time()
+        self._set(key, None, ts)
+        return Record(value=None, ts=ts, tombstone=True)
+
+    def get(self, key: str) -> Optional[Record]:
+        slot = self._slot.get(key)
+        if slot is None:
+            return None
+        if self._tomb[slot]:
+            return Record(value=None, ts=self._ts[slot], tombstone=True)
+        off = self._off[slot]
+        value = self._arena[off:off + self._len[slot]].decode("utf-8")
+        return Record(value=value, ts=self._ts[slot], tombstone=False)
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        for key in list(self._slot):
+            yield key, self.get(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"engine": "compact", "keys": len(self._slot), "arena_bytes": len(self._arena), "garbage_bytes": self._garbage}
+
+# Ordered set in the style of a B+tree leaf level: sorted blocks of at most
+# 2 * load items plus a list of block maxima, so insert and seek are two
+# bisects and a short list insert. Iteration re-seeks after every block, so
+# inserts made while a scan is suspended do not break it.
+class SortedIndex:
+    def __init__(self, load: int = 512):
+        self._load = load
+        self._lists: List[list] = []
+        self._maxes: list = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, v: Any) -> None:
+        maxes = self._maxes
+        if not maxes:
+            self._lists.append([v])
+            maxes.append(v)
+        else:
+            i = bisect_left(maxes, v)
+            if i == len(maxes):
+                i -= 1
+                self._lists[i].append(v)
+                maxes[i] = v
+            else:
+                insort(self._lists[i], v)
+            block = self._lists[i]
+            if len(block) > 2 * self._load:
+                self._lists.insert(i + 1, block[self._load:])
+                del block[self._load:]
+                maxes.insert(i, block[-1])
+        self._len += 1
+
+    # Items >= start (> start when exclusive), in order.
+    def irange(self, start: Any = None, exclusive: bool = False) -> Iterator[Any]:
+        while True:
+            maxes = self._maxes
+            if start is None:
+                i, j = 0, 0
+                if not maxes:
+                    return
+            else:
+                i = (bisect_right if exclusive else bisect_left)(maxes, start)
+                if i == len(maxes):
+                    return
+                j = (bisect_right if exclusive else bisect_left)(self._lists[i], start)
+            block = self._lists[i][j:]
+            if not block:
+                return
+            yield from block
+            start, exclusive = block[-1], True
+
+# Secondary indexes over any engine: keys in key order (prefix and range
+# scans) and in ring-token order (the token ranges rebalancing streams).
+# Keys are only ever added (deletes are tombstones), so a write touches the
+# indexes (and their lock, for stores shared by threads) only the first
+# time a key is seen.
+class IndexedStore(BaseStore):
+    def __init__(self, inner: BaseStore, token_fn: Callable[[str], int], token_bits: int):
+        self.inner = inner
+        self.token_fn = token_fn
+        self.space = 1 << token_bits
+        self._lock = threading.Lock()
+        self._known: set = set()
+        self._by_key = SortedIndex()
+        self._by_token = SortedIndex()
+        for key, _ in inner.items():
+            self._index(key)
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def _index(self, key: str) -> None:
+        if key in self._known:
+            return
+        with self._lock:
+            if key in self._known:
+                return
+            self._by_key.add(key)
+            self._by_token.add((self.token_fn(key), key))
+            self._known.add(key)
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        rec = self.inner.put(key, value, ts=ts)
+        self._index(key)
+        return rec
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        rec = self.inner.delete(key, ts=ts)
+        self._index(key)
+        return rec
+
+    def merge(self, key: str, rec: Record) -> bool:
+        if not self.inner.merge(key, rec):
+            return False
+        self._index(key)
+        return True
+
+    def get(self, key: str) -> Optional[Record]:
+        return self.inner.get(key)
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        return self.inner.items()
+
+    # Up to `limit` (key, record) pairs in key order, tombstones included,
+    # starting at `start` (or strictly after `after`) and within `prefix`.
+    def scan_keys(self, prefix: str = "", start: Optional[str] = None, after: Optional[str] = None, limit: int = 500) -> List[Tuple[str, Record]]:
+        keys: List[str] = []
+        with self._lock:
+            if after is not None:
+                it = self._by_key.irange(max(after, prefix), exclusive=after >= prefix)
+            else:
+                it = self._by_key.irange(max(start or "", prefix))
+            for key in it:
+                if not key.startswith(prefix) or len(keys) >= limit:
+                    break
+                keys.append(key)
+        out: List[Tuple[str, Record]] = []
+        for key in keys:
+            rec = self.inner.get(key)
+            if rec is not None:
+                out.append((key, rec))
+        return out
+
+    # Up to `limit` (token, key, record) in (token, key) order for tokens in
+    # [lo, hi), resuming strictly after `after` = (token, key) when given.
+    def scan(self, lo: int, hi: int, after: Optional[Tuple[int, str]] = None, limit: int = 500) -> List[Tuple[int, str, Record]]:
+        entries: List[Tuple[int, str]] = []
+        with self._lock:
+            if after is not None and after >= (lo, ""):
+                it = self._by_token.irange(after, exclusive=True)
+            else:
+                it = self._by_token.irange((lo, ""))
+            for t, k in it:
+                if t >= hi or len(entries) >= limit:
+                    break
+                entries.append((t, k))
+        out: List[Tuple[int, str, Record]] = []
+        for t, k in entries:
+            rec = self.inner.get(k)
+            if rec is not None:
+                out.append((t, k, rec))
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def close(self) -> None:
+        self.inner.close()
+
+# Thread-safe front for a store shared by worker threads. Writes to one key
+# serialize on one of `stripes` locks, so read-modify-write paths below
+# (LWW merge, causal sibling merge) are atomic per key while writes to keys
+# on other stripes run in parallel. Reads take no lock.
+class StripedStore(BaseStore):
+    def __init__(self, inner: BaseStore, stripes: int = 64):
+        self.inner = inner
+        self._locks = [threading.Lock() for _ in range(max(1, stripes))]
+
+    def _stripe(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        with self._stripe(key):
+            return self.inner.put(key, value, ts=ts)
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        with self._stripe(key):
+            return self.inner.delete(key, ts=ts)
+
+    def merge(self, key: str, rec: Record) -> bool:
+        with self._stripe(key):
+            return self.inner.merge(key, rec)
+
+    def get(self, key: str) -> Optional[Record]:
+        return self.inner.get(key)
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        return self.inner.items()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def close(self) -> None:
+        self.inner.close()
+
+# Write groups: an engine that acknowledges a write only once it is durable
+# (lsm group commit) waits once per group instead of once per write for the
+# writes a thread makes inside `with write_group():`. Engines call
+# defer_durability(self, wait) on each write; it returns False outside a
+# group, where the write must wait itself. The last wait registered per
+# engine covers the earlier ones and runs when the group ends.
+_group = threading.local()
+
+@contextmanager
+def write_group() -> Iterator[None]:
+    if getattr(_group, "waits", None) is not None:
+        yield
+        return
+    _group.waits = {}
+    try:
+        yield
+    finally:
+        waits, _group.waits = _group.waits, None
+        for wait in waits.values():
+            wait()
+
+def defer_durability(engine: object, wait: Callable[[], None]) -> bool:
+    waits = getattr(_group, "waits", None)
+    if waits is None:
+        return False
+    waits[id(engine)] = wait
+    return True
+
+STORE_ENGINES = ["memory", "compact", "lsm"]
+# Engines whose operations block on disk; request handlers reach them
+# through worker threads instead of running them on the event loop.
+BLOCKING_ENGINES = {"lsm"}
+
+def open_store(engine: str = "memory", data_dir: Optional[str] = None, **opts: Any):
+    if engine == "memory":
+        return InMemoryStore()
+    if engine == "compact":
+        return CompactStore(**opts)
+    if engine == "lsm":
+        if not data_dir:
+            raise ValueError("engine 'lsm' requires a data directory")
+        from .lsm import LSMStore
+        return LSMStore(data_dir, **opts)
+    raise ValueError(f"Unknown storage engine {engine!r}, expected one of {STORE_ENGINES}")
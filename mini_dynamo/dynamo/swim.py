@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("swim")
+
+ALIVE = "alive"
+SUSPECT = "suspect"
+DEAD = "dead"
+
+# send(url, message, timeout_s) -> reply message, or None on timeout/error
+SendFn = Callable[[str, Dict[str, Any], float], Awaitable[Optional[Dict[str, Any]]]]
+
+@dataclass
+class Member:
+    url: str
+    status: str = ALIVE
+    incarnation: int = 0
+    changed_at: float = 0.0
+
+# SWIM failure detection and dissemination. Every protocol period each node
+# probes one member, taken round-robin from a shuffled list: a direct ping,
+# then, without an ack, ping-req through `indirect_k` other members. A
+# member nobody reaches is suspected; it is declared dead unless it refutes
+# the suspicion (by bumping its incarnation) within the suspicion timeout.
+# Membership changes ride on every message (at most `piggyback_max` per
+# message, each retransmitted about retransmit_mult * log10(N) times), so the
+# per-node message load stays constant as the cluster grows.
+#
+# Probes run as their own tasks, so a hung peer never delays the next
+# period. The transport is a plain async send function.
+class Swim:
+    def __init__(
+        self,
+        self_url: str,
+        peers: List[str],
+        send: SendFn,
+        period_s: float = 1.0,
+        ping_timeout_s: float = 0.3,
+        indirect_k: int = 3,
+        suspect_mult: float = 4.0,
+        retransmit_mult: int = 3,
+        piggyback_max: int = 8,
+        rng: Optional[random.Random] = None,
+        clock: Callable[[], float] = time.monotonic,
+        on_change: Optional[Callable[[Member], None]] = None,
+    ):
+        self.self_url = self_url
+        self.send = send
+        self.period_s = period_s
+        self.ping_timeout_s = ping_timeout_s
+        self.indirect_k = indirect_k
+        self.suspect_mult = suspect_mult
+        self.retransmit_mult = retransmit_mult
+        self.piggyback_max = piggyback_max
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.on_change = on_change
+        self.incarnation = 0
+        now = clock()
+        self.members: Dict[str, Member] = {p: Member(p, changed_at=now) for p in peers if p != self_url}
+        # url -> (status, incarnation, transmissions so far)
+        self._updates: Dict[str, Tuple[str, int, int]] = {}
+        self._order: List[str] = []
+        self._probes: set = set()
+        self.messages_sent = 0
+        self.probes = 0
+        self.indirect_probes = 0
+        self.suspicions = 0
+        self.refutations = 0
+
+    # Members other than self that are not dead.
+    def live(self) -> List[str]:
+        return [m.url for m in self.members.values() if m.status != DEAD]
+
+    def status(self, url: str) -> str:
+        if url == self.self_url:
+            return ALIVE
+        m = self.members.get(url)
+        return m.status if m is not None else DEAD
+
+    def _retransmits(self) -> int:
+        return self.retransmit_mult * max(1, math.ceil(math.log10(len(self.members) + 2)))
+
+    def suspect_timeout_s(self) -> float:
+        return self.suspect_mult * max(1.0, math.log10(len(self.members) + 1)) * self.period_s
+
+    def _queue(self, url: str, status: str, incarnation: int) -> None:
+        self._updates[url] = (status, incarnation, 0)
+
+    def _set(self, m: Member, status: str, incarnation: int) -> None:
+        changed = m.status != status
+        m.status = status
+        m.incarnation = incarnation
+        if changed:
+            m.changed_at = self.clock()
+            log.info("Member %s is %s (incarnation %d)", m.url, status, incarnation)
+        self._queue(m.url, status, incarnation)
+        if changed and self.on_change is not None:
+            self.on_change(m)
+
+    # Apply one membership update with SWIM's precedence rules.
+    def apply(self, url: str, status: str, incarnation: int) -> None:
+        if url == self.self_url:
+            if status != ALIVE and incarnation >= self.incarnation:
+                # Refute: we are alive, with a newer incarnation.
+                self.incarnation = incarnation + 1
+                self.refutations += 1
+                self._queue(self.self_url, ALIVE, self.incarnation)
+            return
+        m = self.members.get(url)
+        if m is None:
+            if status != DEAD:
+                m = self.members[url] = Member(url, status=DEAD, incarnation=-1)
+                self._set(m, status, incarnation)
+            return
+        if status == ALIVE:
+            if incarnation > m.incarnation:
+                self._set(m, ALIVE, incarnation)
+        elif status == SUSPECT:
+            if m.status == DEAD:
+                return
+            if incarnation > m.incarnation or (incarnation == m.incarnation and m.status == ALIVE):
+                self._set(m, SUSPECT, incarnation)
+        elif status == DEAD and m.status != DEAD and incarnation >= m.incarnation:
+            self._set(m, DEAD, incarnation)
+
+    def _gossip(self) -> List[List[Any]]:
+        if not self._updates:
+            return []
+        limit = self._retransmits()
+        picked = sorted(self._updates.items(), key=lambda e: e[1][2])[:self.piggyback_max]
+        out = []
+        for url, (status, inc, sent) in picked:
+            out.append([url, status, inc])
+            if sent + 1 >= limit:
+                del self._updates[url]
+            else:
+                self._updates[url] = (status, inc, sent + 1)
+        return out
+
+    def _message(self, kind: str, **extra: Any) -> Dict[str, Any]:
+        return {"type": kind, "from": self.self_url, "inc": self.incarnation, "updates": self._gossip(), **extra}
+
+    def _absorb(self, msg: Optional[Dict[str, Any]]) -> None:
+        if not msg:
+            return
+        for url, status, inc in msg.get("updates") or ():
+            self.apply(url, status, int(inc))
+        sender = msg.get("from")
+        if sender and sender != self.self_url:
+            inc = int(msg.get("inc", 0))
+            m = self.members.get(sender)
+            if m is None or inc > m.incarnation:
+                self.apply(sender, ALIVE, inc)
+            elif m.status != ALIVE:
+                # Re-gossip our view so the sender sees it and refutes.
+                self._queue(sender, m.status, m.incarnation)
+
+    async def _send(self, url: str, msg: Dict[str, Any], timeout_s: float) -> Optional[Dict[str, Any]]:
+        self.messages_sent += 1
+        try:
+            reply = await asyncio.wait_for(self.send(url, msg, timeout_s), timeout_s)
+        except Exception:
+            reply = None
+        self._absorb(reply)
+        return reply
+
+    # Handle an incoming message and return the reply.
+    async def handle(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        self._absorb(msg)
+        if msg.get("type") == "ping-req":
+            reply = await self._send(msg["target"], self._message("ping"), self.ping_timeout_s)
+            ok = reply is not None and reply.get("type") == "ack"
+            return self._message("ack" if ok else "nack")
+        return self._message("ack")
+
+    def _next_target(self) -> Optional[str]:
+        while True:
+            if not self._order:
+                self._order = self.live()
+                if not self._order:
+                    return None
+                self.rng.shuffle(self._order)
+            url = self._order.pop()
+            if self.status(url) != DEAD:
+                return url
+
+    async def probe(self, target: str) -> bool:
+        self.probes += 1
+        reply = await self._send(target, self._message("ping"), self.ping_timeout_s)
+        if reply is not None and reply.get("type") == "ack":
+            return True
+        helpers = [u for u in self.live() if u != target]
+        helpers = self.rng.sample(helpers, min(self.indirect_k, len(helpers)))
+        if helpers:
+            self.indirect_probes += 1
+            timeout = max(self.ping_timeout_s, self.period_s - self.ping_timeout_s)
+            replies = await asyncio.gather(*(self._send(h, self._message("ping-req", target=target), timeout) for h in helpers))
+            if any(r is not None and r.get("type") == "ack" for r in replies):
+                return True
+        m = self.members.get(target)
+        if m is not None and m.status == ALIVE:
+            self.suspicions += 1
+            self._set(m, SUSPECT, m.incarnation)
+        return False
+
+    # Suspects that were not refuted in time are declared dead.
+    def expire_suspects(self) -> None:
+        now = self.clock()
+        limit = self.suspect_timeout_s()
+        for m in list(self.members.values()):
+            if m.status == SUSPECT and now - m.changed_at > limit:
+                self._set(m, DEAD, m.incarnation)
+
+    def tick(self) -> None:
+        self.expire_suspects()
+        target = self._next_target()
+        if target is not None:
+            t = asyncio.ensure_future(self.probe(target))
+            self._probes.add(t)
+            t.add_done_callback(self._probes.discard)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                self.tick()
+                await asyncio.sleep(self.period_s)
+        finally:
+            for t in list(self._probes):
+                t.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {ALIVE: 0, SUSPECT: 0, DEAD: 0}
+        for m in self.members.values():
+            counts[m.status] += 1
+        return {
+            "incarnation": self.incarnation,
+            "members": counts,
+            "messages_sent": self.messages_sent,
+            "probes": self.probes,
+            "indirect_probes": self.indirect_probes,
+            "suspicions": self.suspicions,
+            "refutations": self.refutations,
+            "pending_updates": len(self._updates),
+        }
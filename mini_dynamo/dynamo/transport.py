@@ -0,0 +1,99 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+
+log = logging.getLogger("transport")
+
+try:
+    import h2  # noqa: F401
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+@dataclass
+class PeerStats:
+    requests: int = 0
+    errors: int = 0
+
+# Node-wide pool of long-lived HTTP clients, one per peer base URL.
+# Connections are kept alive between requests so replica fan-out and
+# heartbeats reuse sockets instead of paying a TCP handshake each time.
+class PeerTransport:
+    def __init__(
+        self,
+        timeout_s: float,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry_s: float = 30.0,
+        http2: bool = False,
+    ):
+        self.timeout_s = timeout_s
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_s,
+        )
+        if http2 and not _HAS_H2:
+            log.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        self.http2 = http2 and _HAS_H2
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, PeerStats] = {}
+        self._closed = False
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        c = self._clients.get(base_url)
+        if c is None:
+            if self._closed:
+                raise RuntimeError("Transport is closed")
+            c = httpx.AsyncClient(
+                base_url=base_url,
+                timeout=self.timeout_s,
+                limits=self.limits,
+                http2=self.http2,
+            )
+            self._clients[base_url] = c
+            self._stats[base_url] = PeerStats()
+        return c
+
+    async def request(self, method: str, base_url: str, path: str, **kwargs: Any) -> httpx.Response:
+        c = self.client(base_url)
+        st = self._stats[base_url]
+        st.requests += 1
+        try:
+            return await c.request(method, path, **kwargs)
+        except Exception:
+            st.errors += 1
+            raise
+
+    async def post(self, base_url: str, path: str, json: Optional[dict] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", base_url, path, json=json, **kwargs)
+
+    async def get(self, base_url: str, path: str, params: Optional[dict] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", base_url, path, params=params, **kwargs)
+
+    def stats(self) -> Dict[str, dict]:
+        out = {}
+        for url, c in self._clients.items():
+            st = self._stats[url]
+            pool = getattr(getattr(c, "_transport", None), "_pool", None)
+            conns = list(getattr(pool, "connections", []) or [])
+            out[url] = {
+                "requests": st.requests,
+                "errors": st.errors,
+                "connections": len(conns),
+                "idle": sum(1 for x in conns if x.is_idle()),
+                "http2": self.http2,
+            }
+        return out
+
+    async def aclose(self) -> None:
+        self._closed = True
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for c in clients:
+            try:
+                await c.aclose()
+            except Exception:
+                log.debug("Error closing client", exc_info=True)
@@ -0,0 +1,228 @@
+import base64
+import binascii
+import hashlib
+import struct
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .store import BaseStore, Record
+
+# Causal versioning with dotted version vectors.
+#
+# A key's state is a set of siblings, each tagged with the dot (node,
+# counter) of the write that created it, plus a version vector covering
+# every dot the replica has seen for the key. A write carries the client's
+# causal context (the vector it read): the new sibling replaces every
+# sibling the context covers and is kept next to the ones it does not
+# (concurrent writes). Deletes are siblings without a value. Merging two
+# states keeps a sibling unless the other side has seen its dot and
+# dropped it.
+#
+# Node ids are small-ish integers derived from the node URL (and worker
+# index, on multi-worker nodes) so no coordination is needed. Counters are
+# per id and start from the clock in microseconds, so they stay unique
+# across restarts without being persisted (up to a million writes per
+# second per worker).
+
+VersionVector = Dict[int, int]
+
+# Microseconds are counted from 2024-01-01 to keep counters short.
+_EPOCH_US = 1_704_067_200 * 1_000_000
+
+# Workers of one node mint dots independently, so each needs its own id:
+# with a shared one, a worker's lower counter would look already seen to a
+# replica holding a sibling's higher one and its write would be dropped.
+def node_id_for(url: str, worker: int = 0) -> int:
+    name = url if worker == 0 else f"{url}#{worker}"
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=4).digest(), "big")
+
+class DotClock:
+    def __init__(self, node: int):
+        self.node = node
+        self._last = 0
+
+    def next(self) -> int:
+        self._last = max(self._last + 1, int(time.time() * 1_000_000) - _EPOCH_US)
+        return self._last
+
+@dataclass(slots=True)
+class Sibling:
+    node: int
+    counter: int
+    value: Optional[str]
+
+@dataclass(slots=True)
+class CausalState:
+    vv: VersionVector
+    siblings: List[Sibling]
+
+    def values(self) -> List[str]:
+        return [s.value for s in self.siblings if s.value is not None]
+
+def join(a: VersionVector, b: VersionVector) -> VersionVector:
+    if not b:
+        return a
+    out = dict(a)
+    for n, c in b.items():
+        if c > out.get(n, 0):
+            out[n] = c
+    return out
+
+# Version vectors keep the entries of the state's own siblings plus the
+# largest other counters, up to `max_entries`. Dropping an entry can only
+# make a replica keep extra siblings, never lose a write.
+def prune(state: CausalState, max_entries: int) -> CausalState:
+    if len(state.vv) <= max_entries:
+        return state
+    keep = {s.node for s in state.siblings}
+    rest = sorted((e for e in state.vv.items() if e[0] not in keep), key=lambda e: e[1], reverse=True)
+    vv = {n: state.vv[n] for n in keep}
+    vv.update(rest[:max(0, max_entries - len(vv))])
+    return CausalState(vv=vv, siblings=state.siblings)
+
+def merge(a: CausalState, b: CausalState) -> CausalState:
+    a_dots = {(s.node, s.counter) for s in a.siblings}
+    b_dots = {(s.node, s.counter) for s in b.siblings}
+    keep = [s for s in a.siblings if (s.node, s.counter) in b_dots or s.counter > b.vv.get(s.node, 0)]
+    keep += [s for s in b.siblings if (s.node, s.counter) not in a_dots and s.counter > a.vv.get(s.node, 0)]
+    # Canonical order, so equal states pack to equal strings on every replica.
+    keep.sort(key=lambda s: (s.node, s.counter))
+    return CausalState(vv=join(a.vv, b.vv), siblings=keep)
+
+# The delta a coordinator replicates for one write: merging it into a
+# replica's state applies the write there.
+def new_write(context: VersionVector, node: int, counter: int, value: Optional[str]) -> CausalState:
+    return CausalState(vv=join(context, {node: counter}), siblings=[Sibling(node, counter, value)])
+
+# Binary layout (little-endian): entry count, node ids (u32), counters (u64);
+# packed states append sibling count, then per sibling the index of its
+# node in the vector (u16), its counter and its value length + 1 (0 = delete).
+# Struct objects are cached per shape so encoding is a single C call.
+_shapes: Dict[Tuple[int, int], struct.Struct] = {}
+_HEAD = struct.Struct("<HH")
+
+def _shape(nv: int, ns: int) -> struct.Struct:
+    st = _shapes.get((nv, ns))
+    if st is None:
+        st = _shapes[(nv, ns)] = struct.Struct(f"<HH{nv}I{nv}Q{ns}H{ns}Q{ns}I")
+    return st
+
+def _encode(vv: VersionVector, siblings: List[Sibling]) -> bytes:
+    nodes = sorted(vv)
+    index = {n: i for i, n in enumerate(nodes)}
+    return _shape(len(nodes), len(siblings)).pack(
+        len(nodes),
+        len(siblings),
+        *nodes,
+        *(vv[n] for n in nodes),
+        *(index[x.node] for x in siblings),
+        *(x.counter for x in siblings),
+        *(0 if x.value is None else len(x.value) + 1 for x in siblings),
+    )
+
+def _decode(buf: bytes) -> Tuple[VersionVector, List[int], List[int], List[int], List[int]]:
+    nv, ns = _HEAD.unpack_from(buf)
+    f = _shape(nv, ns).unpack(buf)
+    nodes = f[2:2 + nv]
+    vv = dict(zip(nodes, f[2 + nv:2 + 2 * nv]))
+    o = 2 + 2 * nv
+    return vv, nodes, f[o:o + ns], f[o + ns:o + 2 * ns], f[o + 2 * ns:o + 3 * ns]
+
+def encode_context(vv: VersionVector) -> str:
+    return base64.urlsafe_b64encode(_encode(vv, [])).rstrip(b"=").decode("ascii")
+
+def decode_context(ctx: Optional[str]) -> VersionVector:
+    if not ctx:
+        return {}
+    try:
+        return _decode(base64.urlsafe_b64decode(ctx + "=" * (-len(ctx) % 4)))[0]
+    except struct.error as e:
+        raise ValueError(f"malformed causal context: {e}") from None
+
+# A state is stored as a plain string value so every storage engine can hold
+# it: "~" + base64(vector and sibling dots) + ":" + the sibling values.
+def pack(state: CausalState) -> str:
+    head = binascii.b2a_base64(_encode(state.vv, state.siblings), newline=False).decode("ascii")
+    return "~" + head + ":" + "".join(x.value for x in state.siblings if x.value is not None)
+
+def unpack(packed: Optional[str]) -> CausalState:
+    if not packed:
+        return CausalState(vv={}, siblings=[])
+    sep = packed.index(":")
+    vv, nodes, idx, counters, lens = _decode(binascii.a2b_base64(packed[1:sep]))
+    siblings = []
+    pos = sep + 1
+    for ni, c, n in zip(idx, counters, lens):
+        value = None
+        if n:
+            value = packed[pos:pos + n - 1]
+            pos += n - 1
+        siblings.append(Sibling(nodes[ni], c, value))
+    return CausalState(vv=vv, siblings=siblings)
+
+def _state_of(rec: Optional[Record]) -> CausalState:
+    if rec is None or rec.value is None:
+        return CausalState(vv={}, siblings=[])
+    return unpack(rec.value)
+
+# Quorum/read-repair resolver for causal mode: the merge of both states,
+# stamped with the later timestamp.
+def resolve_records(a: Optional[Record], b: Optional[Record]) -> Optional[Record]:
+    if a is None or (a.value is None and b is not None):
+        return b
+    if b is None or b.value is None:
+        return a
+    if a.value == b.value:
+        return a if a.ts >= b.ts else b
+    return Record(value=pack(merge(_state_of(a), _state_of(b))), ts=max(a.ts, b.ts), tombstone=False)
+
+# Store wrapper for causal mode. Values passed to put() and merge() are
+# packed states (usually single-write deltas); both merge into the stored
+# state instead of overwriting it.
+class CausalStore(BaseStore):
+    def __init__(self, inner: BaseStore, max_vv_entries: int = 16):
+        self.inner = inner
+        self.max_vv_entries = max_vv_entries
+        self.merges = 0
+        self.siblings_kept = 0
+
+    def _apply(self, key: str, rec: Record) -> Tuple[Record, bool]:
+        cur = self.inner.get(key)
+        if rec.value is None:
+            return cur, False
+        if cur is None:
+            self.merges += 1
+            return self.inner.put(key, rec.value, ts=rec.ts), True
+        if cur.value == rec.value:
+            return cur, False
+        state = prune(merge(_state_of(cur), _state_of(rec)), self.max_vv_entries)
+        packed = pack(state)
+        if cur is not None and cur.value == packed:
+            return cur, False
+        self.merges += 1
+        if len(state.siblings) > 1:
+            self.siblings_kept += 1
+        ts = max(rec.ts, cur.ts) if cur is not None else rec.ts
+        return self.inner.put(key, packed, ts=ts), True
+
+    def put(self, key: str, value: str, ts: Optional[float] = None) -> Record:
+        return self._apply(key, Record(value=value, ts=ts if ts is not None else time.time()))[0]
+
+    def delete(self, key: str, ts: Optional[float] = None) -> Record:
+        raise ValueError("causal mode deletes are written as value-less siblings through put()")
+
+    def merge(self, key: str, rec: Record) -> bool:
+        return self._apply(key, rec)[1]
+
+    def get(self, key: str) -> Optional[Record]:
+        return self.inner.get(key)
+
+    def items(self) -> Iterator[Tuple[str, Record]]:
+        return self.inner.items()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.inner.stats(), "versioning": "causal", "merges": self.merges, "sibling_writes": self.siblings_kept}
+
+    def close(self) -> None:
+        self.inner.close()
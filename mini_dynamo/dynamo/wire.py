@@ -0,0 +1,171 @@
+import logging
+import struct
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .store import Record
+from .transport import PeerTransport
+
+log = logging.getLogger("wire")
+
+# Binary frames for the internal replica protocol, served on one raw
+# Starlette route (BINARY_PATH) next to the JSON endpoints.
+#
+# request:  op u8, count u32, then `count` items
+# response: status u8, count u32, then `count` items (records for reads;
+#           for writes count is the number applied and no items follow)
+# item:     key_len u16, value_len u32 (NO_VALUE = none), ts f64, flags u8,
+#           key, value, and hint_len u16 + hint when FLAG_HINT is set
+#
+# Keys and hints of 64 KiB or more do not fit the u16 lengths; calls
+# carrying one are sent as JSON instead.
+
+BINARY_PATH = "/internal/bin"
+CONTENT_TYPE = "application/x-dynamo-frame"
+
+OP_PUT = 1
+OP_DELETE = 2
+OP_GET = 3
+OP_PUT_BATCH = 4
+OP_DELETE_BATCH = 5
+OP_GET_BATCH = 6
+OP_MERGE_BATCH = 7
+
+PATH_OPS = {
+    "/internal/replica/put": OP_PUT,
+    "/internal/replica/delete": OP_DELETE,
+    "/internal/replica/get": OP_GET,
+    "/internal/replica/put_batch": OP_PUT_BATCH,
+    "/internal/replica/delete_batch": OP_DELETE_BATCH,
+    "/internal/replica/get_batch": OP_GET_BATCH,
+    "/internal/replica/merge_batch": OP_MERGE_BATCH,
+}
+READ_OPS = (OP_GET, OP_GET_BATCH)
+
+FLAG_TOMBSTONE = 1
+FLAG_HINT = 2
+NO_VALUE = 0xFFFFFFFF
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_HEAD = struct.Struct("<BI")
+_ITEM = struct.Struct("<HIdB")
+_HINT = struct.Struct("<H")
+
+# One decoded item: (key, value, ts, tombstone, hint_for).
+Item = Tuple[str, Optional[str], float, bool, Optional[str]]
+
+def _put_item(out: List[bytes], key: str, value: Optional[str], ts: float, tombstone: bool, hint_for: Optional[str]) -> None:
+    kb = key.encode("utf-8")
+    vb = value.encode("utf-8") if value is not None else b""
+    flags = (FLAG_TOMBSTONE if tombstone else 0) | (FLAG_HINT if hint_for else 0)
+    out.append(_ITEM.pack(len(kb), len(vb) if value is not None else NO_VALUE, ts, flags))
+    out.append(kb)
+    out.append(vb)
+    if hint_for:
+        hb = hint_for.encode("utf-8")
+        out.append(_HINT.pack(len(hb)))
+        out.append(hb)
+
+def _items(buf: bytes, off: int, count: int) -> List[Item]:
+    items = []
+    mv = memoryview(buf)
+    unpack_item, item_size = _ITEM.unpack_from, _ITEM.size
+    for _ in range(count):
+        klen, vlen, ts, flags = unpack_item(buf, off)
+        off += item_size
+        key = str(mv[off:off + klen], "utf-8")
+        off += klen
+        value = None
+        if vlen != NO_VALUE:
+            value = str(mv[off:off + vlen], "utf-8")
+            off += vlen
+        hint_for = None
+        if flags & FLAG_HINT:
+            (hlen,) = _HINT.unpack_from(buf, off)
+            off += _HINT.size
+            hint_for = str(mv[off:off + hlen], "utf-8")
+            off += hlen
+        items.append((key, value, ts, bool(flags & FLAG_TOMBSTONE), hint_for))
+    return items
+
+# Encode the JSON-shaped payload the quorum client would send to `path`.
+def encode_request(op: int, payload: Dict[str, Any]) -> bytes:
+    if op in (OP_PUT, OP_DELETE, OP_GET):
+        raw = [payload]
+    elif op == OP_GET_BATCH:
+        raw = [{"key": k} for k in payload["keys"]]
+    else:
+        raw = payload["items"]
+    out = [_HEAD.pack(op, len(raw))]
+    for it in raw:
+        _put_item(out, it["key"], it.get("value"), float(it.get("ts", 0.0)), op == OP_DELETE or op == OP_DELETE_BATCH or bool(it.get("tombstone")), it.get("hint_for"))
+    return b"".join(out)
+
+def decode_request(body: bytes) -> Tuple[int, List[Item]]:
+    op, count = _HEAD.unpack_from(body)
+    return op, _items(body, _HEAD.size, count)
+
+def encode_response(records: Optional[List[Tuple[str, Optional[Record]]]] = None, applied: int = 0, status: int = STATUS_OK) -> bytes:
+    if records is None:
+        return _HEAD.pack(status, applied)
+    out = [_HEAD.pack(status, len(records))]
+    for key, rec in records:
+        if rec is None:
+            _put_item(out, key, None, 0.0, True, None)
+        else:
+            _put_item(out, key, rec.value, rec.ts, rec.tombstone, None)
+    return b"".join(out)
+
+# Decode a response into the same dict the JSON endpoint returns, so
+# callers are unaware of the encoding.
+def decode_response(op: int, body: bytes, count_hint: int = 0) -> Optional[Dict[str, Any]]:
+    status, count = _HEAD.unpack_from(body)
+    if status != STATUS_OK:
+        return None
+    if op not in READ_OPS:
+        if op == OP_MERGE_BATCH:
+            return {"ok": True, "count": count_hint, "applied": count}
+        return {"ok": True, "count": count}
+    records = {k: {"ok": True, "value": v, "ts": ts, "tombstone": tomb} for k, v, ts, tomb, _ in _items(body, _HEAD.size, count)}
+    if op == OP_GET:
+        return next(iter(records.values()))
+    return {"ok": True, "records": records}
+
+# Client side: sends supported internal calls as binary frames. A peer that
+# answers 404 on BINARY_PATH (an older node) is remembered and gets JSON.
+class BinaryClient:
+    def __init__(self, transport: PeerTransport):
+        self.transport = transport
+        self._json_only: Set[str] = set()
+        self.calls = 0
+        self.fallbacks = 0
+        self.oversize = 0
+
+    def supports(self, url: str, path: str) -> bool:
+        return path in PATH_OPS and url not in self._json_only
+
+    # Returns (handled, ok, data); handled is False when the caller should
+    # fall back to JSON.
+    async def call(self, url: str, path: str, payload: Dict[str, Any]) -> Tuple[bool, bool, Optional[dict]]:
+        op = PATH_OPS[path]
+        try:
+            body = encode_request(op, payload)
+        except struct.error:
+            # a key or hint too long for the frame format
+            self.oversize += 1
+            return False, False, None
+        r = await self.transport.post(url, BINARY_PATH, content=body, headers={"content-type": CONTENT_TYPE})
+        if r.status_code == 404:
+            self._json_only.add(url)
+            self.fallbacks += 1
+            log.info("Peer %s has no binary endpoint, using JSON", url)
+            return False, False, None
+        self.calls += 1
+        if r.status_code != 200:
+            return True, False, None
+        n = len(payload.get("items") or ()) if op == OP_MERGE_BATCH else 0
+        data = decode_response(op, r.content, n)
+        return True, data is not None, data
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "fallbacks": self.fallbacks, "oversize_json_calls": self.oversize, "json_fallback_peers": sorted(self._json_only)}
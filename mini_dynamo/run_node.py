@@ -1,6 +1,87 @@
 import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
 import uvicorn
 from dynamo.node_api import create_app
+from dynamo.partitioner import PARTITIONER_NAMES
+from dynamo.shards import socket_path
+from dynamo.store import STORE_ENGINES
+
+def build_app(args, worker: int = 0, socket_dir=None):
+    peers = [x.strip() for x in args.peers.split(",") if x.strip()]
+    data_dir = args.data_dir
+    if data_dir and args.workers > 1:
+        data_dir = os.path.join(data_dir, f"shard-{worker}")
+    return create_app(
+        node_id=args.node_id,
+        base_url=f"http://{args.host}:{args.port}",
+        peers=peers,
+        replication=args.replication,
+        w=args.w,
+        q=args.q,
+        debug=args.debug,
+        partitioner=args.partitioner,
+        engine=args.engine,
+        data_dir=data_dir,
+        versioning=args.versioning,
+        membership_protocol=args.membership,
+        store_access=args.store_access,
+        workers=args.workers,
+        worker=worker,
+        socket_dir=socket_dir,
+        read_cache_bytes=int(args.read_cache_mb * (1 << 20)),
+        range_scans=args.range_scans,
+        anti_entropy_interval_s=args.anti_entropy_interval,
+    )
+
+def tcp_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+def unix_socket(path: str) -> socket.socket:
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    return sock
+
+# One worker process: the node's public port (its own SO_REUSEPORT socket,
+# so the kernel spreads connections over the workers, or the parent's
+# socket where SO_REUSEPORT is missing) plus its Unix socket for siblings.
+def serve_worker(args, worker: int, socket_dir: str, shared) -> None:
+    tcp = shared if shared is not None else tcp_socket(args.host, args.port, reuse_port=True)
+    uds = unix_socket(socket_path(socket_dir, worker))
+    server = uvicorn.Server(uvicorn.Config(build_app(args, worker, socket_dir), log_level="debug" if args.debug else "info"))
+    server.run(sockets=[tcp, uds])
+
+# Run `args.workers` worker processes behind one node identity and wait
+# for them; a signal to the parent stops them all.
+def serve_workers(args) -> None:
+    socket_dir = args.socket_dir or tempfile.mkdtemp(prefix=f"dynamo-{args.node_id}-")
+    os.makedirs(socket_dir, exist_ok=True)
+    shared = None if hasattr(socket, "SO_REUSEPORT") else tcp_socket(args.host, args.port, reuse_port=False)
+    ctx = multiprocessing.get_context("fork" if shared is not None else "spawn")
+    procs = [ctx.Process(target=serve_worker, args=(args, i, socket_dir, shared), name=f"worker-{i}") for i in range(args.workers)]
+    for proc in procs:
+        proc.start()
+
+    def stop(signum, frame):
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for proc in procs:
+        proc.join()
 
 def main():
     p = argparse.ArgumentParser()
@@ -11,21 +92,28 @@ def main():
     p.add_argument("--replication", type=int, default=2, help="R replication factor")
     p.add_argument("--w", type=int, default=1, help="Write quorum")
     p.add_argument("--q", type=int, default=1, help="Read quorum")
+    p.add_argument("--partitioner", default="md5", choices=PARTITIONER_NAMES, help="Key placement scheme (must match on all nodes)")
+    p.add_argument("--engine", default="memory", choices=STORE_ENGINES, help="Storage engine")
+    p.add_argument("--data-dir", default=None, help="Data directory for the lsm engine")
+    p.add_argument("--versioning", default="lww", choices=["lww", "causal"], help="Conflict resolution (must match on all nodes)")
+    p.add_argument("--membership", default="heartbeat", choices=["heartbeat", "swim"], help="Failure detection protocol (must match on all nodes)")
+    p.add_argument("--store-access", default="auto", choices=["auto", "inline", "thread"], help="Run store operations on the event loop or on worker threads (auto: threads for lsm)")
+    p.add_argument("--read-cache-mb", type=float, default=0.0, help="Coordinator cache for /kv/get?consistency=cached, in MiB (0 disables)")
+    p.add_argument("--range-scans", action="store_true", help="Index keys in order to serve /kv/scan (more memory per key)")
+    p.add_argument("--anti-entropy-interval", type=float, default=0.0, help="Seconds between Merkle syncs with a random peer (0 disables; keeps a digest per key)")
+    p.add_argument("--workers", type=int, default=1, help="Worker processes, each serving the port and storing one token sub-range of the node")
+    p.add_argument("--socket-dir", default=None, help="Directory for the workers' Unix sockets (default: a new temporary directory)")
     p.add_argument("--debug", action="store_true")
     args = p.parse_args()
+    if args.workers < 1:
+        p.error("--workers must be at least 1")
+    if args.workers > 1 and args.membership == "swim":
+        p.error("--membership swim runs with a single worker only")
 
-    peers = [x.strip() for x in args.peers.split(",") if x.strip()]
-    app = create_app(
-        node_id=args.node_id,
-        base_url=f"http://{args.host}:{args.port}",
-        peers=peers,
-        replication=args.replication,
-        w=args.w,
-        q=args.q,
-        debug=args.debug,
-    )
-
-    uvicorn.run(app, host=args.host, port=args.port)
+    if args.workers > 1:
+        serve_workers(args)
+        return
+    uvicorn.run(build_app(args), host=args.host, port=args.port)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
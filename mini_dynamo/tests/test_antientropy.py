@@ -0,0 +1,82 @@
+import asyncio
+
+from dynamo.antientropy import AntiEntropy, MerkleIndex, TrackedStore
+from dynamo.hashing import ConsistentHashRing
+from dynamo.store import InMemoryStore, Record
+
+NODES = ["http://a", "http://b"]
+
+
+class _Resp:
+    def __init__(self, data):
+        self._data = data
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+# Routes anti-entropy calls straight to the other node's index and store.
+class _Loopback:
+    def __init__(self, index, store):
+        self.index = index
+        self.store = store
+
+    async def post(self, base_url, path, json=None):
+        if path == "/internal/merkle/nodes":
+            return _Resp({"hashes": self.index.nodes(json["peer"], json["level"], json["indices"])})
+        if path == "/internal/merkle/leaves":
+            return _Resp({"digests": self.index.leaf_digests(json["peer"], json["leaves"])})
+        if path == "/internal/replica/get_batch":
+            recs = {}
+            for k in json["keys"]:
+                r = self.store.get(k)
+                recs[k] = {"value": r.value, "ts": r.ts, "tombstone": r.tombstone} if r else {"value": None, "ts": 0.0, "tombstone": True}
+            return _Resp({"records": recs})
+        if path == "/internal/replica/merge_batch":
+            for it in json["items"]:
+                self.store.merge(it["key"], Record(value=it["value"], ts=it["ts"], tombstone=it["tombstone"]))
+            return _Resp({"ok": True})
+        raise AssertionError(path)
+
+
+def _node(url):
+    ring = ConsistentHashRing(NODES)
+    index = MerkleIndex(url, lambda keys: ring.replicas_many(keys, 2), ring.token, ring.partitioner.bits, depth=6)
+    return index, TrackedStore(InMemoryStore(), index)
+
+
+def test_merkle_roots_match_only_for_equal_data():
+    ia, sa = _node("http://a")
+    ib, sb = _node("http://b")
+    for i in range(100):
+        sa.put(f"k{i}", "v", ts=1.0)
+        sb.put(f"k{99 - i}", "v", ts=1.0)
+    assert ia.nodes("http://b", 0, [0]) == ib.nodes("http://a", 0, [0])
+
+    sb.put("k7", "newer", ts=2.0)
+    assert ia.nodes("http://b", 0, [0]) != ib.nodes("http://a", 0, [0])
+    assert ib.leaf_digests("http://a", [ib.leaf_of("k7")]).keys() >= {"k7"}
+
+
+def test_sync_exchanges_only_differing_keys():
+    ia, sa = _node("http://a")
+    ib, sb = _node("http://b")
+    for i in range(200):
+        sa.put(f"k{i}", "v", ts=1.0)
+        sb.put(f"k{i}", "v", ts=1.0)
+    sa.put("k3", "from-a", ts=2.0)
+    sb.delete("k5", ts=3.0)
+    sb.put("only-b", "x", ts=1.0)
+
+    ae = AntiEntropy(ia, sa, _Loopback(ib, sb), membership=None)
+    asyncio.run(ae.sync_with("http://b"))
+
+    assert ae.keys_compared == 3
+    assert ae.pulled == 2 and ae.pushed == 1
+    assert sb.get("k3").value == "from-a"
+    assert sa.get("k5").tombstone
+    assert ia.nodes("http://b", 0, [0]) == ib.nodes("http://a", 0, [0])
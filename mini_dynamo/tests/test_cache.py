@@ -0,0 +1,55 @@
+import asyncio
+
+from dynamo.cache import ENTRY_OVERHEAD, CacheInvalidator, ChangeNotifyingStore, ReadCache
+from dynamo.store import InMemoryStore, Record
+
+
+def test_slru_keeps_reused_keys_through_a_scan_and_expires_entries():
+    now = [0.0]
+    entry = ENTRY_OVERHEAD + 2 + 100
+    cache = ReadCache(max_bytes=10 * entry, ttl_s=5.0, clock=lambda: now[0])
+    for i in range(4):
+        assert cache.put(f"h{i}", i, 100, cache.ticket())
+        assert cache.get(f"h{i}") == i  # second touch: protected
+    for i in range(50):
+        cache.put(f"s{i:02d}", i, 100, cache.ticket())
+    assert all(cache.get(f"h{i}") == i for i in range(4))
+    assert cache.size <= cache.max_bytes and cache.evictions > 0
+    now[0] = 5.0
+    assert cache.get("h0") is None and cache.expirations == 1
+
+
+def test_invalidation_refuses_results_of_reads_that_started_before_it():
+    cache = ReadCache(max_bytes=1 << 20, remember=2)
+    ticket = cache.ticket()
+    cache.put("a", "old", 3, ticket)
+    cache.invalidate(["a"])
+    assert cache.get("a") is None and cache.invalidations == 1
+    assert not cache.put("a", "stale", 5, ticket)
+    assert cache.put("a", "fresh", 5, cache.ticket())
+    # once the invalidation itself is forgotten, old tickets are refused for any key
+    cache.invalidate(["x", "y", "z"])
+    assert not cache.put("b", "v", 1, ticket)
+    assert cache.get("a") == "fresh"
+
+
+def test_changed_keys_are_broadcast_in_batches():
+    sent = []
+    local = []
+
+    async def send(peer, keys):
+        sent.append((peer, sorted(keys)))
+
+    async def here(keys):
+        local.extend(keys)
+
+    inv = CacheInvalidator(lambda: ["http://b", "http://c"], send, here)
+    store = ChangeNotifyingStore(InMemoryStore(), inv.changed)
+    store.put("k1", "v", ts=2.0)
+    store.delete("k2", ts=2.0)
+    assert not store.merge("k1", Record("older", 1.0))
+    asyncio.run(inv.flush())
+    asyncio.run(inv.flush())
+    assert sorted(local) == ["k1", "k2"]
+    assert sorted(sent) == [("http://b", ["k1", "k2"]), ("http://c", ["k1", "k2"])]
+    assert inv.stats()["flushes"] == 1 and inv.keys_sent == 4
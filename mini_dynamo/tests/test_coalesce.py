@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from dynamo.coalesce import SingleFlight
+
+
+def test_concurrent_calls_share_one_flight_until_forgotten():
+    sf = SingleFlight()
+    calls = []
+
+    async def read(tag):
+        calls.append(tag)
+        await asyncio.sleep(0.01)
+        return tag
+
+    async def run():
+        first = await asyncio.gather(*(sf.do("k", lambda: read("a")) for _ in range(5)), sf.do("other", lambda: read("o")))
+        # a write lands while a read is in flight: later readers start over
+        early = asyncio.ensure_future(sf.do("k", lambda: read("before")))
+        await asyncio.sleep(0)
+        sf.forget(["k"])
+        late = await sf.do("k", lambda: read("after"))
+        return first, await early, late
+
+    first, early, late = asyncio.run(run())
+    assert first[:5] == [("a", False)] + [("a", True)] * 4 and first[5] == ("o", False)
+    assert early == ("before", False) and late == ("after", False)
+    assert calls == ["a", "o", "before", "after"]
+    assert sf.stats() == {"in_flight": 0, "started": 4, "joined": 4, "forgotten": 1, "hit_ratio": 0.5}
+
+
+def test_leader_cancellation_and_errors_reach_every_caller():
+    sf = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.01)
+        return 1
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("down")
+
+    async def run():
+        leader = asyncio.ensure_future(sf.do("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(sf.do("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == (1, True)
+        results = await asyncio.gather(sf.do("e", broken), sf.do("e", broken), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await sf.do("e", broken)
+
+    asyncio.run(run())
@@ -0,0 +1,64 @@
+import asyncio
+
+from dynamo.handoff import HintQueue
+from dynamo.store import InMemoryStore, Record
+
+def test_hint_queue_keeps_newest_per_key_and_is_bounded():
+    q = HintQueue(max_hints=2)
+    q.add("n2", "a", Record(value="1", ts=1.0))
+    q.add("n2", "a", Record(value="2", ts=2.0))
+    q.add("n2", "a", Record(value="0", ts=0.5))
+    q.add("n3", "b", Record(value="x", ts=1.0))
+    q.add("n3", "c", Record(value="y", ts=1.0))
+
+    assert len(q) == 2
+    assert q.dropped == 1
+    assert q.peek("n2", 10) == [("a", Record(value="2", ts=2.0))]
+
+
+def test_hint_queue_survives_restart(tmp_path):
+    path = str(tmp_path / "hints.jsonl")
+    q = HintQueue(path=path)
+    q.add("n2", "a", Record(value="1", ts=1.0))
+    q.add("n2", "b", Record(value=None, ts=2.0, tombstone=True))
+    q.ack("n2", q.peek("n2", 1))
+    q.close()
+
+    reloaded = HintQueue(path=path)
+    assert reloaded.peek("n2", 10) == [("b", Record(value=None, ts=2.0, tombstone=True))]
+    reloaded.close()
+
+
+def test_hint_log_is_written_by_flush_and_rewritten_once_drained(tmp_path):
+    path = tmp_path / "hints.jsonl"
+    q = HintQueue(path=str(path))
+    q.add("n2", "a", Record(value="1", ts=1.0))
+    q.add("n2", "b", Record(value="2", ts=1.0))
+    assert path.read_text() == ""
+
+    asyncio.run(q.flush())
+    assert len(path.read_text().splitlines()) == 2
+
+    q.ack("n2", q.peek("n2", 10))
+    asyncio.run(q.flush())
+    assert path.read_text() == ""
+    q.close()
+
+
+def test_merge_applies_only_newer_records():
+    store = InMemoryStore()
+    store.put("a", "new", ts=2.0)
+
+    assert store.merge("a", Record(value="old", ts=1.0)) is False
+    assert store.merge("a", Record(value=None, ts=3.0, tombstone=True)) is True
+    assert store.get("a").tombstone is True
+
+
+def test_merge_breaks_timestamp_ties_the_same_way_on_every_replica():
+    a, b = InMemoryStore(), InMemoryStore()
+    a.put("k", "x", ts=1.0)
+    b.put("k", "y", ts=1.0)
+    assert a.merge("k", b.get("k")) is True
+    assert b.merge("k", Record(value="x", ts=1.0)) is False
+    assert a.get("k") == b.get("k") == Record(value="y", ts=1.0)
+    assert a.merge("k", Record(value=None, ts=1.0, tombstone=True)) is True
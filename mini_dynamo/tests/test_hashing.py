@@ -38,3 +38,43 @@ def test_rebalance_moves_subset_only():
 
     assert moved < len(keys)
     assert moved > 0
+
+
+def test_incremental_set_nodes_matches_full_build():
+    ring = ConsistentHashRing(["n1", "n2", "n3"], vnodes=20)
+    ring.set_nodes(["n1", "n3", "n4"], version=7)
+    fresh = ConsistentHashRing(["n1", "n3", "n4"], vnodes=20)
+
+    assert ring.version == 7
+    assert ring.nodes == fresh.nodes
+    for i in range(200):
+        assert ring.replicas(f"k{i}", r=2) == fresh.replicas(f"k{i}", r=2)
+
+
+def test_replicas_many_matches_replicas():
+    ring = ConsistentHashRing(["n1", "n2", "n3", "n4"], vnodes=16)
+    keys = [f"k{i}" for i in range(100)]
+
+    batch = ring.replicas_many(keys, r=3)
+
+    assert [list(x) for x in batch] == [ring.replicas(k, r=3) for k in keys]
+
+
+def test_md5_partitioner_matches_original_hash():
+    import hashlib
+    from dynamo.partitioner import Md5Partitioner
+
+    p = Md5Partitioner()
+    for k in ["a", "example-key", "n1#3"]:
+        assert p.token(k) == int(hashlib.md5(k.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def test_alternative_partitioners_give_distinct_replicas():
+    from dynamo.hashing import make_ring
+
+    nodes = ["n1", "n2", "n3", "n4"]
+    for name in ["blake2b", "rendezvous"]:
+        ring = make_ring(name, nodes, vnodes=10)
+        reps = ring.replicas("k", r=3)
+        assert len(set(reps)) == 3
+        assert ring.owner("k") == reps[0]
@@ -0,0 +1,40 @@
+import asyncio
+
+from dynamo.latency import LatencyTracker
+from dynamo.quorum import QuorumClient
+
+
+def test_ewma_and_percentiles_follow_observed_latency():
+    t = LatencyTracker(min_samples=10)
+    for i in range(100):
+        t.observe("fast", 0.002 + (0.010 if i % 20 == 0 else 0.0))
+        t.observe("slow", 0.050)
+    t.failure("flaky")
+
+    assert t.percentile("fast", 50) == 0.002
+    assert t.percentile("fast", 99) == 0.012
+    assert t.percentile("new", 50) is None
+    assert t.ewma("fast") < t.ewma("slow") < t.ewma("flaky")
+    assert t.stats()["fast"]["samples"] == 100
+    assert t.stats()["flaky"]["failures"] == 1
+
+
+def test_quorum_reads_record_every_replica_call():
+    class Resp:
+        status_code = 200
+
+        def json(self):
+            return {"ok": True, "value": "v", "ts": 1.0, "tombstone": False}
+
+    class Cluster:
+        async def get(self, url, path, params=None):
+            if url == "c":
+                raise ConnectionError("down")
+            return Resp()
+
+    t = LatencyTracker(min_samples=1)
+    qc = QuorumClient(Cluster(), latency=t)
+    asyncio.run(qc.quorum_get(["a", "b", "c"], "k", q=3))
+    peers = qc.stats()["peers"]
+    assert peers["a"]["samples"] == peers["b"]["samples"] == 1
+    assert peers["c"]["samples"] == 0 and peers["c"]["failures"] == 1
@@ -0,0 +1,157 @@
+from dynamo.lsm import LSMStore
+
+def test_put_get_delete(tmp_path):
+    store = LSMStore(str(tmp_path))
+    store.put("a", "1", ts=1.0)
+    store.delete("b", ts=2.0)
+
+    assert store.get("a").value == "1"
+    assert store.get("b").tombstone is True
+    assert store.get("c") is None
+    store.close()
+
+
+def test_recovers_from_wal(tmp_path):
+    store = LSMStore(str(tmp_path))
+    store.put("a", "1", ts=1.0)
+    store.put("a", "2", ts=2.0)
+    store.close()
+
+    reopened = LSMStore(str(tmp_path))
+    rec = reopened.get("a")
+    assert rec.value == "2"
+    assert rec.ts == 2.0
+    reopened.close()
+
+
+def test_flush_and_compaction_keep_newest(tmp_path):
+    store = LSMStore(str(tmp_path), memtable_max_bytes=2000, compaction_trigger=2, tombstone_grace_s=0.0)
+    for i in range(200):
+        store.put(f"k{i}", f"v{i}", ts=1.0)
+    for i in range(0, 200, 2):
+        store.put(f"k{i}", f"w{i}", ts=2.0)
+    store.delete("k1", ts=3.0)
+    store.close()
+
+    reopened = LSMStore(str(tmp_path))
+    assert reopened.get("k0").value == "w0"
+    assert reopened.get("k3").value == "v3"
+    assert reopened.get("k1").tombstone is True
+    assert reopened.stats()["sstables"]
+    reopened.close()
+
+
+def test_group_commit_acknowledges_writes_after_a_shared_fsync(tmp_path, monkeypatch):
+    import os
+    import threading
+    import time
+
+    from dynamo.store import write_group
+
+    synced = []
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(0.005)
+        real_fsync(fd)
+        synced.append(time.monotonic())
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    store = LSMStore(str(tmp_path))
+    t0 = time.monotonic()
+    store.put("a", "1", ts=1.0)
+    assert synced and synced[-1] >= t0
+
+    def writer(n):
+        for i in range(20):
+            store.put(f"w{n}-{i}", "v", ts=1.0)
+
+    before = len(synced)
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(synced) - before < 160
+
+    before = len(synced)
+    with write_group():
+        for i in range(50):
+            store.put(f"g{i}", "v", ts=1.0)
+    assert 1 <= len(synced) - before <= 2
+    store.close()
+
+
+def test_recovery_drops_tables_a_compaction_already_merged(tmp_path):
+    import shutil
+    import time
+
+    def settle(store, tables):
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline:
+            st = store.stats()
+            if st["immutable_memtables"] == 0 and len(st["sstables"]) == tables:
+                return
+            time.sleep(0.01)
+        raise AssertionError(store.stats())
+
+    store = LSMStore(str(tmp_path), memtable_max_bytes=1000, compaction_trigger=100)
+    for i in range(30):
+        store.put(f"k{i:02d}", "old", ts=1.0)
+    store.delete("k00", ts=2.0)
+    for i in range(30):
+        store.put(f"pad{i:02d}", "x" * 20, ts=2.0)
+    store.close()
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    names = [p.name for p in tmp_path.glob("sst-*.sst")]
+    assert len(names) > 2
+    for name in names:
+        shutil.copy(tmp_path / name, inputs / name)
+
+    store = LSMStore(str(tmp_path), memtable_max_bytes=1 << 20, compaction_trigger=2, tombstone_grace_s=0.0)
+    settle(store, 1)
+    assert store.get("k00") is None
+    store.close()
+
+    # crash between the compaction's rename and the removal of its inputs
+    for name in names:
+        shutil.copy(inputs / name, tmp_path / name)
+    reopened = LSMStore(str(tmp_path), compaction_trigger=100)
+    assert reopened.get("k00") is None and reopened.get("k01").value == "old"
+    assert len(reopened.stats()["sstables"]) == 1
+    reopened.close()
+
+
+def test_versions_across_tables_resolve_by_ts_then_table_order(tmp_path):
+    import time
+
+    def settle(store, tables):
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline:
+            st = store.stats()
+            if st["immutable_memtables"] == 0 and len(st["sstables"]) == tables:
+                return
+            time.sleep(0.01)
+        raise AssertionError(store.stats())
+
+    def check(store):
+        assert store.get("k").value == "new" and store.get("tie").value == "second"
+        assert {k: r.value for k, r in store.items()} == {"k": "new", "tie": "second"}
+
+    # Every put fills the memtable, so each write gets a table of its own.
+    store = LSMStore(str(tmp_path), memtable_max_bytes=1, compaction_trigger=100)
+    store.put("k", "new", ts=2.0)
+    store.put("k", "late", ts=1.0)
+    store.put("tie", "first", ts=5.0)
+    store.put("tie", "second", ts=5.0)
+    settle(store, 4)
+    check(store)
+    store.close()
+
+    store = LSMStore(str(tmp_path), compaction_trigger=2)
+    settle(store, 1)
+    check(store)
+    store.put("k", "later", ts=1.5)
+    check(store)
+    store.close()
@@ -0,0 +1,49 @@
+from dynamo.membership import Membership
+from dynamo.phi import PhiAccrual
+
+def test_version_changes_only_with_alive_set():
+    m = Membership("http://a", ["http://b"], timeout_s=1.0, dead_after_s=10.0)
+    v0 = m.version
+
+    m.mark_seen("http://b")
+    assert m.version == v0
+
+    m.mark_seen("http://c")
+    assert m.version == v0 + 1
+    assert "http://c" in m.all_nodes()
+
+    m.dead_after_s = -1.0
+    m.remove_after_s = -1.0
+    m.tick_dead()
+    assert m.version == v0 + 3
+    assert m.all_nodes() == ["http://a"]
+
+
+def test_dead_peer_keeps_ring_position_until_removed():
+    m = Membership("http://a", ["http://b"], timeout_s=1.0, dead_after_s=10.0, remove_after_s=60.0)
+    v0 = m.version
+
+    m.dead_after_s = -1.0
+    m.tick_dead()
+
+    assert not m.is_alive("http://b")
+    assert m.all_nodes() == ["http://a", "http://b"]
+    assert m.version == v0
+
+
+def test_phi_suspects_silent_peer_before_it_is_dead():
+    d = PhiAccrual(threshold=8.0, min_std_s=0.1)
+    for i in range(50):
+        d.heartbeat("b", i * 1.0 + (0.05 if i % 2 else 0.0))
+    assert d.phi("b", 49.5) < 1.0
+    assert not d.suspected("b", 50.0)
+    assert d.suspected("b", 51.5)
+    assert d.phi("b", 51.5) > d.phi("b", 51.0) > d.phi("b", 50.5)
+
+    m = Membership("http://a", ["http://b"], timeout_s=1.0, dead_after_s=10.0)
+    m.mark_seen("http://b")
+    assert m.is_available("http://b")
+    m.detector._peers["http://b"].last -= 5.0
+    assert m.is_alive("http://b") and m.is_suspected("http://b")
+    assert not m.is_available("http://b")
+    assert "http://b" in m.all_nodes()
@@ -0,0 +1,45 @@
+import threading
+
+from dynamo.metrics import N_BUCKETS, NodeMetrics, bucket_of, bucket_upper
+
+
+def test_buckets_cover_values_with_bounded_error():
+    prev = 0
+    for i in range(N_BUCKETS):
+        assert bucket_upper(i) > prev
+        prev = bucket_upper(i)
+    for us in [0, 1, 63, 64, 65, 1000, 4999, 123_456, 10**9]:
+        i = bucket_of(us)
+        lower = bucket_upper(i - 1) if i else 0
+        assert lower <= us < bucket_upper(i)
+        assert bucket_upper(i) - lower <= max(1, us / 32)
+
+
+def test_threads_record_into_one_histogram_and_render():
+    m = NodeMetrics()
+    h = m.quorum_wait.labels("get")
+
+    def work():
+        for i in range(1000):
+            h.observe(0.001 if i % 10 else 0.2)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    m.replica_call("http://b", "/internal/replica/get", 0.01, False, TimeoutError())
+    m.registry.gauge("dynamo_keys", "Keys", lambda: 7)
+
+    counts, total = h.snapshot()
+    assert sum(counts) == 4000 and abs(total - 4 * (900 * 0.001 + 100 * 0.2)) < 1e-6
+    assert 0.001 <= h.percentile(50) < 0.00104 and h.percentile(99) >= 0.2
+
+    text = m.render()
+    assert 'dynamo_quorum_wait_seconds_bucket{op="get",le="0.001"} 0' in text
+    assert 'dynamo_quorum_wait_seconds_bucket{op="get",le="0.0025"} 3600' in text
+    assert 'dynamo_quorum_wait_seconds_bucket{op="get",le="+Inf"} 4000' in text
+    assert 'dynamo_quorum_wait_seconds_count{op="get"} 4000' in text
+    assert 'dynamo_replica_timeouts_total{peer="http://b"} 1' in text
+    assert 'dynamo_peer_errors_total{peer="http://b"} 1' in text
+    assert "# TYPE dynamo_keys gauge\ndynamo_keys 7" in text
@@ -0,0 +1,204 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from dynamo.handoff import HintedHandoff, HintQueue
+from dynamo.node_api import create_app
+from dynamo.quorum import QuorumClient
+
+
+class _Resp:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def json(self):
+        return {"ok": True}
+
+
+class _Replicas:
+    def __init__(self, delays, failing=()):
+        self.delays = delays
+        self.failing = set(failing)
+        self.applied = []
+
+    async def post(self, url, path, json=None):
+        await asyncio.sleep(self.delays.get(url, 0))
+        if url in self.failing:
+            return _Resp(500)
+        self.applied.append(url)
+        return _Resp(200)
+
+
+def test_write_returns_at_w_and_finishes_stragglers_in_background():
+    replicas = _Replicas({"b": 0.0, "c": 0.05, "d": 0.05}, failing={"d"})
+    handoff = HintedHandoff(HintQueue(), transport=None, membership=None)
+    qc = QuorumClient(replicas, handoff=handoff)
+
+    async def scenario():
+        info = await qc.replicate_put(["a", "b", "c", "d"], "k", "v", ts=1.0, w=2, local="a")
+        assert info["acks"] == 2 and replicas.applied == ["b"]
+        assert qc.stats()["background_writes"] == 2
+        await qc.drain()
+
+    asyncio.run(scenario())
+    assert replicas.applied == ["b", "c"]
+    assert qc.late_acks == 1 and qc.late_failures == 1
+    assert handoff.queue.targets() == ["d"]
+
+
+def test_background_writes_time_out_into_hints():
+    replicas = _Replicas({"b": 0.0, "c": 10.0})
+    handoff = HintedHandoff(HintQueue(), transport=None, membership=None)
+    qc = QuorumClient(replicas, handoff=handoff, late_timeout_s=0.05)
+
+    async def scenario():
+        await qc.replicate_delete(["b", "c"], "k", ts=1.0, w=1)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert qc.late_timeouts == 1
+    assert handoff.queue.peek("c", 1)[0][1].tombstone
+
+
+def test_concurrent_writes_to_a_peer_share_batch_requests():
+    replicas = _Replicas({"b": 0.01, "c": 0.01}, failing={"c"})
+    sent = []
+    post = replicas.post
+
+    async def record(url, path, json=None):
+        sent.append((url, path, len(json["items"]) if "items" in json else 1))
+        return await post(url, path, json=json)
+
+    replicas.post = record
+    handoff = HintedHandoff(HintQueue(), transport=None, membership=None)
+    qc = QuorumClient(replicas, handoff=handoff, write_batch_items=8)
+
+    async def scenario():
+        infos = await asyncio.gather(*(qc.replicate_put(["a", "b", "c"], f"k{i}", "v", ts=1.0, w=2, local="a") for i in range(20)))
+        assert all(info["acks"] == 2 and info["results"]["b"] for info in infos)
+        await qc.drain()
+        # light traffic: a lone write goes out at once on the single-key path
+        await asyncio.sleep(0.05)
+        await qc.replicate_delete(["b"], "k0", ts=2.0, w=1)
+
+    asyncio.run(scenario())
+    to_b = [(path, n) for url, path, n in sent if url == "b"]
+    assert to_b == [("/internal/replica/put_batch", 8)] * 2 + [("/internal/replica/put_batch", 4), ("/internal/replica/delete", 1)]
+    assert sorted(k for k, _ in handoff.queue.peek("c", 100)) == sorted(f"k{i}" for i in range(20))
+    assert qc.stats()["write_batching"]["writes"] == 41
+
+
+def test_scan_merges_replica_pages_in_key_order():
+    from dynamo.store import IndexedStore, InMemoryStore
+
+    nodes = ["a", "b", "c"]
+    stores = {n: IndexedStore(InMemoryStore(), token_fn=len, token_bits=8) for n in nodes}
+    owners = {f"k{i:02d}": [nodes[i % 3], nodes[(i + 1) % 3]] for i in range(30)}
+    for key, own in owners.items():
+        for n in own:
+            stores[n].put(key, key, ts=1.0)
+    stores["b"].put("k00", "newer", ts=2.0)
+    stores["a"].delete("k03", ts=2.0)
+
+    class Pages:
+        async def get(self, url, path, params=None):
+            if url == "c":
+                raise ConnectionError
+            rows = stores[url].scan_keys(prefix=params["prefix"], start=params.get("start"), after=params.get("after"), limit=params["limit"] + 1)
+            resp = _Resp(200)
+            resp.json = lambda: {"items": [[k, r.value, r.ts, r.tombstone] for k, r in rows[:params["limit"]]], "more": len(rows) > params["limit"]}
+            return resp
+
+    async def scan(q):
+        return [(k, r) async for k, r in QuorumClient(Pages()).quorum_scan(nodes, lambda k: (owners[k], q), prefix="k", page=4)]
+
+    rows = asyncio.run(scan(2))
+    assert [k for k, _ in rows] == sorted(owners)
+    by_key = dict(rows)
+    assert by_key["k00"].value == "newer" and by_key["k03"].tombstone
+    # c is down: only keys owned by a and b reach a quorum of 2.
+    assert all((r is None) == ("c" in owners[k]) for k, r in rows)
+    assert all(r is not None for _, r in asyncio.run(scan(1)))
+
+
+def test_failed_batch_delete_is_hinted_as_tombstones():
+    replicas = _Replicas({}, failing={"c"})
+    handoff = HintedHandoff(HintQueue(), transport=None, membership=None)
+    qc = QuorumClient(replicas, handoff=handoff)
+    plan = {url: [{"key": "k", "ts": 5.0}] for url in ("b", "c")}
+
+    async def scenario():
+        infos = await qc.replicate_batch("/internal/replica/delete_batch", plan, w=2)
+        await qc.drain()
+        return infos
+
+    infos = asyncio.run(scenario())
+    assert infos["k"]["acks"] == 1 and infos["k"]["results"] == {"b": True, "c": False}
+    (key, rec), = handoff.queue.peek("c", 10)
+    assert key == "k" and rec.tombstone and rec.value is None and rec.ts == 5.0
+
+
+class _BatchReplicas:
+    def __init__(self, records, failing=()):
+        self.records = records
+        self.failing = set(failing)
+        self.calls = []
+
+    async def post(self, url, path, json=None):
+        self.calls.append((url, path, [it["key"] for it in json["items"]] if "items" in json else list(json["keys"])))
+        await asyncio.sleep(0)
+        if url in self.failing:
+            return _Resp(500)
+        resp = _Resp(200)
+        if path == "/internal/replica/get_batch":
+            found = {k: self.records[url][k] for k in json["keys"] if k in self.records.get(url, {})}
+            resp.json = lambda: {"records": found}
+        return resp
+
+
+def test_batch_writes_go_once_per_node_and_count_acks_per_key():
+    owners = {"k1": ["a", "b", "c"], "k2": ["b", "c", "d"], "k3": ["c", "d", "a"]}
+    plan = {}
+    for key, nodes in owners.items():
+        for n in nodes:
+            plan.setdefault(n, []).append({"key": key, "value": "v", "ts": 1.0})
+    replicas = _BatchReplicas({}, failing={"c"})
+    handoff = HintedHandoff(HintQueue(), transport=None, membership=None)
+    qc = QuorumClient(replicas, handoff=handoff)
+
+    async def scenario():
+        # k2 is moving and needs a joint quorum of 3
+        infos = await qc.replicate_batch("/internal/replica/put_batch", plan, w=2, local="a", needed={"k2": 3})
+        await qc.drain()
+        return infos
+
+    infos = asyncio.run(scenario())
+    assert sorted((url, keys) for url, _, keys in replicas.calls) == [("b", ["k1", "k2"]), ("c", ["k1", "k2", "k3"]), ("d", ["k2", "k3"])]
+    assert {k: (i["acks"], i["needed"]) for k, i in infos.items()} == {"k1": (2, 2), "k2": (2, 3), "k3": (2, 2)}
+    assert all(i["results"]["c"] is False for i in infos.values())
+    assert sorted(k for k, rec in handoff.queue.peek("c", 10) if not rec.tombstone) == ["k1", "k2", "k3"]
+
+
+def test_batch_reads_resolve_per_key_and_fail_only_keys_short_of_q():
+    records = {
+        "b": {"k1": {"value": "old", "ts": 1.0, "tombstone": False}, "k2": {"value": None, "ts": 3.0, "tombstone": True}},
+        "c": {"k1": {"value": "new", "ts": 2.0, "tombstone": False}, "k2": {"value": "v", "ts": 2.0, "tombstone": False}},
+    }
+    replicas = _BatchReplicas(records, failing={"d"})
+    local = ("a", {"k1": {"value": "old", "ts": 1.0, "tombstone": False}})
+    plan = {"a": ["k1"], "b": ["k1", "k2"], "c": ["k1", "k2"], "d": ["k2", "k3"]}
+    res = asyncio.run(QuorumClient(replicas).quorum_get_batch(plan, q=2, local=local, needed={"k2": 3}))
+    assert sorted(url for url, _, _ in replicas.calls) == ["b", "c", "d"]
+    assert res["k1"]["found"] and res["k1"]["record"]["value"] == "new"
+    # k2 has two answers but needs three; k3's only replica is down
+    assert not res["k2"]["ok"] and res["k2"]["oks"] == 2 and res["k2"]["needed"] == 3
+    assert not res["k3"]["ok"] and res["k3"]["oks"] == 0
+    res = asyncio.run(QuorumClient(replicas).quorum_get_batch(plan, q=2))
+    assert res["k2"]["ok"] and not res["k2"]["found"]
+
+
+def test_read_answered_only_by_the_local_replica_is_503():
+    app = create_app("n1", "http://127.0.0.1:9", ["http://127.0.0.1:1"], replication=2, w=1, q=2, debug=False)
+    r = TestClient(app).get("/kv/get", params={"key": "k"})
+    assert r.status_code == 503
+    assert r.json()["detail"]["error"] == "read_quorum_not_met"
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from dynamo.hashing import make_ring
+from dynamo.membership import Membership
+from dynamo.rebalance import Rebalancer, moved_ranges
+from dynamo.store import IndexedStore, InMemoryStore, Record
+
+NODES = ["http://a", "http://b", "http://c"]
+
+
+def test_token_scan_is_ordered_and_resumable():
+    ring = make_ring("md5", NODES)
+    store = IndexedStore(InMemoryStore(), ring.token, ring.partitioner.bits)
+    for i in range(300):
+        store.put(f"k{i}", "v", ts=1.0)
+
+    lo, hi = store.space // 4, store.space // 2
+    expected = sorted((ring.token(f"k{i}"), f"k{i}") for i in range(300) if lo <= ring.token(f"k{i}") < hi)
+    got, after = [], None
+    while True:
+        chunk = store.scan(lo, hi, after=after, limit=7)
+        if not chunk:
+            break
+        got += [(t, k) for t, k, _ in chunk]
+        after = chunk[-1][:2]
+    assert got == expected
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_join_streams_moved_ranges_to_the_new_owner(indexed):
+    old = make_ring("md5", NODES)
+    new = make_ring("md5", NODES + ["http://d"])
+    moved = moved_ranges(old, new, 2, 1 << old.partitioner.bits)
+    assert moved and all("http://d" in b for _, _, _, b in moved)
+
+    make_store = (lambda: IndexedStore(InMemoryStore(), old.token, old.partitioner.bits)) if indexed else InMemoryStore
+    stores = {n: make_store() for n in NODES + ["http://d"]}
+    keys = [f"k{i}" for i in range(2000)]
+    for key in keys:
+        for n in old.replicas(key, 2):
+            stores[n].put(key, key.upper(), ts=1.0)
+
+    class Resp:
+        status_code = 200
+
+    class Transport:
+        async def post(self, url, path, json=None, **kw):
+            for it in json["items"]:
+                stores[url].merge(it["key"], Record(value=it["value"], ts=it["ts"], tombstone=it["tombstone"]))
+            return Resp()
+
+    reads = []
+
+    # stands in for StoreAccess.call
+    async def run_store(fn, *args):
+        reads.append(fn)
+        return fn(*args)
+
+    async def run():
+        rebs = {}
+        for n in NODES:
+            m = Membership(n, NODES + ["http://d"], timeout_s=1.0, dead_after_s=10.0)
+            reb = rebs[n] = Rebalancer(n, stores[n], Transport(), m, lambda nodes: make_ring("md5", nodes), 2, batch_size=64, rate=0, run=run_store)
+            reb.ring_changed(NODES, new)
+            assert reb.moving(next(k for k in keys if "http://d" in new.replicas(k, 2))) is not None
+            await reb._stream(reb.transfer)
+        return rebs
+
+    rebs = asyncio.run(run())
+    for key in keys:
+        for n in new.replicas(key, 2):
+            assert stores[n].get(key).value == key.upper()
+    assert reads
+    assert sum(r.transfer.keys_sent for r in rebs.values()) == sum(1 for k in keys if "http://d" in new.replicas(k, 2))
@@ -0,0 +1,136 @@
+import asyncio
+
+from dynamo.quorum import QuorumClient
+from dynamo.repair import ReadRepair
+from dynamo.store import InMemoryStore, Record
+
+
+class _Resp:
+    def __init__(self, data):
+        self._data = data
+        self.status_code = 200
+
+    def json(self):
+        return self._data
+
+
+# In-process replicas; "slow" answers after the quorum read has returned,
+# "down" fails every call.
+class _Cluster:
+    def __init__(self, stores, slow=(), down=()):
+        self.stores = stores
+        self.slow = set(slow)
+        self.down = set(down)
+        self.asked = []
+
+    def _view(self, url, key):
+        r = self.stores[url].get(key)
+        return {"ok": True, "value": r.value, "ts": r.ts, "tombstone": r.tombstone} if r else {"ok": True, "value": None, "ts": 0.0, "tombstone": True}
+
+    async def get(self, url, path, params=None):
+        self.asked.append(url)
+        await asyncio.sleep(0.05 if url in self.slow else 0)
+        if url in self.down:
+            raise ConnectionError(url)
+        return _Resp(self._view(url, params["key"]))
+
+    async def post(self, url, path, json=None):
+        assert path == "/internal/replica/merge_batch"
+        for it in json["items"]:
+            self.stores[url].merge(it["key"], Record(value=it["value"], ts=it["ts"], tombstone=it["tombstone"]))
+        return _Resp({"ok": True})
+
+
+def test_read_repair_fixes_stale_and_unwaited_replicas():
+    stores = {u: InMemoryStore() for u in ("a", "b", "c")}
+    stores["a"].put("k", "new", ts=2.0)
+    stores["b"].put("k", "old", ts=1.0)
+    cluster = _Cluster(stores, slow={"c"})
+    repair = ReadRepair(cluster, interval_s=0.01, rate=0)
+    qc = QuorumClient(cluster, repair=repair)
+
+    async def scenario():
+        runner = asyncio.ensure_future(repair.run())
+        res = await qc.quorum_get(["a", "b", "c"], "k", q=2)
+        assert res["record"]["value"] == "new"
+        assert "c" not in res["responses"]
+        await asyncio.sleep(0.2)
+        runner.cancel()
+
+    asyncio.run(scenario())
+    assert stores["b"].get("k").value == "new"
+    assert stores["c"].get("k").value == "new"
+    assert repair.repaired == 2 and repair.stale_replicas == 2
+
+
+def test_equal_timestamps_settle_on_one_value():
+    stores = {u: InMemoryStore() for u in ("a", "b", "c")}
+    stores["a"].put("k", "x", ts=1.0)
+    stores["b"].put("k", "y", ts=1.0)
+    stores["c"].put("k", "x", ts=1.0)
+    cluster = _Cluster(stores)
+    repair = ReadRepair(cluster, interval_s=0.01, rate=0)
+    qc = QuorumClient(cluster, repair=repair)
+
+    async def scenario():
+        runner = asyncio.ensure_future(repair.run())
+        for _ in range(3):
+            await qc.quorum_get(["a", "b", "c"], "k", q=3)
+            await asyncio.sleep(0.05)
+        runner.cancel()
+
+    asyncio.run(scenario())
+    assert {s.get("k").value for s in stores.values()} == {"y"}
+    assert repair.stale_replicas == 2 and repair.repaired == 2
+
+
+def test_reconcile_keeps_newest_pending_record_and_is_bounded():
+    repair = ReadRepair(transport=None, max_pending=1)
+    repair.reconcile("x", {"a": Record(value="1", ts=1.0), "b": Record(value=None, ts=0.0, tombstone=True)})
+    repair.reconcile("x", {"a": Record(value="2", ts=2.0), "b": Record(value="1", ts=1.0)})
+    repair.reconcile("y", {"a": Record(value="1", ts=1.0), "c": Record(value=None, ts=0.0, tombstone=True)})
+
+    assert repair.stats()["pending"] == 1
+    assert repair.dropped == 1
+    assert repair._take("b") == {"x": Record(value="2", ts=2.0)}
+
+
+def test_local_view_counts_once_toward_read_quorum():
+    stores = {u: InMemoryStore() for u in ("a", "b", "c")}
+    for store in stores.values():
+        store.put("k", "v", ts=1.0)
+    local = ("a", _Cluster(stores)._view("a", "k"))
+
+    cluster = _Cluster(stores, down={"b", "c"})
+    res = asyncio.run(QuorumClient(cluster).quorum_get(["a", "b", "c"], "k", q=2, local=local))
+    assert not res["ok"] and sorted(cluster.asked) == ["b", "c"]
+
+    cluster = _Cluster(stores, down={"c"})
+    res = asyncio.run(QuorumClient(cluster).quorum_get(["a", "b", "c"], "k", q=2, local=local))
+    assert res["ok"] and res["record"]["value"] == "v" and "a" not in cluster.asked
+
+
+def test_stale_local_view_is_repaired_in_process():
+    stores = {u: InMemoryStore() for u in ("a", "b", "c")}
+    stores["a"].put("k", "old", ts=1.0)
+    stores["b"].put("k", "new", ts=2.0)
+    stores["c"].put("k", "new", ts=2.0)
+    cluster = _Cluster(stores)
+
+    async def apply_local(items):
+        for key, rec in items:
+            stores["a"].merge(key, rec)
+
+    repair = ReadRepair(cluster, self_url="a", apply_local=apply_local, interval_s=0.01, rate=0)
+    qc = QuorumClient(cluster, repair=repair)
+
+    async def scenario():
+        runner = asyncio.ensure_future(repair.run())
+        res = await qc.quorum_get(["a", "b", "c"], "k", q=2, local=("a", cluster._view("a", "k")))
+        assert res["record"]["value"] == "new"
+        await asyncio.sleep(0.1)
+        runner.cancel()
+
+    asyncio.run(scenario())
+    assert stores["a"].get("k").value == "new" and "a" not in cluster.asked
+    assert repair.repaired == 1
@@ -0,0 +1,75 @@
+import asyncio
+
+from dynamo.hashing import make_ring
+from dynamo.metrics import Registry, merge_expositions
+from dynamo.shards import ShardedAccess, shard_leaves, shard_of
+from dynamo.store import InMemoryStore, IndexedStore, Record
+
+
+def test_shards_split_tokens_on_leaf_boundaries():
+    depth, bits = 4, 16
+    for count in (1, 2, 3, 5):
+        seen = []
+        for shard in range(count):
+            lo, hi = shard_leaves(shard, count, depth)
+            assert lo < hi
+            seen.extend(range(lo, hi))
+            for leaf in range(lo, hi):
+                token = leaf << (bits - depth)
+                assert shard_of(token, bits, count, depth) == shard
+                assert shard_of(token | ((1 << (bits - depth)) - 1), bits, count, depth) == shard
+        assert seen == list(range(1 << depth))
+
+
+# Workers of one node in-process, calling each other directly instead of
+# over their Unix sockets.
+class _Worker(ShardedAccess):
+    def __init__(self, group, shard, count, ring):
+        index = IndexedStore(InMemoryStore(), ring.token, ring.partitioner.bits)
+        super().__init__(index, "inline", shard, count, "/nonexistent", ring.token, ring.partitioner.bits, depth=6, index=index)
+        self.group = group
+
+    async def remote(self, shard, method, *args):
+        return await self.group[shard].serve(method, args)
+
+
+def test_sharded_access_routes_keys_to_their_worker():
+    ring = make_ring("md5", ["http://a"])
+    group = []
+    group.extend(_Worker(group, i, 3, ring) for i in range(3))
+    keys = [f"k{i:03d}" for i in range(60)]
+
+    async def run():
+        front = group[1]
+        await front.put_many([(k, f"v{k}", 1.0) for k in keys])
+        await front.delete("k007", ts=2.0)
+        assert await front.merge_many([("k001", Record("new", 3.0)), ("k002", Record("old", 0.5))]) == 1
+        recs = await group[0].get_many(keys + ["missing"])
+        assert [r.value for r in recs[3:6]] == ["vk003", "vk004", "vk005"] and recs[-1] is None
+        assert recs[1].value == "new" and recs[2].value == "vk002" and recs[7].tombstone
+        assert (await group[2].get("k001")).value == "new"
+        page = await group[2].scan_keys(prefix="k0", after="k010", limit=5)
+        return page
+
+    page = asyncio.run(run())
+    assert [k for k, _ in page] == ["k011", "k012", "k013", "k014", "k015"]
+    for w in group:
+        held = [k for k, _ in w.index.items()]
+        assert held and all(w.shard_of(k) == w.shard for k in held)
+    assert sum(len(w.index) for w in group) == len(keys)
+
+
+def test_worker_expositions_merge_by_family():
+    texts = []
+    for worker in ("0", "1"):
+        r = Registry(const_labels={"worker": worker})
+        r.counter("dynamo_x_total", "X", ["op"]).labels("put").inc(2)
+        r.gauge("dynamo_keys", "Keys", lambda: 3)
+        texts.append(r.render())
+    lines = merge_expositions(texts).splitlines()
+    assert lines == [
+        "# HELP dynamo_x_total X", "# TYPE dynamo_x_total counter",
+        'dynamo_x_total{worker="0",op="put"} 2', 'dynamo_x_total{worker="1",op="put"} 2',
+        "# HELP dynamo_keys Keys", "# TYPE dynamo_keys gauge",
+        'dynamo_keys{worker="0"} 3', 'dynamo_keys{worker="1"} 3',
+    ]
@@ -38,3 +38,64 @@ def test_newer_record_selection():
 
     newer = InMemoryStore.newer(r1, r2)
     assert newer.value == "v2"
+
+
+def test_compact_store_matches_record_api():
+    from dynamo.store import CompactStore
+
+    store = CompactStore(min_compact_bytes=0)
+    store.put("a", "long-value", ts=1.0)
+    store.put("b", "x", ts=1.0)
+    store.put("a", "short", ts=2.0)
+    store.put("b", "grown-value", ts=3.0)
+    store.delete("c", ts=4.0)
+
+    assert store.get("a") == Record(value="short", ts=2.0)
+    assert store.get("b").value == "grown-value"
+    assert store.get("c").tombstone is True
+    assert store.get("missing") is None
+
+
+def test_indexed_store_scans_keys_in_order_by_prefix_and_page():
+    from dynamo.store import IndexedStore, SortedIndex
+
+    idx = SortedIndex(load=4)
+    for v in [7, 3, 9, 1, 5, 8, 2, 6, 4, 0, 11, 10]:
+        idx.add(v)
+    assert list(idx.irange()) == list(range(12))
+    assert list(idx.irange(5, exclusive=True)) == [6, 7, 8, 9, 10, 11]
+
+    store = IndexedStore(InMemoryStore(), token_fn=len, token_bits=8)
+    for i in reversed(range(50)):
+        store.put(f"user:{i:03d}", str(i), ts=1.0)
+        store.put(f"item:{i:03d}", str(i), ts=1.0)
+    store.delete("user:010", ts=2.0)
+
+    got, after = [], None
+    while True:
+        page = store.scan_keys(prefix="user:", after=after, limit=7)
+        if not page:
+            break
+        got += [k for k, _ in page]
+        after = page[-1][0]
+    assert got == [f"user:{i:03d}" for i in range(50)]
+    assert store.get("user:010").tombstone
+    assert [k for k, _ in store.scan_keys(start="item:045", limit=10)] == [f"item:{i:03d}" for i in range(45, 50)] + [f"user:{i:03d}" for i in range(5)]
+
+
+def test_store_access_threads_keep_per_key_merges_atomic():
+    import asyncio
+    from dynamo.access import StoreAccess
+    from dynamo.store import IndexedStore
+
+    index = IndexedStore(InMemoryStore(), token_fn=len, token_bits=8)
+    access = StoreAccess(index, mode="thread", workers=8, stripes=4)
+
+    async def run():
+        await asyncio.gather(*(access.merge(f"k{i % 50}", Record(value=str(i), ts=float(i))) for i in range(2000)))
+        return await access.get("k7")
+
+    assert asyncio.run(run()) == Record(value="1957", ts=1957.0)
+    assert all(index.get(f"k{j}").ts == 1950 + j for j in range(50))
+    assert len(index) == 50 and [k for k, _ in index.scan_keys(limit=3)] == ["k0", "k1", "k10"]
+    access.close()
@@ -0,0 +1,65 @@
+import asyncio
+
+from dynamo.membership import Membership
+from dynamo.swim import ALIVE, DEAD, SUSPECT, Swim
+
+
+def test_crashed_member_is_detected_and_disseminated():
+    async def run():
+        urls = [f"n{i}" for i in range(5)]
+        nodes, crashed = {}, set()
+
+        def sender(src):
+            async def send(url, msg, timeout_s):
+                if url in crashed:
+                    await asyncio.sleep(timeout_s)
+                    return None
+                return await nodes[url].handle(msg)
+            return send
+
+        for u in urls:
+            nodes[u] = Swim(u, urls, sender(u), period_s=0.02, ping_timeout_s=0.005, indirect_k=2)
+        tasks = {u: asyncio.create_task(s.run()) for u, s in nodes.items()}
+        await asyncio.sleep(0.1)
+        crashed.add("n4")
+        tasks["n4"].cancel()
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if all(nodes[u].status("n4") == DEAD for u in urls[:4]):
+                break
+        for t in tasks.values():
+            t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return nodes
+
+    nodes = asyncio.run(run())
+    for u in ("n0", "n1", "n2", "n3"):
+        assert nodes[u].status("n4") == DEAD
+        assert all(nodes[u].status(v) == ALIVE for v in ("n0", "n1", "n2", "n3"))
+
+    m = Membership("n0", ["n1", "n2", "n3", "n4"], timeout_s=1.0, dead_after_s=3.0, remove_after_s=30.0)
+    m.sync_swim(nodes["n0"])
+    assert not m.is_alive("n4") and "n4" in m.all_nodes()
+    assert m.is_alive("n1")
+
+
+def test_suspicion_is_refuted_with_a_higher_incarnation():
+    async def never(url, msg, timeout_s):
+        return None
+
+    a = Swim("a", ["a", "b"], never)
+    b = Swim("b", ["a", "b"], never)
+    b.apply("a", SUSPECT, 0)
+    assert b.status("a") == SUSPECT
+
+    # a hears the rumour about itself and refutes it.
+    reply = asyncio.run(a.handle({"type": "ping", "from": "b", "inc": 0, "updates": [["a", SUSPECT, 0]]}))
+    assert a.incarnation == 1
+    assert ["a", ALIVE, 1] in reply["updates"]
+
+    # Stale suspicion cannot override the refutation; a new incarnation can.
+    b.apply("a", ALIVE, 1)
+    b.apply("a", SUSPECT, 0)
+    assert b.status("a") == ALIVE
+    b.apply("a", DEAD, 1)
+    assert b.status("a") == DEAD
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from dynamo import node_api
+from dynamo.transport import PeerTransport
+
+
+# Minimal HTTP/1.1 keep-alive server counting the connections it accepts.
+async def _serve(accepted):
+    async def handle(reader, writer):
+        accepted.append(writer)
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_requests_to_a_peer_share_one_client_and_connection():
+    async def scenario():
+        accepted = []
+        server = await _serve(accepted)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        t = PeerTransport(timeout_s=2.0)
+        try:
+            assert t.client(url) is t.client(url)
+            assert t.client(url) is not t.client("http://127.0.0.1:1")
+            for _ in range(5):
+                r = await t.get(url, "/health")
+                assert r.text == "ok"
+            assert len(accepted) == 1
+            assert t.stats()[url]["requests"] == 5 and t.stats()[url]["connections"] == 1
+        finally:
+            await t.aclose()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_connection_limits_are_applied_to_every_peer_client():
+    t = PeerTransport(timeout_s=1.0, max_connections=7, max_keepalive_connections=3, keepalive_expiry_s=9.0)
+    for url in ("http://a", "http://b"):
+        pool = t.client(url)._transport._pool
+        assert (pool._max_connections, pool._max_keepalive_connections, pool._keepalive_expiry) == (7, 3, 9.0)
+    asyncio.run(t.aclose())
+
+
+def test_app_shutdown_closes_the_transport(monkeypatch):
+    made = []
+
+    class Recording(PeerTransport):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            made.append(self)
+
+    monkeypatch.setattr(node_api, "PeerTransport", Recording)
+    app = node_api.create_app("n1", "http://127.0.0.1:9", [], replication=1, w=1, q=1, debug=False)
+    with TestClient(app):
+        client = made[0].client("http://127.0.0.1:1")
+    assert client.is_closed
+    with pytest.raises(RuntimeError):
+        made[0].client("http://127.0.0.1:2")
@@ -0,0 +1,56 @@
+from dynamo.store import InMemoryStore, Record
+from dynamo.versioning import CausalStore, DotClock, decode_context, encode_context, merge, new_write, node_id_for, pack, prune, resolve_records, unpack
+
+
+def _write(store, key, node, counter, value, context=None):
+    return store.put(key, pack(new_write(context or {}, node, counter, value)), ts=float(counter))
+
+
+def test_concurrent_writes_become_siblings_and_context_resolves_them():
+    store = CausalStore(InMemoryStore())
+    _write(store, "k", 1, 10, "a")
+    _write(store, "k", 2, 20, "b")
+    state = unpack(store.get("k").value)
+    assert state.values() == ["a", "b"]
+
+    ctx = decode_context(encode_context(state.vv))
+    _write(store, "k", 1, 11, "ab", context=ctx)
+    assert unpack(store.get("k").value).values() == ["ab"]
+
+    # A stale delta covered by the context is not resurrected.
+    assert not store.merge("k", Record(value=pack(new_write({}, 2, 20, "b")), ts=20.0))
+    assert unpack(store.get("k").value).values() == ["ab"]
+
+
+def test_two_workers_writing_the_same_key_keep_both_values():
+    url = "http://127.0.0.1:8001"
+    w0, w1 = DotClock(node_id_for(url, 0)), DotClock(node_id_for(url, 1))
+    assert w0.node == node_id_for(url) and w1.node != w0.node
+    # Worker 1's counter runs ahead of worker 0's; neither read the key.
+    w1._last = w0.next() + 1000
+    store = CausalStore(InMemoryStore())
+    _write(store, "k", w1.node, w1.next(), "from-1")
+    _write(store, "k", w0.node, w0.next(), "from-0")
+    assert sorted(unpack(store.get("k").value).values()) == ["from-0", "from-1"]
+
+
+def test_merge_is_order_independent_and_resolver_merges_replicas():
+    x = new_write({}, 1, 5, "x")
+    y = new_write({}, 2, 7, "y")
+    z = new_write({1: 5, 2: 7}, 3, 1, None)
+    assert pack(merge(merge(x, y), z)) == pack(merge(z, merge(y, x)))
+    assert merge(merge(x, y), z).values() == []
+
+    a = Record(value=pack(x), ts=1.0)
+    b = Record(value=pack(y), ts=2.0)
+    r = resolve_records(resolve_records(None, a), b)
+    assert r.ts == 2.0 and unpack(r.value).values() == ["x", "y"]
+    assert resolve_records(r, Record(value=None, ts=0.0, tombstone=True)) is r
+
+
+def test_pack_round_trip_and_pruning_keeps_sibling_nodes():
+    state = merge(new_write({9: 3, 40: 2}, 1, 300, "v:1"), new_write({}, 2, 400, None))
+    assert unpack(pack(state)) == state
+    pruned = prune(state, 2)
+    assert set(pruned.vv) == {1, 2}
+    assert unpack(pack(pruned)).values() == ["v:1"]
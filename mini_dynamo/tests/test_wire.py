@@ -0,0 +1,62 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from dynamo import wire
+from dynamo.node_api import create_app
+from dynamo.quorum import QuorumClient
+from dynamo.store import Record
+
+
+def test_frames_round_trip():
+    body = wire.encode_request(wire.OP_PUT_BATCH, {"items": [
+        {"key": "k1", "value": "v", "ts": 1.5, "hint_for": "http://n3"},
+        {"key": "ключ", "value": "", "ts": 2.0},
+    ]})
+    op, items = wire.decode_request(body)
+    assert op == wire.OP_PUT_BATCH
+    assert items == [("k1", "v", 1.5, False, "http://n3"), ("ключ", "", 2.0, False, None)]
+
+    resp = wire.encode_response([("a", Record(value="x", ts=3.0)), ("b", None)])
+    assert wire.decode_response(wire.OP_GET_BATCH, resp) == {"ok": True, "records": {
+        "a": {"ok": True, "value": "x", "ts": 3.0, "tombstone": False},
+        "b": {"ok": True, "value": None, "ts": 0.0, "tombstone": True},
+    }}
+
+
+def test_binary_endpoint_matches_json_endpoints():
+    app = create_app("n1", "http://127.0.0.1:9", [], replication=1, w=1, q=1, debug=False)
+    client = TestClient(app)
+
+    def call(op, payload):
+        r = client.post(wire.BINARY_PATH, content=wire.encode_request(op, payload), headers={"content-type": wire.CONTENT_TYPE})
+        assert r.status_code == 200
+        return wire.decode_response(op, r.content)
+
+    assert call(wire.OP_PUT, {"key": "a", "value": "1", "ts": 5.0}) == {"ok": True, "count": 1}
+    assert call(wire.OP_DELETE, {"key": "b", "ts": 6.0}) == {"ok": True, "count": 1}
+    assert call(wire.OP_GET, {"key": "a"}) == client.get("/internal/replica/get", params={"key": "a"}).json()
+    assert call(wire.OP_GET_BATCH, {"keys": ["a", "b", "c"]}) == client.post("/internal/replica/get_batch", json={"keys": ["a", "b", "c"]}).json()
+    assert call(wire.OP_MERGE_BATCH, {"items": [{"key": "a", "value": "old", "ts": 1.0}]})["applied"] == 0
+    assert client.post(wire.BINARY_PATH, content=b"\x01").status_code == 400
+
+
+def test_keys_too_long_for_frames_are_sent_as_json():
+    class Resp:
+        status_code = 200
+
+        def json(self):
+            return {"ok": True}
+
+    class Peers:
+        sent = []
+
+        async def post(self, url, path, json=None, content=None, headers=None):
+            self.sent.append(path)
+            return Resp()
+
+    peers = Peers()
+    qc = QuorumClient(peers, binary=wire.BinaryClient(peers))
+    info = asyncio.run(qc.replicate_put(["b"], "k" * 70_000, "v", ts=1.0, w=1))
+    assert info["acks"] == 1 and peers.sent == ["/internal/replica/put"]
+    assert qc.binary.stats()["oversize_json_calls"] == 1